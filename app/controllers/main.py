@@ -4,43 +4,263 @@ from flask_login import login_required, current_user
 from app.models.models import OLT, ONU, LogEntry
 from app import db
 import datetime
-from collections import Counter
+import os
+import threading
+import time
+import sqlite3
+from functools import partial
 import re # Import regex for parsing
 
 # Importar funções de coleta SNMP
-from app.snmp_utils import get_olt_info, get_ont_list
+from app.snmp_utils import get_olt_info, get_port_positions
+from app.snmp_poller import get_ont_delta, ont_poller
+from app.snmp_policy import configure_olt_policy
+from app.onu_categories import configure_olt_thresholds, get_thresholds
+from app.snmp_traps import apply_trap_event, trap_journal
+from app.single_flight import snmp_flights
+from app.snapshot_store import snapshot_store
+from app.snmp_cache import DATASET_OLT_INFO, DATASET_ONUS, DATASET_ONUS_JSON, payload_cache, snapshot_cache
+from app.response_cache import EncodedPayload
+from app.snmp_decode import format_ont
+from app.onu_table import OnuTable, SORT_FIELDS
 # Importar função de execução SSH
 from app.ssh_utils import execute_olt_command
 
 main_bp = Blueprint("main", __name__)
 
-# Cache simples para dados SNMP (evita coletas repetidas em curto intervalo)
-_snmp_cache = {
-    "olt_info": None,
-    "ont_list": None,
-    "last_fetch_time": None
+# Dados SNMP em cache no snapshot_cache do worker, por (OLT, conjunto): informações da
+# OLT (dados lentos) e a OnuTable das ONUs (dados rápidos), cada um com a sua validade.
+# O resultado de cada coleta também vai para o snapshot_store (SQLite em instance/),
+# compartilhado entre os workers: um worker reaproveita a coleta de outro pela versão.
+_worker_state = {
+    "trap_cursor": None # Posição no diário de traps já aplicada
 }
-CACHE_TIMEOUT_SECONDS = 60 # Atualiza a cada 60 segundos
+# Com o receptor de traps ativo as quedas chegam por push; a coleta completa vira reconciliação
+CACHE_TIMEOUT_WITH_TRAPS_SECONDS = 300
+# Stale-while-revalidate: passada a validade do conjunto (TTL "soft") o dado ainda é servido
+# enquanto uma thread recoleta em segundo plano; só acima deste limite a requisição espera
+CACHE_MAX_STALE_SECONDS = 900
+
+# Paginação de /api/onus (e da primeira página do dashboard)
+ONUS_PAGE_SIZE = 100
+ONUS_MAX_PAGE_SIZE = 1000
+
+# Uma atualização em segundo plano por worker
+_background_refresh_lock = threading.Lock()
+
+def _apply_trap_events():
+    """Aplica nas ONUs em cache os eventos de trap recebidos desde a última leitura.
+
+    Como na coleta, os eventos vão para uma cópia da tabela, trocada no
+    cache (mesma hora de coleta e versão) sob o lock do snapshot_cache,
+    junto com o cursor do diário: requisições e a atualização em segundo
+    plano nunca veem a tabela servida pela metade nem aplicam o mesmo
+    evento duas vezes.
+    """
+    with snapshot_cache.lock:
+        events, _worker_state["trap_cursor"] = trap_journal.read_since(_worker_state["trap_cursor"])
+        events_by_olt = {}
+        for event in events:
+            events_by_olt.setdefault(event.olt, []).append(event)
+        for olt_ip, olt_events in events_by_olt.items():
+            entry = snapshot_cache.peek(olt_ip, DATASET_ONUS)
+            if entry is None or not isinstance(entry.value, OnuTable):
+                continue
+            table = entry.value.copy()
+            for event in olt_events:
+                apply_trap_event(table, event)
+            snapshot_cache.put(olt_ip, DATASET_ONUS, table, entry.fetched_at, entry.version)
+
+def _configure_olt(olt_ip):
+    """Aplica a política SNMP e os limites cadastrados para a OLT do dashboard, se ela estiver no banco."""
+    olt = OLT.query.filter_by(ip_address=olt_ip).first()
+    if olt:
+        configure_olt_policy(olt)
+        configure_olt_thresholds(olt)
+    return get_thresholds(olt_ip)
+
+def _dataset_timeout(dataset):
+    if dataset == DATASET_ONUS and trap_journal.alive():
+        return CACHE_TIMEOUT_WITH_TRAPS_SECONDS
+    return snapshot_cache.ttl(dataset)
+
+def _snapshot_age():
+    """Idade em segundos da coleta das ONUs em cache, ou None se não houver."""
+    entry = snapshot_cache.peek(os.environ.get("OLT_IP"), DATASET_ONUS)
+    return int(entry.age()) if entry is not None else None
+
+def _cached_entry(olt_ip, dataset, max_age=None):
+    """CacheEntry do conjunto com idade menor que max_age (padrão: a validade do conjunto), ou None.
+
+    A validade vem do snapshot compartilhado: se outro worker gravou uma
+    versão mais nova, ela é carregada no cache local antes de responder.
+    """
+    max_age = _dataset_timeout(dataset) if max_age is None else max_age
+    try:
+        info = snapshot_store.info(olt_ip, dataset)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f"Snapshot compartilhado indisponível, usando só o cache local: {e}")
+        return snapshot_cache.get(olt_ip, dataset, max_age)
+    if info is None or time.time() - info.fetched_at >= max_age:
+        return None
+    entry = snapshot_cache.get(olt_ip, dataset, max_age)
+    if entry is None or entry.version != info.version:
+        entry = _load_snapshot(olt_ip, dataset)
+    # Erros de coleta valem só pela validade de dados rápidos, mesmo em conjuntos lentos
+    if entry is not None and _is_error(entry.value) and entry.age() >= snapshot_cache.ttl(DATASET_ONUS):
+        return None
+    return entry
+
+def _is_error(value):
+    return isinstance(value, dict) and bool(value.get("error"))
+
+def _load_snapshot(olt_ip, dataset):
+    """Carrega no snapshot_cache o snapshot compartilhado do conjunto; None se não houver."""
+    try:
+        snapshot = snapshot_store.get(olt_ip, dataset)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f"Falha ao ler o snapshot compartilhado: {e}")
+        return None
+    if snapshot is None or snapshot.meta is None:
+        return None
+    meta = snapshot.meta
+    if dataset != DATASET_ONUS:
+        value = meta.get("value")
+    elif snapshot.data is not None:
+        thresholds = _configure_olt(olt_ip)
+        value = OnuTable.from_bytes(snapshot.data, thresholds)
+        # O poller deste worker passa a calcular deltas a partir da mesma coleta (cópia própria)
+        ont_poller.seed(olt_ip, OnuTable.from_bytes(snapshot.data, thresholds), meta.get("identity_at") or 0)
+    else:
+        value = meta.get("error") or {"error": "Falha ao obter dados SNMP das ONUs."}
+    return snapshot_cache.put(olt_ip, dataset, value, snapshot.fetched_at, snapshot.version)
 
 def _get_cached_snmp_data():
-    """Retorna dados SNMP do cache se válidos, senão busca novos."""
-    now = datetime.datetime.now()
-    cache_valid = False
-    if _snmp_cache["last_fetch_time"]:
-        if (now - _snmp_cache["last_fetch_time"]).total_seconds() < CACHE_TIMEOUT_SECONDS:
-            cache_valid = True
-
-    if cache_valid and _snmp_cache["olt_info"] is not None and _snmp_cache["ont_list"] is not None:
-        # print("Usando cache SNMP") # Debug
-        return _snmp_cache["olt_info"], _snmp_cache["ont_list"]
+    """Retorna dados SNMP do cache se válidos, senão busca novos.
+
+    Passada a validade, o dado em cache ainda é devolvido (a idade sai em
+    _snapshot_age()) e a coleta roda em segundo plano; a requisição só
+    espera a coleta se não houver dado ou se ele passou de CACHE_MAX_STALE_SECONDS.
+    A busca passa pelo single-flight de cada conjunto: só uma coleta por vez
+    por (OLT, conjunto), entre threads e entre workers; as demais esperam e
+    reaproveitam o resultado, lido do snapshot compartilhado.
+    """
+    _apply_trap_events()
+    olt_ip = os.environ.get("OLT_IP")
+    onus = _cached_entry(olt_ip, DATASET_ONUS, max(CACHE_MAX_STALE_SECONDS, _dataset_timeout(DATASET_ONUS)))
+    olt_info = _cached_entry(olt_ip, DATASET_OLT_INFO,
+                             max(CACHE_MAX_STALE_SECONDS, _dataset_timeout(DATASET_OLT_INFO)))
+    if onus is None or olt_info is None:
+        return _fetch_snmp_data()
+    if onus.age() >= _dataset_timeout(DATASET_ONUS) or olt_info.age() >= _dataset_timeout(DATASET_OLT_INFO):
+        _start_background_refresh()
+    return olt_info.value, onus.value
+
+def _fetch_snmp_data():
+    """Coleta o que venceu (informações da OLT e/ou ONUs); retorna (olt_info, ont_list)."""
+    olt_ip = os.environ.get("OLT_IP")
+    olt_info = _cached_entry(olt_ip, DATASET_OLT_INFO)
+    if olt_info is None:
+        olt_info = _fetch_dataset(olt_ip, DATASET_OLT_INFO)
+    onus = _cached_entry(olt_ip, DATASET_ONUS)
+    if onus is None:
+        onus = _fetch_dataset(olt_ip, DATASET_ONUS)
+    return olt_info.value, onus.value
+
+def _fetch_dataset(olt_ip, dataset):
+    """CacheEntry do conjunto recém-coletado, sob o single-flight (OLT, conjunto).
+
+    Coletas de conjuntos diferentes (ex.: informações da OLT e ONUs) não
+    esperam uma pela outra.
+    """
+    return snmp_flights.do((olt_ip, dataset), partial(_refresh_dataset, olt_ip, dataset),
+                           recheck=partial(_cached_entry, olt_ip, dataset))
+
+def _start_background_refresh():
+    """Dispara a coleta em uma thread, se este worker ainda não tiver uma em andamento."""
+    if not _background_refresh_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                _fetch_snmp_data()
+        except Exception:
+            app.logger.exception("Falha na atualização em segundo plano dos dados SNMP")
+        finally:
+            _background_refresh_lock.release()
+
+    threading.Thread(target=run, name="snmp-refresh", daemon=True).start()
+
+def _refresh_dataset(olt_ip, dataset):
+    """Coleta o conjunto e atualiza os caches local e compartilhado; retorna a CacheEntry."""
+    thresholds = _configure_olt(olt_ip)
+    if dataset == DATASET_OLT_INFO:
+        return _store_dataset(olt_ip, dataset, get_olt_info())
+    return _store_dataset(olt_ip, dataset, _poll_ont_list(olt_ip, thresholds))
+
+def _store_dataset(olt_ip, dataset, value):
+    """Grava a coleta no snapshot compartilhado e no snapshot_cache; retorna a CacheEntry."""
+    fetched_at = time.time()
+    data = None
+    if dataset != DATASET_ONUS:
+        meta = {"value": value}
+    elif isinstance(value, OnuTable):
+        # Contadores junto do snapshot: quem só precisa deles não lê a tabela
+        meta = {"identity_at": ont_poller.identity_at(olt_ip), "summary": value.summary()}
+        data = value.to_bytes()
     else:
-        # print("Buscando novos dados SNMP") # Debug
-        olt_info = get_olt_info()
-        ont_list_snmp = get_ont_list()
-        _snmp_cache["olt_info"] = olt_info
-        _snmp_cache["ont_list"] = ont_list_snmp
-        _snmp_cache["last_fetch_time"] = now
-        return olt_info, ont_list_snmp
+        meta = {"error": value}
+    version = None
+    try:
+        version = snapshot_store.put(olt_ip, dataset, meta, data, fetched_at)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f"Falha ao gravar o snapshot compartilhado: {e}")
+    return snapshot_cache.put(olt_ip, dataset, value, fetched_at, version)
+
+def _expire_snmp_cache(dataset=None):
+    """Invalida o cache local e o snapshot compartilhado (todos os workers recoletam).
+
+    dataset=None invalida todos os conjuntos da OLT do dashboard.
+    """
+    olt_ip = os.environ.get("OLT_IP")
+    snapshot_cache.invalidate(olt_ip, dataset)
+    try:
+        snapshot_store.expire(olt_ip, dataset)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f"Falha ao expirar o snapshot compartilhado: {e}")
+
+def _poll_ont_list(olt_ip, thresholds):
+    """Aplica o delta da coleta incremental sobre uma cópia da OnuTable em cache e a retorna.
+
+    O delta é calculado contra a tabela servida, com os traps já aplicados,
+    e não contra a última coleta do poller: o que um trap mudou e a OLT
+    desmente (porta que voltou depois do linkDown, ONU online sem potência)
+    volta como alterado. A cópia evita que requisições servindo o dado
+    antigo (a coleta pode rodar em segundo plano) vejam a tabela no meio da
+    atualização.
+    """
+    _apply_trap_events()
+    entry = snapshot_cache.peek(olt_ip, DATASET_ONUS)
+    served = entry.value if entry is not None and isinstance(entry.value, OnuTable) else None
+    identity_at = ont_poller.identity_at(olt_ip)
+    if served is not None and identity_at is not None:
+        ont_poller.seed(olt_ip, served.copy(), identity_at)
+    delta = get_ont_delta()
+    if isinstance(delta, dict):
+        return delta
+    if served is not None:
+        table = served.copy().apply_delta(delta)
+    else:
+        # Sem tabela em cache (erro anterior ou despejo): parte da coleta que o poller acabou de guardar
+        table = ont_poller.table(olt_ip).copy()
+    if table.thresholds is not thresholds:
+        table.thresholds = thresholds
+        table.recategorize()
+    if not len(table):
+        return {"error": "Falha ao obter dados SNMP das ONUs."}
+    return table
 
 @main_bp.route("/")
 @main_bp.route("/index")
@@ -59,46 +279,33 @@ def index():
     # Coletar informações da OLT e ONTs via SNMP (usando cache)
     olt_info, ont_list_snmp = _get_cached_snmp_data()
 
-    ont_categories = Counter() # Para contar ONTs por categoria
+    ont_categories = {} # Contagem de ONTs por categoria
     error_ont_fetch = False
 
     # Verificar se houve erro na coleta
     if isinstance(ont_list_snmp, dict) and ont_list_snmp.get("error"):
         flash(f"Erro ao buscar lista de ONTs: {ont_list_snmp['error']}", "danger")
-        ont_list_data = [] # Passa lista vazia para o template em caso de erro
+        ont_list_data = OnuTable.empty() # Passa lista vazia para o template em caso de erro
         error_ont_fetch = True
-        _snmp_cache["ont_list"] = [] # Limpa cache em caso de erro
     elif isinstance(olt_info, dict) and olt_info.get("error"):
          flash(f"Erro ao buscar informações da OLT: {olt_info['error']}", "danger")
          # Mantém a lista de ONTs se ela foi obtida com sucesso
-         ont_list_data = ont_list_snmp if isinstance(ont_list_snmp, list) else []
-         if not isinstance(ont_list_snmp, list):
+         ont_list_data = ont_list_snmp if isinstance(ont_list_snmp, OnuTable) else OnuTable.empty()
+         if not isinstance(ont_list_snmp, OnuTable):
              error_ont_fetch = True # Marca erro se a lista de ONTs também falhou
     else:
         ont_list_data = ont_list_snmp
-        # Calcular contagens por categoria apenas se a lista for válida
-        for ont in ont_list_data:
-            category = ont.get("category", "Desconhecido")
-            ont_categories[category] += 1
-
-    # Calcular contagens gerais (Online/Offline/Total)
-    total_onus_snmp = len(ont_list_data)
-    online_onus_snmp = sum(ont_categories[cat] for cat in ont_categories if cat.startswith("Online") or cat == "Sinal Baixo/Crítico" or cat == "Sinal Muito Baixo (Falha?)")
-    offline_onus_snmp = ont_categories["Offline"]
-
-    # Define a ordem desejada das categorias para exibição
-    category_order = [
-        "Online (Sinal OK)",
-        "Sinal Baixo/Crítico",
-        "Sinal Muito Baixo (Falha?)",
-        "Offline",
-        "Esperando Provisionamento",
-        "Online (Sinal Desconhecido)",
-        "Desconhecido"
-    ]
+        # Contagens por categoria apenas se a lista for válida (pré-calculadas na OnuTable)
+        ont_categories = ont_list_data.summary()["categories"]
 
-    # Cria uma lista ordenada de tuplas (categoria, contagem) para passar ao template
-    ordered_categories = [(cat, ont_categories.get(cat, 0)) for cat in category_order if ont_categories.get(cat, 0) > 0]
+    # Contagens gerais (Online/Offline/Total), pré-calculadas a cada coleta/delta
+    summary = ont_list_data.summary()
+    total_onus_snmp = summary["total"]
+    online_onus_snmp = summary["online"]
+    offline_onus_snmp = summary["offline"]
+
+    # Lista de tuplas (categoria, contagem) para o template, já na ordem de exibição (onu_table.CATEGORIES)
+    ordered_categories = list(ont_categories.items())
 
     return render_template("index.html",
                           title="Dashboard",
@@ -109,15 +316,35 @@ def index():
                           recent_logs=recent_logs,
                           olts=olts,
                           olt_info=olt_info,
-                          ont_list=ont_list_data, # Passa a lista completa inicialmente
+                          ont_page=_onus_page(ont_list_data, None, None, None, ONUS_PAGE_SIZE, None), # Só a primeira página; as demais vêm da API
+                          ont_page_size=ONUS_PAGE_SIZE,
                           ont_categories=ordered_categories,
-                          error_ont_fetch=error_ont_fetch)
+                          error_ont_fetch=error_ont_fetch,
+                          snapshot_age=_snapshot_age())
 
 @main_bp.route("/api/onus")
 @login_required
 def api_onus():
-    """Retorna a lista de ONUs, opcionalmente filtrada por categoria."""
+    """Retorna a lista de ONUs, opcionalmente filtrada por categoria.
+
+    Parâmetros opcionais: sort (rxPower; portName, pela posição
+    frame/slot/porta; status, pela categoria na ordem do dashboard; "-" inverte), q
+    (prefixo de serial/LOID), limit e cursor. Com limit ou cursor a resposta
+    é uma página {"items": [...], "total": n, "next_cursor": ...}; sem eles,
+    a lista completa.
+    """
     category_filter = request.args.get("category")
+    sort = request.args.get("sort") or None
+    search = (request.args.get("q") or "").strip() or None
+    cursor = request.args.get("cursor") or None
+    paged = "limit" in request.args or cursor is not None
+    try:
+        limit = min(max(int(request.args.get("limit", ONUS_PAGE_SIZE)), 1), ONUS_MAX_PAGE_SIZE)
+        after = _parse_cursor(cursor)
+    except ValueError:
+        return jsonify({"error": "Parâmetros de paginação inválidos."}), 400
+    if sort and sort.lstrip("-") not in SORT_FIELDS:
+        return jsonify({"error": f"Ordenação inválida: use {', '.join(SORT_FIELDS)} (com '-' para inverter)."}), 400
 
     # Obtem dados do cache ou busca novos
     _, ont_list_snmp = _get_cached_snmp_data()
@@ -125,16 +352,105 @@ def api_onus():
     if isinstance(ont_list_snmp, dict) and ont_list_snmp.get("error"):
         return jsonify({"error": f"Erro ao buscar ONUs: {ont_list_snmp['error']}"}), 500
 
-    if not isinstance(ont_list_snmp, list):
+    if not isinstance(ont_list_snmp, OnuTable):
          return jsonify({"error": "Formato inesperado para lista de ONUs."}), 500
 
-    # Filtra a lista se uma categoria foi especificada
-    if category_filter and category_filter != "all":
-        filtered_list = [ont for ont in ont_list_snmp if ont.get("category") == category_filter]
+    # Retorna todos se filtro for "all" ou não especificado
+    category = category_filter if category_filter and category_filter != "all" else None
+    if paged:
+        query = (category, sort, search, limit, cursor)
+        build = partial(_onus_page, ont_list_snmp, category, sort, search, limit, after)
     else:
-        filtered_list = ont_list_snmp # Retorna todos se filtro for "all" ou não especificado
+        query = (category, sort, search)
+        build = partial(_onus_list, ont_list_snmp, category, sort, search)
+    payload = _onus_payload(os.environ.get("OLT_IP"), ont_list_snmp, query, build)
+    # 304 se o cliente já tem esta versão; senão o corpo pré-comprimido aceito por ele
+    response = payload.response(request, current_app.response_class)
+    # Idade da coleta servida (pode estar sendo atualizada em segundo plano)
+    response.headers["X-Snapshot-Age"] = str(_snapshot_age() or 0)
+    return response
+
+def _select_onus(table, category, sort, search):
+    """Posições das ONUs da categoria (todas se None) e do prefixo de busca, na ordem de sort."""
+    if category:
+        return table.select(sort, search, category=category)
+    return table.select(sort, search)
+
+def _onus_list(table, category, sort, search):
+    """Lista completa (sem paginação) das ONUs selecionadas, no formato da API."""
+    return [format_ont(ont) for ont in table.rows(_select_onus(table, category, sort, search))]
+
+def _parse_cursor(cursor):
+    """Cursor "ifIndex.onuId.offset" -> ((ifIndex, onuId), offset); None sem cursor."""
+    if cursor is None:
+        return None
+    if_index, onu_id, offset = (int(part) for part in cursor.split("."))
+    return (if_index, onu_id), offset
+
+def _onus_page(table, category, sort, search, limit, after):
+    """Página de ONUs a partir do cursor (after, de _parse_cursor).
+
+    O cursor aponta para a última linha entregue: a página seguinte começa
+    logo depois dela na ordem atual, mesmo que outras linhas tenham entrado
+    ou saído; se a própria linha sumiu, continua pela posição (offset).
+    """
+    selected = _select_onus(table, category, sort, search)
+    start = 0
+    if after is not None:
+        key, offset = after
+        start = table.start_after(selected, sort, key)
+        if start is None:
+            start = min(max(offset, 0), len(selected))
+    page = selected[start:start + limit]
+    end = start + len(page)
+    next_cursor = None
+    if end < len(selected):
+        last = page[-1]
+        next_cursor = f"{int(table.if_index[last])}.{int(table.onu_id[last])}.{end}"
+    return {
+        "items": [format_ont(ont) for ont in table.rows(page)],
+        "total": len(selected),
+        "start": start,
+        "next_cursor": next_cursor
+    }
+
+def _onus_payload(olt_ip, table, query, build):
+    """JSON de /api/onus (com gzip/br e ETag), montado por build() uma vez por revisão da tabela e consulta.
+
+    Fica no payload_cache, limitado em entradas: consultas arbitrárias
+    (buscas, páginas) não despejam os snapshots do snapshot_cache.
+    """
+    dataset = (DATASET_ONUS_JSON,) + query
+    entry = payload_cache.get(olt_ip, dataset, max_age=float("inf"))
+    if entry is not None and entry.version == table.revision:
+        return entry.value
+    body = current_app.json.dumps(build()).encode("utf-8")
+    onus = snapshot_cache.peek(olt_ip, DATASET_ONUS)
+    last_modified = max(onus.fetched_at if onus is not None else 0, table.modified_at or 0) or None
+    return payload_cache.put(olt_ip, dataset, EncodedPayload(body, last_modified), version=table.revision).value
+
+@main_bp.route("/api/summary")
+@login_required
+def api_summary():
+    """Contadores pré-calculados da última coleta: total, online/offline, por categoria e por porta PON."""
+    _, ont_list_snmp = _get_cached_snmp_data()
 
-    return jsonify(filtered_list)
+    if isinstance(ont_list_snmp, dict) and ont_list_snmp.get("error"):
+        return jsonify({"error": f"Erro ao buscar ONUs: {ont_list_snmp['error']}"}), 500
+
+    if not isinstance(ont_list_snmp, OnuTable):
+         return jsonify({"error": "Formato inesperado para lista de ONUs."}), 500
+
+    return jsonify(dict(ont_list_snmp.summary(), olt=os.environ.get("OLT_IP"), age=_snapshot_age()))
+
+@main_bp.route("/api/cache_stats")
+@login_required
+def api_cache_stats():
+    """Estatísticas do cache de snapshots deste worker (acertos, faltas, despejos, ocupação).
+
+    As do cache de respostas de /api/onus vêm em "payloads".
+    """
+    return jsonify(dict(snapshot_cache.stats(), payloads=payload_cache.stats()))
 
 @main_bp.route("/api/authorize_ont", methods=["POST"])
 @login_required
@@ -154,43 +470,59 @@ def api_authorize_ont():
     if not if_index or not serial_number:
         return jsonify({"error": "ifIndex e serialNumber são obrigatórios."}), 400
 
-    # 1. Extrair porta PON do ifIndex (Exemplo: ifIndex 16843008 -> 0/1/0)
-    # A lógica exata depende do mapeamento ifIndex -> porta física da Huawei
-    # Vamos assumir uma função hipotética get_port_from_ifindex
-    # Esta função precisa ser implementada corretamente!
-    # Exemplo SIMPLIFICADO (NÃO FUNCIONAL PARA HUAWEI REAL):
+    # 1. Porta PON a partir do mapa ifIndex -> (frame, slot, porta) em cache,
+    # decodificado do ifDescr. Sem entrada no mapa, cai na lógica placeholder.
+    position = None
     try:
-        # Tentativa de extrair slot/porta/ont_id de um ifIndex hipotético
-        # A Huawei usa um esquema diferente, isso precisa ser ajustado!
-        # Ex: 16777216 + slot*1048576 + port*65536 + ont_id
-        # Ou pode ser mais simples dependendo da MIB usada para ifIndex
-        # Vamos usar uma lógica placeholder
-        # ifIndex 16843008 -> 0/1/0 (Exemplo)
-        # ifIndex 16908544 -> 0/2/0 (Exemplo)
-        # ifIndex 16843009 -> 0/1/1 (Exemplo)
-
-        # Placeholder: Extrair porta e ont_id do ifIndex (PRECISA DE AJUSTE REAL)
-        # Supondo que ifIndex seja um número que possamos mapear
-        # Esta lógica é apenas um exemplo e provavelmente incorreta para Huawei
-        base_ifindex = 16777216 # Exemplo
-        slot_offset = 1048576
-        port_offset = 65536
-        ont_offset = 1
-
-        relative_index = int(if_index) - base_ifindex
-        slot = relative_index // slot_offset
-        port_in_slot = (relative_index % slot_offset) // port_offset
-        ont_id_from_ifindex = (relative_index % port_offset) // ont_offset
-
-        # Formato CLI: frame/slot/port (assumindo frame 0)
-        cli_port = f"0/{slot}/{port_in_slot}"
-        # Usar o próximo ID disponível ou o ID do ifIndex? Vamos usar o do ifIndex por enquanto
-        ont_id = ont_id_from_ifindex
+        position = get_port_positions(os.environ.get('OLT_IP'), os.environ.get('SNMP_COMMUNITY')).get(int(if_index))
+    except (TypeError, ValueError):
+        pass
+
+    if position:
+        cli_port = "{}/{}/{}".format(*position)
+        try:
+            ont_id = int(data["onu_id"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "onu_id é obrigatório para a porta informada."}), 400
         current_app.logger.info(f"Mapeado ifIndex {if_index} para Porta CLI: {cli_port}, ONT ID: {ont_id}")
-
-    except Exception as e:
-        current_app.logger.error(f"Erro ao mapear ifIndex {if_index}: {e}")
-        return jsonify({"error": f"Erro ao processar ifIndex: {e}"}), 500
+    else:
+        # Extrair porta PON do ifIndex (Exemplo: ifIndex 16843008 -> 0/1/0)
+        # A lógica exata depende do mapeamento ifIndex -> porta física da Huawei
+        # Vamos assumir uma função hipotética get_port_from_ifindex
+        # Esta função precisa ser implementada corretamente!
+        # Exemplo SIMPLIFICADO (NÃO FUNCIONAL PARA HUAWEI REAL):
+        try:
+            # Tentativa de extrair slot/porta/ont_id de um ifIndex hipotético
+            # A Huawei usa um esquema diferente, isso precisa ser ajustado!
+            # Ex: 16777216 + slot*1048576 + port*65536 + ont_id
+            # Ou pode ser mais simples dependendo da MIB usada para ifIndex
+            # Vamos usar uma lógica placeholder
+            # ifIndex 16843008 -> 0/1/0 (Exemplo)
+            # ifIndex 16908544 -> 0/2/0 (Exemplo)
+            # ifIndex 16843009 -> 0/1/1 (Exemplo)
+
+            # Placeholder: Extrair porta e ont_id do ifIndex (PRECISA DE AJUSTE REAL)
+            # Supondo que ifIndex seja um número que possamos mapear
+            # Esta lógica é apenas um exemplo e provavelmente incorreta para Huawei
+            base_ifindex = 16777216 # Exemplo
+            slot_offset = 1048576
+            port_offset = 65536
+            ont_offset = 1
+
+            relative_index = int(if_index) - base_ifindex
+            slot = relative_index // slot_offset
+            port_in_slot = (relative_index % slot_offset) // port_offset
+            ont_id_from_ifindex = (relative_index % port_offset) // ont_offset
+
+            # Formato CLI: frame/slot/port (assumindo frame 0)
+            cli_port = f"0/{slot}/{port_in_slot}"
+            # Usar o próximo ID disponível ou o ID do ifIndex? Vamos usar o do ifIndex por enquanto
+            ont_id = ont_id_from_ifindex
+            current_app.logger.info(f"Mapeado ifIndex {if_index} para Porta CLI: {cli_port}, ONT ID: {ont_id}")
+
+        except Exception as e:
+            current_app.logger.error(f"Erro ao mapear ifIndex {if_index}: {e}")
+            return jsonify({"error": f"Erro ao processar ifIndex: {e}"}), 500
 
     # 2. Construir comandos CLI
     commands = [
@@ -225,8 +557,7 @@ def api_authorize_ont():
         # Verificar se a saída contém mensagens de sucesso ou erro específicas da OLT
         if "success" in full_output.lower() or "operation successful" in full_output.lower():
              # Forçar atualização do cache SNMP após autorização bem-sucedida
-            _snmp_cache["ont_list"] = None
-            _snmp_cache["last_fetch_time"] = None
+            _expire_snmp_cache(DATASET_ONUS)
             current_app.logger.info(f"ONT {serial_number} autorizada com sucesso na porta {cli_port} ID {ont_id}.")
             return jsonify({"message": "ONT autorizada com sucesso!", "output": full_output}), 200
         elif "failure" in full_output.lower() or "error" in full_output.lower():
@@ -234,8 +565,7 @@ def api_authorize_ont():
              return jsonify({"error": "Comando executado, mas OLT reportou falha/erro.", "output": full_output}), 500
         else:
             # Forçar atualização do cache SNMP mesmo se não houver confirmação explícita
-            _snmp_cache["ont_list"] = None
-            _snmp_cache["last_fetch_time"] = None
+            _expire_snmp_cache(DATASET_ONUS)
             current_app.logger.info(f"Comandos de autorização para ONT {serial_number} executados. Verifique o status da ONT. Saída: {full_output}")
             return jsonify({"message": "Comandos de autorização executados. Verifique o status da ONT.", "output": full_output}), 200 # Retorna 200 mas com aviso
 
@@ -252,9 +582,7 @@ def refresh_data():
     """
     Força a atualização dos dados SNMP limpando o cache e redireciona para o dashboard.
     """
-    _snmp_cache["olt_info"] = None
-    _snmp_cache["ont_list"] = None
-    _snmp_cache["last_fetch_time"] = None
+    _expire_snmp_cache()
     flash("Forçando atualização dos dados SNMP...", "info")
     return redirect(url_for("main.index"))
 
@@ -2,11 +2,19 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.models import OLT, ONU, LogEntry
 from app.models.snmp_manager import SNMPManager, HuaweiOLTManager
+from app.snmp_usm import olt_credentials
+from app.onu_categories import configure_olt_thresholds, parse_port_thresholds
+from app.snapshot_store import snapshot_store
+from app.snmp_cache import DATASET_ONUS
 from app import db
 import datetime
+import sqlite3
 
 olt_bp = Blueprint('olt', __name__)
 
+# ONUs por página na tela de detalhes da OLT
+OLT_DETAILS_PAGE_SIZE = 50
+
 @olt_bp.route('/list')
 @login_required
 def list_olts():
@@ -30,6 +38,22 @@ def add_olt():
         snmp_community = request.form.get('snmp_community')
         snmp_version = request.form.get('snmp_version', '2c')
         snmp_port = int(request.form.get('snmp_port', 161))
+        snmp_rate_limit = request.form.get('snmp_rate_limit', type=float)
+        snmp_rate_burst = request.form.get('snmp_rate_burst', type=int)
+        snmp_retries = request.form.get('snmp_retries', type=int)
+        snmp_v3_user = request.form.get('snmp_v3_user')
+        snmp_v3_auth_protocol = request.form.get('snmp_v3_auth_protocol', 'SHA')
+        snmp_v3_auth_password = request.form.get('snmp_v3_auth_password')
+        snmp_v3_priv_protocol = request.form.get('snmp_v3_priv_protocol', 'AES')
+        snmp_v3_priv_password = request.form.get('snmp_v3_priv_password')
+        rx_power_critical = request.form.get('rx_power_critical', type=float)
+        rx_power_very_low = request.form.get('rx_power_very_low', type=float)
+        rx_power_port_thresholds = request.form.get('rx_power_port_thresholds')
+        try:
+            parse_port_thresholds(rx_power_port_thresholds)
+        except ValueError as e:
+            flash(f'Limites por porta inválidos: {e}', 'danger')
+            return redirect(url_for('olt.add_olt'))
         
         # Verificar se já existe uma OLT com este IP
         existing_olt = OLT.query.filter_by(ip_address=ip_address).first()
@@ -46,6 +70,17 @@ def add_olt():
             snmp_community=snmp_community,
             snmp_version=snmp_version,
             snmp_port=snmp_port,
+            snmp_rate_limit=snmp_rate_limit,
+            snmp_rate_burst=snmp_rate_burst,
+            snmp_retries=snmp_retries,
+            snmp_v3_user=snmp_v3_user,
+            snmp_v3_auth_protocol=snmp_v3_auth_protocol,
+            snmp_v3_auth_password=snmp_v3_auth_password,
+            snmp_v3_priv_protocol=snmp_v3_priv_protocol,
+            snmp_v3_priv_password=snmp_v3_priv_password,
+            rx_power_critical=rx_power_critical,
+            rx_power_very_low=rx_power_very_low,
+            rx_power_port_thresholds=rx_power_port_thresholds,
             status='unknown',
             created_at=datetime.datetime.utcnow()
         )
@@ -83,6 +118,25 @@ def edit_olt(id):
         olt.snmp_community = request.form.get('snmp_community')
         olt.snmp_version = request.form.get('snmp_version')
         olt.snmp_port = int(request.form.get('snmp_port', 161))
+        olt.snmp_rate_limit = request.form.get('snmp_rate_limit', type=float)
+        olt.snmp_rate_burst = request.form.get('snmp_rate_burst', type=int)
+        olt.snmp_retries = request.form.get('snmp_retries', type=int)
+        olt.snmp_v3_user = request.form.get('snmp_v3_user')
+        olt.snmp_v3_auth_protocol = request.form.get('snmp_v3_auth_protocol', 'SHA')
+        olt.snmp_v3_priv_protocol = request.form.get('snmp_v3_priv_protocol', 'AES')
+        # Senhas em branco mantêm as atuais
+        if request.form.get('snmp_v3_auth_password'):
+            olt.snmp_v3_auth_password = request.form.get('snmp_v3_auth_password')
+        if request.form.get('snmp_v3_priv_password'):
+            olt.snmp_v3_priv_password = request.form.get('snmp_v3_priv_password')
+        try:
+            parse_port_thresholds(request.form.get('rx_power_port_thresholds'))
+        except ValueError as e:
+            flash(f'Limites por porta inválidos: {e}', 'danger')
+            return redirect(url_for('olt.edit_olt', id=id))
+        olt.rx_power_critical = request.form.get('rx_power_critical', type=float)
+        olt.rx_power_very_low = request.form.get('rx_power_very_low', type=float)
+        olt.rx_power_port_thresholds = request.form.get('rx_power_port_thresholds')
         
         # Registrar log
         log_entry = LogEntry(
@@ -93,6 +147,8 @@ def edit_olt(id):
         db.session.add(log_entry)
         
         db.session.commit()
+        # Neste worker vale já; os demais pegam na próxima coleta
+        configure_olt_thresholds(olt)
         
         flash('OLT atualizada com sucesso', 'success')
         return redirect(url_for('olt.list_olts'))
@@ -130,23 +186,51 @@ def delete_olt(id):
 def olt_details(id):
     """
     Exibe detalhes de uma OLT específica
+    
+    Só a página pedida (?page=) das ONUs é carregada do banco; os totais
+    vêm do snapshot SNMP da OLT ou de uma contagem agrupada.
     """
     olt = OLT.query.get_or_404(id)
-    onus = ONU.query.filter_by(olt_id=id).all()
+    onus_page = (ONU.query.filter_by(olt_id=id).order_by(ONU.port, ONU.id)
+                 .paginate(page=request.args.get('page', 1, type=int), per_page=OLT_DETAILS_PAGE_SIZE,
+                           error_out=False))
     
-    # Estatísticas
-    total_onus = len(onus)
-    online_onus = sum(1 for onu in onus if onu.status == 'online')
-    offline_onus = sum(1 for onu in onus if onu.status == 'offline')
+    # Estatísticas: contadores gravados com o último snapshot SNMP da OLT; sem snapshot, contagem no banco
+    summary = _snapshot_summary(olt)
+    if summary:
+        total_onus = summary['total']
+        online_onus = summary['online']
+        offline_onus = summary['offline']
+    else:
+        counts = dict(db.session.query(ONU.status, db.func.count(ONU.id))
+                      .filter(ONU.olt_id == id).group_by(ONU.status).all())
+        total_onus = sum(counts.values())
+        online_onus = counts.get('online', 0)
+        offline_onus = counts.get('offline', 0)
     
     return render_template('olt/details.html', 
                           title=f'OLT: {olt.name}',
                           olt=olt,
-                          onus=onus,
+                          onus=onus_page.items,
+                          onus_page=onus_page,
                           total_onus=total_onus,
                           online_onus=online_onus,
                           offline_onus=offline_onus)
 
+def _snapshot_summary(olt):
+    """Contadores do snapshot compartilhado das ONUs da OLT (pelo IP dela), ou None.
+
+    Há snapshot para a OLT do dashboard (OLT_IP), gravado a cada coleta, e
+    para as OLTs varridas por `flask collect-olts`; as demais caem na
+    contagem no banco.
+    """
+    try:
+        meta = snapshot_store.meta(olt.ip_address, DATASET_ONUS)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f"Falha ao ler o snapshot da OLT {olt.ip_address}: {e}")
+        return None
+    return meta.get('summary') if meta else None
+
 @olt_bp.route('/refresh/<int:id>')
 @login_required
 def refresh_olt(id):
@@ -161,7 +245,11 @@ def refresh_olt(id):
             host=olt.ip_address,
             community=olt.snmp_community,
             port=olt.snmp_port,
-            version=olt.snmp_version
+            version=olt.snmp_version,
+            rate_limit=olt.snmp_rate_limit,
+            rate_burst=olt.snmp_rate_burst,
+            retries=olt.snmp_retries,
+            usm=olt_credentials(olt)
         )
         
         # Criar gerenciador específico para Huawei
@@ -201,9 +289,19 @@ def refresh_olt(id):
             
             return redirect(url_for('olt.olt_details', id=id))
         
+        # Obter status e sinal de todas as ONUs com um walk por coluna
+        onu_states, err = huawei_manager.get_onu_states()
+        if err:
+            flash(f'Erro ao obter status das ONUs: {err}', 'danger')
+            onu_states = {}
+        
+        # Carregar as ONUs já conhecidas desta OLT de uma vez
+        known_onus = {onu.serial_number: onu for onu in ONU.query.filter_by(olt_id=olt.id)}
+        
         # Atualizar informações das ONUs
+        now = datetime.datetime.utcnow()
         for onu_info in onu_list:
-            onu = ONU.query.filter_by(serial_number=onu_info['serial'], olt_id=olt.id).first()
+            onu = known_onus.get(onu_info['serial'])
             
             if not onu:
                 # Nova ONU encontrada
@@ -213,9 +311,10 @@ def refresh_olt(id):
                     olt_id=olt.id,
                     port=onu_info.get('port', 'unknown'),
                     status='unknown',
-                    created_at=datetime.datetime.utcnow()
+                    created_at=now
                 )
                 db.session.add(onu)
+                known_onus[onu.serial_number] = onu
                 
                 log_entry = LogEntry(
                     level='info',
@@ -224,17 +323,13 @@ def refresh_olt(id):
                 )
                 db.session.add(log_entry)
             
-            # Obter status da ONU
-            status, err = huawei_manager.get_onu_status(onu_info['id'])
-            if not err:
-                onu.status = status
-            
-            # Obter nível de sinal da ONU
-            signal, err = huawei_manager.get_onu_signal(onu_info['id'])
-            if not err:
-                onu.signal_strength = signal
+            state = onu_states.get(onu_info['id'])
+            if state:
+                onu.status = state['status']
+                if state['signal'] is not None:
+                    onu.signal_strength = state['signal']
             
-            onu.last_seen = datetime.datetime.utcnow()
+            onu.last_seen = now
         
         db.session.commit()
         
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.models import OLT, ONU, LogEntry
 from app.models.snmp_manager import SNMPManager, HuaweiOLTManager
+from app.snmp_usm import olt_credentials
 from app import db
 import datetime
 
@@ -145,7 +146,11 @@ def enable_onu(id):
             host=olt.ip_address,
             community=olt.snmp_community,
             port=olt.snmp_port,
-            version=olt.snmp_version
+            version=olt.snmp_version,
+            rate_limit=olt.snmp_rate_limit,
+            rate_burst=olt.snmp_rate_burst,
+            retries=olt.snmp_retries,
+            usm=olt_credentials(olt)
         )
         
         # Criar gerenciador específico para Huawei
@@ -208,7 +213,11 @@ def disable_onu(id):
             host=olt.ip_address,
             community=olt.snmp_community,
             port=olt.snmp_port,
-            version=olt.snmp_version
+            version=olt.snmp_version,
+            rate_limit=olt.snmp_rate_limit,
+            rate_burst=olt.snmp_rate_burst,
+            retries=olt.snmp_retries,
+            usm=olt_credentials(olt)
         )
         
         # Criar gerenciador específico para Huawei
@@ -271,7 +280,11 @@ def refresh_onu(id):
             host=olt.ip_address,
             community=olt.snmp_community,
             port=olt.snmp_port,
-            version=olt.snmp_version
+            version=olt.snmp_version,
+            rate_limit=olt.snmp_rate_limit,
+            rate_burst=olt.snmp_rate_burst,
+            retries=olt.snmp_retries,
+            usm=olt_credentials(olt)
         )
         
         # Criar gerenciador específico para Huawei
@@ -280,19 +293,17 @@ def refresh_onu(id):
         # Extrair ID da ONU (pode variar dependendo da implementação)
         onu_id = onu.port.split('/')[-1] if '/' in onu.port else '1'
         
-        # Obter status da ONU
-        status, err = huawei_manager.get_onu_status(onu_id)
+        # Obter status e nível de sinal da ONU em um único PDU
+        onu_states, err = huawei_manager.get_onu_states([onu_id])
         if err:
             flash(f'Erro ao obter status da ONU: {err}', 'danger')
         else:
-            onu.status = status
-        
-        # Obter nível de sinal da ONU
-        signal, err = huawei_manager.get_onu_signal(onu_id)
-        if err:
-            flash(f'Erro ao obter nível de sinal da ONU: {err}', 'danger')
-        else:
-            onu.signal_strength = signal
+            state = onu_states.get(onu_id, {'status': 'unknown', 'signal': None})
+            onu.status = state['status']
+            if state['signal'] is None:
+                flash('Erro ao obter nível de sinal da ONU', 'danger')
+            else:
+                onu.signal_strength = state['signal']
         
         onu.last_seen = datetime.datetime.utcnow()
         db.session.commit()
@@ -33,6 +33,19 @@ class OLT(db.Model):
     snmp_community = db.Column(db.String(64))
     snmp_version = db.Column(db.String(8))
     snmp_port = db.Column(db.Integer, default=161)
+    snmp_rate_limit = db.Column(db.Float) # PDUs/s por OLT (None = padrão SNMP_RATE_LIMIT)
+    snmp_rate_burst = db.Column(db.Integer) # Rajada do token bucket (None = padrão SNMP_RATE_BURST)
+    snmp_retries = db.Column(db.Integer) # Retentativas em timeout (None = padrão)
+    # SNMPv3 (usado quando snmp_version == '3')
+    snmp_v3_user = db.Column(db.String(64))
+    snmp_v3_auth_protocol = db.Column(db.String(8)) # MD5, SHA, SHA224, SHA256, SHA384, SHA512
+    snmp_v3_auth_password = db.Column(db.String(128))
+    snmp_v3_priv_protocol = db.Column(db.String(8)) # DES, 3DES, AES, AES192, AES256
+    snmp_v3_priv_password = db.Column(db.String(128))
+    # Limites de RxPower em dBm (None = padrão RX_POWER_*_THRESHOLD)
+    rx_power_critical = db.Column(db.Float)
+    rx_power_very_low = db.Column(db.Float)
+    rx_power_port_thresholds = db.Column(db.Text) # Exceções por porta: "0/1/0 -27 -33" por linha
     status = db.Column(db.String(16), default='unknown')
     last_check = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
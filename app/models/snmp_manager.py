@@ -1,26 +1,33 @@
 from pysnmp.hlapi import *
+from app.snmp_session import get_session
+from app.snmp_policy import configure_policy
+
+# Versões atendidas pela sessão (v3 com credenciais USM em usm)
+SUPPORTED_VERSIONS = ('1', '2c', '3')
 
 class SNMPManager:
-    def __init__(self, host, community, port=161, version='2c'):
+    def __init__(self, host, community, port=161, version='2c',
+                 rate_limit=None, rate_burst=None, retries=None, usm=None):
         self.host = host
         self.community = community
         self.port = port
         self.version = version
+        self.usm = usm
+        # Limites da OLT valem para todos os PDUs enviados a ela, inclusive
+        # os de snmp_utils e do coletor
+        configure_policy(host, rate_limit, rate_burst, retries)
+        
+    @property
+    def session(self):
+        """Sessão SNMP compartilhada desta OLT (engine e socket reaproveitados)."""
+        return get_session(self.host, self.community, self.port, self.version, usm=self.usm)
         
     def get_snmp_data(self, oid):
         """
         Obtém um valor SNMP específico baseado no OID
         """
-        if self.version == '2c':
-            iterator = getCmd(
-                SnmpEngine(),
-                CommunityData(self.community),
-                UdpTransportTarget((self.host, self.port)),
-                ContextData(),
-                ObjectType(ObjectIdentity(oid))
-            )
-            
-            errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
+        if self.version in SUPPORTED_VERSIONS:
+            errorIndication, errorStatus, errorIndex, varBinds = self.session.get([oid])
             
             if errorIndication:
                 return None, f"Erro: {errorIndication}"
@@ -32,29 +39,37 @@ class SNMPManager:
         
         return None, "Versão SNMP não suportada"
     
+    def get_snmp_multi(self, oids):
+        """
+        Obtém vários OIDs em um único PDU GET
+        """
+        if self.version in SUPPORTED_VERSIONS:
+            errorIndication, errorStatus, errorIndex, varBinds = self.session.get(oids)
+            
+            if errorIndication:
+                return None, f"Erro: {errorIndication}"
+            elif errorStatus:
+                return None, f"Erro: {errorStatus.prettyPrint()} em {errorIndex and varBinds[int(errorIndex) - 1][0] or '?'}"
+            else:
+                return [(str(varBind[0]), varBind[1]) for varBind in varBinds], None
+        
+        return None, "Versão SNMP não suportada"
+    
     def walk_snmp_data(self, oid):
         """
-        Realiza um SNMP walk em um OID específico
+        Realiza um SNMP walk (GETBULK) em um OID específico
         """
         result = []
         
-        if self.version == '2c':
-            for (errorIndication,
-                 errorStatus,
-                 errorIndex,
-                 varBinds) in nextCmd(
-                    SnmpEngine(),
-                    CommunityData(self.community),
-                    UdpTransportTarget((self.host, self.port)),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(oid)),
-                    lexicographicMode=False):
-                
-                if errorIndication:
-                    return None, f"Erro: {errorIndication}"
-                elif errorStatus:
-                    return None, f"Erro: {errorStatus.prettyPrint()} em {errorIndex and varBinds[int(errorIndex) - 1][0] or '?'}"
-                else:
+        if self.version in SUPPORTED_VERSIONS:
+            errorIndication, errorStatus, errorIndex, varBindTable = self.session.bulk_walk([oid])
+            
+            if errorIndication:
+                return None, f"Erro: {errorIndication}"
+            elif errorStatus:
+                return None, f"Erro: {errorStatus.prettyPrint()} em {errorIndex or '?'}"
+            else:
+                for varBinds in varBindTable:
                     for varBind in varBinds:
                         result.append((str(varBind[0]), varBind[1]))
             
@@ -66,7 +81,7 @@ class SNMPManager:
         """
         Define um valor SNMP para um OID específico
         """
-        if self.version == '2c':
+        if self.version in SUPPORTED_VERSIONS:
             if value_type == 'Integer':
                 val = Integer(value)
             elif value_type == 'OctetString':
@@ -82,16 +97,10 @@ class SNMPManager:
             else:
                 return False, "Tipo de valor não suportado"
             
-            iterator = setCmd(
-                SnmpEngine(),
-                CommunityData(self.community),
-                UdpTransportTarget((self.host, self.port)),
-                ContextData(),
-                ObjectType(ObjectIdentity(oid), val)
+            errorIndication, errorStatus, errorIndex, varBinds = self.session.set(
+                [ObjectType(ObjectIdentity(oid), val)]
             )
             
-            errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
-            
             if errorIndication:
                 return False, f"Erro: {errorIndication}"
             elif errorStatus:
@@ -101,6 +110,9 @@ class SNMPManager:
         
         return False, "Versão SNMP não suportada"
 
+# Máximo de OIDs por PDU nas consultas pontuais de ONUs
+MAX_OIDS_PER_GET = 20
+
 class HuaweiOLTManager:
     """
     Classe específica para gerenciamento de OLTs Huawei MA5800-X7 via SNMP
@@ -154,7 +166,7 @@ class HuaweiOLTManager:
         for oid, value in onus:
             # Extrair informações da ONU do OID e valor
             # Este é um exemplo e precisa ser ajustado com base nos OIDs reais
-            onu_id = oid.split('.')[-1]
+            onu_id = self._onu_index(oid)
             onu_list.append({
                 'id': onu_id,
                 'serial': str(value)
@@ -171,17 +183,7 @@ class HuaweiOLTManager:
         if err:
             return None, err
             
-        # Mapear o valor numérico para um status legível
-        status_map = {
-            '1': 'online',
-            '2': 'offline',
-            '3': 'disabled',
-            '4': 'unknown'
-        }
-        
-        status_str = status_map.get(str(status), 'unknown')
-        
-        return status_str, None
+        return self._parse_status(status), None
     
     def get_onu_signal(self, onu_id):
         """
@@ -192,11 +194,97 @@ class HuaweiOLTManager:
         if err:
             return None, err
             
+        return self._parse_signal(signal), None
+    
+    def get_onu_status_bulk(self):
+        """
+        Obtém o status de todas as ONUs com um único walk na coluna de status
+        """
+        values, err = self.snmp.walk_snmp_data(self.oids['onu_status'])
+        if err:
+            return None, err
+            
+        return {self._onu_index(oid): self._parse_status(value) for oid, value in values}, None
+    
+    def get_onu_signal_bulk(self):
+        """
+        Obtém o nível de sinal de todas as ONUs com um único walk na coluna de sinal
+        """
+        values, err = self.snmp.walk_snmp_data(self.oids['onu_signal'])
+        if err:
+            return None, err
+            
+        signals = {}
+        for oid, value in values:
+            try:
+                signals[self._onu_index(oid)] = self._parse_signal(value)
+            except (TypeError, ValueError):
+                continue
+        return signals, None
+    
+    def get_onu_states(self, onu_ids=None):
+        """
+        Obtém status e sinal de várias ONUs, indexados pelo ID da ONU
+        
+        Sem onu_ids, percorre as colunas de status e sinal uma vez cada e junta
+        os resultados em memória (custo fixo independente do número de ONUs).
+        Com onu_ids, busca os dois OIDs de cada ONU em PDUs GET agrupados.
+        Retorna {onu_id: {'status': str, 'signal': float ou None}}.
+        """
+        if onu_ids is None:
+            statuses, err = self.get_onu_status_bulk()
+            if err:
+                return None, err
+            signals, err = self.get_onu_signal_bulk()
+            if err:
+                return None, err
+        else:
+            statuses, signals = {}, {}
+            oids = []
+            for onu_id in onu_ids:
+                oids.append(f"{self.oids['onu_status']}.{onu_id}")
+                oids.append(f"{self.oids['onu_signal']}.{onu_id}")
+            for start in range(0, len(oids), MAX_OIDS_PER_GET):
+                values, err = self.snmp.get_snmp_multi(oids[start:start + MAX_OIDS_PER_GET])
+                if err:
+                    return None, err
+                for oid, value in values:
+                    onu_id = self._onu_index(oid)
+                    if oid.startswith(self.oids['onu_status'] + '.'):
+                        statuses[onu_id] = self._parse_status(value)
+                    else:
+                        try:
+                            signals[onu_id] = self._parse_signal(value)
+                        except (TypeError, ValueError):
+                            continue
+        
+        return {
+            onu_id: {'status': statuses.get(onu_id, 'unknown'), 'signal': signals.get(onu_id)}
+            for onu_id in set(statuses) | set(signals)
+        }, None
+    
+    @staticmethod
+    def _onu_index(oid):
+        # Este é um exemplo e precisa ser ajustado com base nos OIDs reais
+        return str(oid).split('.')[-1]
+    
+    @staticmethod
+    def _parse_status(status):
+        # Mapear o valor numérico para um status legível
+        status_map = {
+            '1': 'online',
+            '2': 'offline',
+            '3': 'disabled',
+            '4': 'unknown'
+        }
+        
+        return status_map.get(str(status), 'unknown')
+    
+    @staticmethod
+    def _parse_signal(signal):
         # Converter o valor para dBm (pode variar dependendo do equipamento)
         # Este é um exemplo e precisa ser ajustado
-        signal_dbm = float(signal) / 10.0
-        
-        return signal_dbm, None
+        return float(signal) / 10.0
     
     def enable_onu(self, onu_id):
         """
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Categorização das ONUs em lote, com limites de potência por OLT e por porta PON.
+
+categorize() recebe as colunas de estado e potência inteiras (arrays
+NumPy, como as da OnuTable) e devolve os códigos de categoria e a
+contagem por categoria de uma vez, sem laço Python por ONU.
+
+Os limites de RxPower partem de RX_POWER_CRITICAL_THRESHOLD e
+RX_POWER_VERY_LOW_THRESHOLD e podem ser trocados por OLT (colunas
+rx_power_critical/rx_power_very_low) e por porta PON (coluna
+rx_power_port_thresholds, uma linha "frame/slot/porta crítico muito_baixo"
+por porta). Como as políticas de snmp_policy, ficam em um registro por
+host, configurado a partir da linha da OLT.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from app.snmp_decode import (
+    LINK_ONLINE, LINK_OFFLINE, REG_REGISTERED, REG_UNREGISTERED, decode_port_position
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes de Limite (padrão quando a OLT/porta não define outro) --- #
+RX_POWER_CRITICAL_THRESHOLD = -28.0 # dBm - Abaixo disso é considerado baixo/crítico
+RX_POWER_VERY_LOW_THRESHOLD = -35.0 # dBm - Abaixo disso pode indicar problema físico
+
+# Categorias na ordem de exibição do dashboard; o código é a posição
+CATEGORIES = (
+    'Online (Sinal OK)',
+    'Sinal Baixo/Crítico',
+    'Sinal Muito Baixo (Falha?)',
+    'Offline',
+    'Esperando Provisionamento',
+    'Online (Sinal Desconhecido)',
+    'Desconhecido'
+)
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORIES)}
+CATEGORY_OK = CATEGORY_CODES['Online (Sinal OK)']
+CATEGORY_CRITICAL = CATEGORY_CODES['Sinal Baixo/Crítico']
+CATEGORY_VERY_LOW = CATEGORY_CODES['Sinal Muito Baixo (Falha?)']
+CATEGORY_OFFLINE = CATEGORY_CODES['Offline']
+CATEGORY_UNPROVISIONED = CATEGORY_CODES['Esperando Provisionamento']
+CATEGORY_NO_SIGNAL = CATEGORY_CODES['Online (Sinal Desconhecido)']
+CATEGORY_UNKNOWN = CATEGORY_CODES['Desconhecido']
+# Categorias contadas como online no dashboard (inclui sinal baixo e desconhecido)
+ONLINE_CATEGORIES = (CATEGORY_OK, CATEGORY_CRITICAL, CATEGORY_VERY_LOW, CATEGORY_NO_SIGNAL)
+
+# Estado ausente nas colunas int8 (os valores da MIB começam em 1)
+STATUS_MISSING = 0
+
+RxThresholds = namedtuple('RxThresholds', 'critical very_low')
+DEFAULT_THRESHOLDS = RxThresholds(RX_POWER_CRITICAL_THRESHOLD, RX_POWER_VERY_LOW_THRESHOLD)
+
+
+def categorize(link_status, reg_status, rx_power, critical=RX_POWER_CRITICAL_THRESHOLD,
+               very_low=RX_POWER_VERY_LOW_THRESHOLD):
+    """Colunas de estado/potência -> (códigos uint8, contagem por código).
+
+    link_status/reg_status usam STATUS_MISSING para ausente e rx_power usa
+    NaN; critical/very_low podem ser escalares ou um valor por linha. A
+    regra é a mesma de snmp_utils.categorize_ont.
+    """
+    rx_power = np.asarray(rx_power, dtype=np.float32)
+    # Limites em float32 como as potências: o empate (rx == limite) não conta como abaixo
+    critical = np.asarray(critical, dtype=np.float32)
+    very_low = np.asarray(very_low, dtype=np.float32)
+    online = (link_status == LINK_ONLINE) & (reg_status == REG_REGISTERED)
+    no_signal = np.isnan(rx_power)
+    codes = np.select(
+        [reg_status == REG_UNREGISTERED,
+         link_status == LINK_OFFLINE,
+         online & no_signal,
+         online & (rx_power < very_low),
+         online & (rx_power < critical),
+         online],
+        [CATEGORY_UNPROVISIONED, CATEGORY_OFFLINE, CATEGORY_NO_SIGNAL,
+         CATEGORY_VERY_LOW, CATEGORY_CRITICAL, CATEGORY_OK],
+        default=CATEGORY_UNKNOWN
+    ).astype(np.uint8)
+    return codes, np.bincount(codes, minlength=len(CATEGORIES))
+
+
+def categorize_onts(onts, thresholds=None):
+    """Preenche 'category' em dicts de ONU (formato de merge_ont_rows) em lote.
+
+    Retorna {categoria: quantidade} com as categorias presentes.
+    """
+    onts = list(onts)
+    thresholds = thresholds or OltThresholds()
+    count = len(onts)
+    if_index = np.fromiter((ont['ifIndex'] for ont in onts), np.int64, count)
+    critical, very_low = thresholds.columns(if_index, [ont['portName'] for ont in onts])
+    codes, counts = categorize(
+        np.fromiter((STATUS_MISSING if ont['linkStatus'] is None else ont['linkStatus'] for ont in onts), np.int8, count),
+        np.fromiter((STATUS_MISSING if ont['regStatus'] is None else ont['regStatus'] for ont in onts), np.int8, count),
+        np.fromiter((np.nan if ont['rxPower'] is None else ont['rxPower'] for ont in onts), np.float32, count),
+        critical, very_low)
+    for ont, code in zip(onts, codes.tolist()):
+        ont['category'] = CATEGORIES[code]
+    return named_counts(counts)
+
+
+def named_counts(counts):
+    """Contagem por código -> {categoria: quantidade}, sem zeros, na ordem de CATEGORIES."""
+    return {name: int(counts[code]) for code, name in enumerate(CATEGORIES) if counts[code]}
+
+
+def parse_port_thresholds(text):
+    """Texto "frame/slot/porta crítico muito_baixo" por linha -> {(frame, slot, porta): RxThresholds}.
+
+    Linhas vazias e comentários (#) são ignorados; levanta ValueError na primeira linha inválida.
+    """
+    ports = {}
+    for line_number, line in enumerate((text or '').splitlines(), 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        position = decode_port_position(parts[0])
+        if len(parts) != 3 or position is None:
+            raise ValueError(f"Linha {line_number}: use 'frame/slot/porta crítico muito_baixo'")
+        try:
+            ports[position] = RxThresholds(float(parts[1]), float(parts[2]))
+        except ValueError:
+            raise ValueError(f"Linha {line_number}: limites devem ser números em dBm")
+    return ports
+
+
+class OltThresholds:
+    """Limites de RxPower de uma OLT: padrão da OLT e exceções por porta PON."""
+
+    def __init__(self, default=DEFAULT_THRESHOLDS, ports=None):
+        self.default = default
+        self.ports = ports or {}
+
+    def configure(self, critical=None, very_low=None, ports=None):
+        """Aplica os limites da linha da OLT; None mantém o padrão do módulo."""
+        self.default = RxThresholds(RX_POWER_CRITICAL_THRESHOLD if critical is None else critical,
+                                    RX_POWER_VERY_LOW_THRESHOLD if very_low is None else very_low)
+        self.ports = ports or {}
+
+    def for_port(self, position):
+        """Limites de uma porta (frame, slot, porta), ou os da OLT."""
+        return self.ports.get(position, self.default)
+
+    def columns(self, if_index, port_names):
+        """Limites por linha para categorize(): escalares se não há exceção por porta.
+
+        port_names é o ifDescr de cada linha; a posição da porta sai dele.
+        """
+        if not self.ports or not len(if_index):
+            return self.default
+        _, first, inverse = np.unique(if_index, return_index=True, return_inverse=True)
+        per_port = [self.for_port(decode_port_position(port_names[row])) for row in first.tolist()]
+        critical = np.array([limits.critical for limits in per_port], dtype=np.float32)
+        very_low = np.array([limits.very_low for limits in per_port], dtype=np.float32)
+        return critical[inverse], very_low[inverse]
+
+    def __repr__(self):
+        return f'<OltThresholds {self.default} +{len(self.ports)} portas>'
+
+
+_thresholds = {}
+_thresholds_lock = threading.Lock()
+
+
+def get_thresholds(host):
+    """Limites compartilhados da OLT (padrão do módulo se ainda não configurados)."""
+    with _thresholds_lock:
+        thresholds = _thresholds.get(host)
+        if thresholds is None:
+            thresholds = _thresholds[host] = OltThresholds()
+        return thresholds
+
+
+def configure_olt_thresholds(olt):
+    """Aplica os limites de uma linha da tabela OLT."""
+    try:
+        ports = parse_port_thresholds(olt.rx_power_port_thresholds)
+    except ValueError as e:
+        logger.warning(f"Limites por porta inválidos na OLT {olt.ip_address}, usando os da OLT: {e}")
+        ports = {}
+    thresholds = get_thresholds(olt.ip_address)
+    thresholds.configure(olt.rx_power_critical, olt.rx_power_very_low, ports)
+    return thresholds
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""Tabela colunar das ONUs de uma OLT, em arrays NumPy.
+
+Uma lista de dicts custa algumas centenas de bytes por ONU (o dict, as
+chaves e um objeto Python por valor), multiplicados por worker do
+gunicorn. Aqui cada campo é uma coluna: estados e categoria como códigos
+inteiros, potências em float32 (NaN = sem leitura), nome da porta como
+string internada e serial/LOID como bytes. As linhas ficam ordenadas por
+(ifIndex, onuId), o que permite localizar uma ONU por busca binária sem
+manter um dict de índices.
+
+A categoria é calculada pela própria tabela, em lote (onu_categories), com
+os limites da OLT; a contagem por categoria e os contadores do dashboard
+(summary(): total, online/offline, por categoria e por porta PON) saem do
+mesmo cálculo (o summary uma vez por revisão, na primeira consulta). Filtros
+e contagens trabalham nas colunas; dicts no formato de merge_ont_rows só
+são montados para as linhas que vão para a resposta.
+
+Para a paginação da API, as ordens por rxPower/portName/status e o índice
+de busca por prefixo de serial/LOID são montados uma vez por revisão da
+tabela, na primeira consulta.
+
+Os filtros usam índices valor -> posições (RowIndex) de categoria e estado
+de link, montados com a tabela e atualizados só nas linhas alteradas quando
+um trap muda ONUs isoladas; a porta sai de uma busca binária no ifIndex,
+que já é a ordem das linhas. Um filtro custa o tamanho do resultado, não o
+da tabela.
+"""
+
+import io
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from app.onu_categories import (
+    CATEGORIES, CATEGORY_CODES, CATEGORY_OFFLINE, ONLINE_CATEGORIES, STATUS_MISSING, OltThresholds,
+    categorize, named_counts
+)
+from app.snmp_decode import LINK_ONLINE, decode_port_position, format_serial, format_text
+
+# onuId ocupa os 16 bits baixos da chave de ordenação
+_ONU_ID_BITS = 16
+
+# Revisão de conteúdo, única no processo: muda a cada montagem/atualização de qualquer tabela
+_revisions = itertools.count(1)
+
+
+def _row_keys(if_index, onu_id):
+    return (if_index.astype(np.int64) << _ONU_ID_BITS) | onu_id.astype(np.int64)
+
+
+def _power(value):
+    return np.nan if value is None else value
+
+
+def _status(value):
+    return STATUS_MISSING if value is None else value
+
+
+def _pack_bytes(column):
+    """Coluna de bytes/None -> (tamanhos int32, -1 para None; bytes concatenados uint8)."""
+    lengths = np.fromiter((-1 if value is None else len(value) for value in column), np.int32, len(column))
+    blob = b''.join(value for value in column if value is not None)
+    return lengths, np.frombuffer(blob, dtype=np.uint8)
+
+
+def _unpack_bytes(lengths, blob):
+    blob = blob.tobytes()
+    column = np.empty(len(lengths), dtype=object)
+    offset = 0
+    for position, length in enumerate(lengths.tolist()):
+        if length >= 0:
+            column[position] = blob[offset:offset + length]
+            offset += length
+    return column
+
+
+class RowIndex:
+    """Valor -> posições (crescentes) das linhas com esse valor, para uma coluna de códigos."""
+
+    _EMPTY = np.empty(0, dtype=np.intp)
+
+    def __init__(self, column):
+        order = np.argsort(column, kind='stable')
+        values, starts = np.unique(column[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self._rows = {value: order[start:end]
+                      for value, start, end in zip(values.tolist(), starts.tolist(), ends.tolist())}
+
+    def get(self, value):
+        return self._rows.get(value, self._EMPTY)
+
+    def update(self, positions, old, new):
+        """Move as linhas que trocaram de valor (old/new alinhados com positions).
+
+        Só as listas dos valores envolvidos são refeitas; os arrays são
+        trocados, nunca alterados, então cópias do índice podem dividi-los.
+        """
+        changed = old != new
+        if not changed.any():
+            return
+        positions, old, new = positions[changed], old[changed], new[changed]
+        for value in np.unique(old).tolist():
+            rows = self.get(value)
+            self._rows[value] = rows[~np.isin(rows, positions[old == value])]
+        for value in np.unique(new).tolist():
+            self._rows[value] = np.union1d(self.get(value), positions[new == value])
+
+    def copy(self):
+        index = object.__new__(RowIndex)
+        index._rows = dict(self._rows)
+        return index
+
+
+def _port_sort_key(name):
+    """Chave de ordenação do nome da porta: (frame, slot, porta) numéricos; sem posição, depois, por texto."""
+    position = decode_port_position(name)
+    return (0, position, '') if position else (1, (), name)
+
+
+# Campos aceitos por OnuTable.order(); '-campo' inverte. status ordena pela
+# categoria, na ordem de CATEGORIES (a do dashboard)
+SORT_FIELDS = ('rxPower', 'portName', 'status')
+
+
+class OnuTable:
+    """ONUs de uma OLT em colunas, ordenadas por (ifIndex, onuId).
+
+    Iterar a tabela percorre as chaves (ifIndex, onuId); `in` e get()
+    aceitam as mesmas chaves.
+    """
+
+    COLUMNS = ('if_index', 'onu_id', 'port_name', 'serial', 'loid',
+               'link_status', 'reg_status', 'rx_power', 'tx_power', 'category')
+
+    def __init__(self, if_index, onu_id, port_name, serial, loid,
+                 link_status, reg_status, rx_power, tx_power, thresholds=None):
+        self.if_index = if_index
+        self.onu_id = onu_id
+        self.port_name = port_name
+        self.serial = serial
+        self.loid = loid
+        self.link_status = link_status
+        self.reg_status = reg_status
+        self.rx_power = rx_power
+        self.tx_power = tx_power
+        self.category = np.zeros(len(if_index), dtype=np.uint8)
+        self.thresholds = thresholds or OltThresholds()
+        self.modified_at = None # Hora (epoch) da última alteração in-place (traps)
+        self._sort()
+        self.recategorize()
+
+    @classmethod
+    def from_onts(cls, onts, thresholds=None):
+        """Monta a tabela a partir de dicts de ONU (formato de merge_ont_rows).
+
+        O campo 'category' dos dicts é ignorado: a tabela recalcula com thresholds.
+        """
+        onts = list(onts)
+        return cls(
+            np.fromiter((ont['ifIndex'] for ont in onts), np.int64, len(onts)),
+            np.fromiter((ont['onuId'] for ont in onts), np.int32, len(onts)),
+            np.array([sys.intern(ont['portName']) for ont in onts], dtype=object),
+            np.array([ont['serialNumber'] for ont in onts], dtype=object),
+            np.array([ont['loid'] for ont in onts], dtype=object),
+            np.fromiter((_status(ont['linkStatus']) for ont in onts), np.int8, len(onts)),
+            np.fromiter((_status(ont['regStatus']) for ont in onts), np.int8, len(onts)),
+            np.fromiter((_power(ont['rxPower']) for ont in onts), np.float32, len(onts)),
+            np.fromiter((_power(ont['txPower']) for ont in onts), np.float32, len(onts)),
+            thresholds
+        )
+
+    @classmethod
+    def empty(cls, thresholds=None):
+        return cls.from_onts([], thresholds)
+
+    @classmethod
+    def from_bytes(cls, data, thresholds=None):
+        """Tabela gravada por to_bytes(); a categoria é recalculada com thresholds."""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            port_names = np.array([sys.intern(name) for name in arrays['port_names'].tolist()], dtype=object)
+            return cls(
+                arrays['if_index'], arrays['onu_id'],
+                port_names[arrays['port_codes']],
+                _unpack_bytes(arrays['serial_lengths'], arrays['serial_blob']),
+                _unpack_bytes(arrays['loid_lengths'], arrays['loid_blob']),
+                arrays['link_status'], arrays['reg_status'], arrays['rx_power'], arrays['tx_power'],
+                thresholds
+            )
+
+    def _sort(self):
+        keys = _row_keys(self.if_index, self.onu_id)
+        if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+            order = np.argsort(keys, kind='stable')
+            for column in self.COLUMNS:
+                setattr(self, column, getattr(self, column)[order])
+            keys = keys[order]
+        self._keys = keys
+        self._search_index = None # Serial/LOID mudaram: o índice de busca é refeito sob demanda
+
+    # --- Consulta --- #
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(zip(self.if_index.tolist(), self.onu_id.tolist()))
+
+    def positions(self, keys):
+        """Posições das chaves (ifIndex, onuId) presentes na tabela, na ordem das linhas."""
+        keys = list(keys)
+        if not keys or not len(self):
+            return np.empty(0, dtype=np.intp)
+        wanted = _row_keys(np.array([key[0] for key in keys]), np.array([key[1] for key in keys]))
+        found = np.searchsorted(self._keys, wanted)
+        found = found[found < len(self._keys)]
+        return np.unique(found[np.isin(self._keys[found], wanted)])
+
+    def __contains__(self, key):
+        return len(self.positions([key])) > 0
+
+    def get(self, key, default=None):
+        found = self.positions([key])
+        return self.row(found[0]) if len(found) else default
+
+    def mask(self, **filters):
+        """Máscara booleana das linhas que atendem a todos os filtros de filter()."""
+        selected = np.zeros(len(self), dtype=bool)
+        selected[self.filter(**filters)] = True
+        return selected
+
+    def filter(self, category=None, link_status=None, if_index=None):
+        """Posições (crescentes) das linhas que atendem a todos os filtros informados.
+
+        Parte do menor índice envolvido e confere os outros filtros só nessas
+        linhas: o custo acompanha o tamanho do resultado.
+        """
+        code = CATEGORY_CODES.get(category, -1)
+        candidates = []
+        if category is not None:
+            candidates.append(self._category_index.get(code))
+        if link_status is not None:
+            candidates.append(self._status_index.get(link_status))
+        if if_index is not None:
+            candidates.append(self.port_rows(if_index))
+        if not candidates:
+            return np.arange(len(self))
+        selected = min(candidates, key=len)
+        if category is not None:
+            selected = selected[self.category[selected] == code]
+        if link_status is not None:
+            selected = selected[self.link_status[selected] == link_status]
+        if if_index is not None:
+            selected = selected[self.if_index[selected] == if_index]
+        return selected
+
+    def port_rows(self, if_index):
+        """Posições das ONUs da porta: as linhas estão ordenadas por ifIndex, então é uma fatia."""
+        start, end = np.searchsorted(self.if_index, [if_index, if_index + 1])
+        return np.arange(start, end)
+
+    def order(self, sort=None):
+        """Posições das linhas na ordem de sort ('rxPower', 'portName', 'status'; '-' inverte).
+
+        portName ordena pela posição (frame, slot, porta) numérica, não pelo
+        texto ("0/1/2" antes de "0/1/10"); status ordena pela categoria, na
+        ordem de CATEGORIES (online com sinal OK primeiro, desconhecido por
+        último), não pelo estado de link cru. None é a ordem das linhas,
+        (ifIndex, onuId), que também desempata as outras. Sem leitura de
+        potência fica sempre no fim. A ordem é calculada uma vez por revisão;
+        levanta ValueError para campo desconhecido.
+        """
+        if not sort:
+            return np.arange(len(self))
+        cached = self._orders.get(sort)
+        if cached is not None:
+            return cached[0]
+        descending = sort.startswith('-')
+        field = sort[1:] if descending else sort
+        if field == 'rxPower':
+            key = -self.rx_power if descending else self.rx_power # NaN continua no fim
+        elif field == 'portName':
+            names, codes = np.unique(self.port_name.astype(str), return_inverse=True)
+            name_rank = np.empty(len(names), dtype=np.intp)
+            name_rank[sorted(range(len(names)), key=lambda code: _port_sort_key(names[code]))] = np.arange(len(names))
+            key = -name_rank[codes] if descending else name_rank[codes]
+        elif field == 'status':
+            # Categoria, na ordem de exibição do dashboard
+            key = -self.category.astype(np.int16) if descending else self.category
+        else:
+            raise ValueError(f"Ordenação inválida: {sort!r} (use {', '.join(SORT_FIELDS)})")
+        order = np.argsort(key, kind='stable')
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        self._orders[sort] = (order, rank)
+        return order
+
+    def rank(self, sort=None):
+        """Posição de cada linha dentro de order(sort)."""
+        if not sort:
+            return np.arange(len(self))
+        self.order(sort)
+        return self._orders[sort][1]
+
+    def search(self, prefix):
+        """Posições das linhas cujo serial ou LOID (como exibidos) começa com prefix, sem diferenciar caixa.
+
+        Busca binária em listas ordenadas, montadas uma vez por conteúdo de serial/LOID.
+        """
+        prefix = prefix.upper()
+        if self._search_index is None:
+            self._search_index = [self._text_index(self.serial, format_serial),
+                                  self._text_index(self.loid, format_text)]
+        found = []
+        for texts, positions in self._search_index:
+            start = np.searchsorted(texts, prefix, side='left')
+            end = np.searchsorted(texts, prefix + '\U0010ffff', side='left')
+            found.append(positions[start:end])
+        return np.unique(np.concatenate(found))
+
+    @staticmethod
+    def _text_index(column, format_value):
+        present = [position for position, value in enumerate(column.tolist()) if value is not None]
+        texts = np.array([format_value(column[position]).upper() for position in present], dtype=str)
+        order = np.argsort(texts, kind='stable')
+        return texts[order], np.array(present, dtype=np.intp)[order]
+
+    def select(self, sort=None, search=None, **filters):
+        """Posições filtradas (filter()) e, se search, por prefixo de serial/LOID, na ordem de sort.
+
+        Com filtro ou busca, só as linhas selecionadas são ordenadas (pela
+        posição de cada uma em order(sort)).
+        """
+        positions = self.filter(**filters) if filters else None
+        if search:
+            found = self.search(search)
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if positions is None:
+            return self.order(sort)
+        if sort:
+            positions = positions[np.argsort(self.rank(sort)[positions], kind='stable')]
+        return positions
+
+    def start_after(self, positions, sort, key):
+        """Índice em positions (saída de select) logo depois da linha key (ifIndex, onuId); None se ela sumiu."""
+        found = self.positions([key])
+        if not len(found):
+            return None
+        rank = self.rank(sort)
+        return int(np.searchsorted(rank[positions], rank[found[0]], side='right'))
+
+    def count(self, **filters):
+        return len(self.filter(**filters))
+
+    @property
+    def nbytes(self):
+        """Memória aproximada: colunas mais os bytes de serial/LOID (nomes de porta são internados)."""
+        total = self._keys.nbytes + sum(getattr(self, column).nbytes for column in self.COLUMNS)
+        for column in (self.serial, self.loid):
+            total += sum(sys.getsizeof(value) for value in column.tolist() if value is not None)
+        return total
+
+    def category_counts(self):
+        """{categoria: quantidade}, só com as categorias presentes, na ordem de CATEGORIES."""
+        return named_counts(self._counts)
+
+    def summary(self):
+        """Contadores pré-calculados: total, online, offline, categorias e portas PON.
+
+        Cada porta traz ifIndex, portName, total, online, offline e categorias.
+        O dict é compartilhado: não alterar. Calculado uma vez por revisão.
+        """
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    # --- Materialização --- #
+
+    def row(self, position):
+        """Linha como dict de ONU com valores nativos (mesmo formato de merge_ont_rows)."""
+        link_status = int(self.link_status[position])
+        reg_status = int(self.reg_status[position])
+        rx_power = float(self.rx_power[position])
+        tx_power = float(self.tx_power[position])
+        return {
+            'ifIndex': int(self.if_index[position]),
+            'onuId': int(self.onu_id[position]),
+            'portName': self.port_name[position],
+            'serialNumber': self.serial[position],
+            'loid': self.loid[position],
+            'linkStatus': None if link_status == STATUS_MISSING else link_status,
+            'regStatus': None if reg_status == STATUS_MISSING else reg_status,
+            # float32 -> centésimos de dBm exatos, como decode_power
+            'rxPower': None if rx_power != rx_power else round(rx_power, 2),
+            'txPower': None if tx_power != tx_power else round(tx_power, 2),
+            'category': CATEGORIES[self.category[position]]
+        }
+
+    def rows(self, positions=None):
+        """Lista de dicts das linhas indicadas (todas se None)."""
+        if positions is None:
+            positions = range(len(self))
+        return [self.row(position) for position in positions]
+
+    def to_dict(self):
+        """{(ifIndex, onuId): ont} com todas as linhas."""
+        return {(ont['ifIndex'], ont['onuId']): ont for ont in self.rows()}
+
+    def to_bytes(self):
+        """Colunas serializadas (npz, sem pickle) para guardar fora do processo.
+
+        Nomes de porta vão como lista única + códigos; serial/LOID como
+        tamanhos + bytes concatenados. A categoria não vai: from_bytes recalcula.
+        """
+        port_names, port_codes = np.unique(self.port_name.astype(str), return_inverse=True)
+        serial_lengths, serial_blob = _pack_bytes(self.serial)
+        loid_lengths, loid_blob = _pack_bytes(self.loid)
+        buffer = io.BytesIO()
+        np.savez(buffer, if_index=self.if_index, onu_id=self.onu_id,
+                 port_names=port_names, port_codes=port_codes.astype(np.int32),
+                 serial_lengths=serial_lengths, serial_blob=serial_blob,
+                 loid_lengths=loid_lengths, loid_blob=loid_blob,
+                 link_status=self.link_status, reg_status=self.reg_status,
+                 rx_power=self.rx_power, tx_power=self.tx_power)
+        return buffer.getvalue()
+
+    # --- Atualização --- #
+
+    def copy(self):
+        """Cópia com colunas próprias (para atualizar sem afetar quem lê a original)."""
+        table = object.__new__(OnuTable)
+        for column in self.COLUMNS:
+            setattr(table, column, getattr(self, column).copy())
+        table.thresholds = self.thresholds
+        table.modified_at = self.modified_at
+        table.revision = self.revision
+        table._keys = self._keys.copy()
+        table._counts = self._counts.copy()
+        table._summary = self._summary
+        table._orders = self._orders
+        table._search_index = self._search_index
+        table._category_index = self._category_index.copy()
+        table._status_index = self._status_index.copy()
+        return table
+
+    def apply_delta(self, delta):
+        """Aplica um OntDelta (snmp_poller) in-place e retorna a própria tabela.
+
+        Nos dois casos (completo ou incremental) a tabela passa por _sort() e
+        recategorize(): chaves, índices, ordens e revisão são refeitos.
+        """
+        if delta.full:
+            full = OnuTable.from_onts(delta.added, self.thresholds)
+            for column in self.COLUMNS:
+                setattr(self, column, getattr(full, column))
+        else:
+            self._apply_changes(delta)
+        self._sort()
+        self.recategorize()
+        return self
+
+    def _apply_changes(self, delta):
+        """Alteradas, removidas e adicionadas de um delta incremental, só nas colunas."""
+        added = list(delta.added)
+        if delta.changed:
+            changed = OnuTable.from_onts(delta.changed, self.thresholds)
+            positions = self.positions(changed)
+            # Alteradas que sumiram nesse meio tempo entram como novas
+            keep = np.isin(changed._keys, self._keys[positions])
+            for column in self.COLUMNS:
+                getattr(self, column)[positions] = getattr(changed, column)[keep]
+            added += changed.rows(np.flatnonzero(~keep))
+        if delta.removed:
+            keep = np.ones(len(self), dtype=bool)
+            keep[self.positions(delta.removed)] = False
+            for column in self.COLUMNS:
+                setattr(self, column, getattr(self, column)[keep])
+        if added:
+            added = OnuTable.from_onts(added, self.thresholds)
+            for column in self.COLUMNS:
+                setattr(self, column, np.concatenate([getattr(self, column), getattr(added, column)]))
+
+    def recategorize(self, positions=None):
+        """Recalcula a categoria das linhas indicadas (todas se None) e a contagem.
+
+        Chamar também depois de trocar os limites em self.thresholds.
+        """
+        rows = slice(None) if positions is None else positions
+        critical, very_low = self.thresholds.columns(self.if_index[rows], self.port_name[rows])
+        codes, counts = categorize(self.link_status[rows], self.reg_status[rows], self.rx_power[rows],
+                                   critical, very_low)
+        if positions is None:
+            self.category[:] = codes
+            self._counts = counts
+            self._category_index = RowIndex(self.category)
+            self._status_index = RowIndex(self.link_status)
+        else:
+            # Só as linhas indicadas: contagem e índice ajustados pela diferença
+            old = self.category[positions]
+            self.category[positions] = codes
+            self._counts = self._counts.copy()
+            np.subtract.at(self._counts, old, 1)
+            np.add.at(self._counts, codes, 1)
+            self._category_index.update(np.asarray(positions), old, codes)
+        self._summary = None # Recalculado no próximo summary()
+        self._orders = {} # Categoria/potência mudaram: ordens refeitas sob demanda
+        self.revision = next(_revisions)
+
+    def _summarize(self):
+        """Contadores do summary(); as linhas de uma porta são contíguas (ordem por ifIndex)."""
+        online = list(ONLINE_CATEGORIES)
+        summary = {
+            'total': len(self),
+            'online': int(self._counts[online].sum()),
+            'offline': int(self._counts[CATEGORY_OFFLINE]),
+            'categories': named_counts(self._counts),
+            'ports': []
+        }
+        if not len(self):
+            return summary
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(self.if_index)) + 1))
+        port_rows = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(self))))
+        per_port = np.bincount(port_rows * len(CATEGORIES) + self.category,
+                               minlength=len(starts) * len(CATEGORIES)).reshape(len(starts), len(CATEGORIES))
+        totals = per_port.sum(axis=1).tolist()
+        onlines = per_port[:, online].sum(axis=1).tolist()
+        offlines = per_port[:, CATEGORY_OFFLINE].tolist()
+        for port, start in enumerate(starts.tolist()):
+            summary['ports'].append({
+                'ifIndex': int(self.if_index[start]),
+                'portName': self.port_name[start],
+                'total': totals[port],
+                'online': onlines[port],
+                'offline': offlines[port],
+                'categories': named_counts(per_port[port])
+            })
+        return summary
+
+    def set_link_status(self, positions, link_status):
+        """Troca o estado de link das linhas indicadas e recategoriza essas linhas.
+
+        Offline zera as leituras de potência, como a OLT faz na próxima coleta.
+        """
+        old = self.link_status[positions]
+        self.link_status[positions] = link_status
+        self._status_index.update(np.asarray(positions), old, self.link_status[positions])
+        self.modified_at = time.time()
+        if link_status != LINK_ONLINE:
+            self.rx_power[positions] = np.nan
+            self.tx_power[positions] = np.nan
+        self.recategorize(positions)
+
+    def __repr__(self):
+        return f'<OnuTable {len(self)} ONUs>'
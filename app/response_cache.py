@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Respostas pré-codificadas por snapshot, com ETag e compressão.
+
+Um EncodedPayload guarda o corpo já serializado e comprimido (gzip e, se
+o pacote opcional brotli estiver instalado, br) uma vez por snapshot e
+filtro; cada requisição só escolhe a codificação pelo Accept-Encoding e
+responde 304 quando o If-None-Match/If-Modified-Since bate.
+
+O ETag é um hash do corpo, igual em todos os workers para o mesmo
+conteúdo, com a codificação como sufixo (cada representação tem o seu).
+"""
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError: # Opcional: sem o pacote brotli, só gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Abaixo disso a compressão não compensa o custo de descomprimir
+MIN_COMPRESS_BYTES = 1024
+
+
+class EncodedPayload:
+    """Corpo de resposta em cada codificação disponível, com ETag e Last-Modified."""
+
+    def __init__(self, body, last_modified, mimetype='application/json'):
+        self.encodings = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encodings['gzip'] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.last_modified = last_modified
+        self.mimetype = mimetype
+
+    @property
+    def nbytes(self):
+        return sum(len(body) for body in self.encodings.values())
+
+    def choose_encoding(self, accept_encodings):
+        """Melhor codificação aceita pelo cliente (br > gzip > identidade)."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accept_encodings.quality(encoding) > 0:
+                return encoding
+        return 'identity'
+
+    def response(self, request, response_class):
+        """Resposta para a requisição: 200 com o corpo na codificação escolhida, ou 304."""
+        encoding = self.choose_encoding(request.accept_encodings)
+        response = response_class(self.encodings[encoding], mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(self.etag if encoding == 'identity' else f'{self.etag}-{encoding}')
+        response.last_modified = self.last_modified
+        # Dado autenticado: o navegador guarda, mas revalida a cada uso
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
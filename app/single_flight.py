@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Coleta única por chave (single-flight) entre threads e entre workers.
+
+Quando o cache do dashboard expira, várias requisições simultâneas
+disparariam a mesma coleta na OLT. SingleFlight.do((olt, conjunto), func)
+garante uma execução por vez por chave:
+
+- no mesmo processo, a primeira thread executa func e as demais esperam e
+  recebem o mesmo resultado (ou a mesma exceção);
+- entre workers do gunicorn, quem executa segura um flock em
+  instance/locks/. Um worker que encontra o lock ocupado espera o outro
+  terminar e então chama recheck(): se o dado já estiver disponível (por
+  exemplo no cache compartilhado), usa-o em vez de coletar de novo.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError: # Sem flock (Windows): só a coordenação entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR') or os.path.join(basedir, 'instance', 'locks')
+
+# Espera máxima pelo lock de outro worker (segundos); depois disso coleta assim mesmo
+SINGLE_FLIGHT_TIMEOUT = 120
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+_UNSAFE_CHARS_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce chamadas concorrentes de func por chave."""
+
+    def __init__(self, lock_dir=SINGLE_FLIGHT_LOCK_DIR, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, recheck=None):
+        """Executa func() uma vez por chave e devolve o resultado a todos os que esperam.
+
+        recheck(), se informado, roda depois de obtido o lock entre workers;
+        um resultado diferente de None dispensa func().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, func, recheck)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, key, func, recheck):
+        fd = self._acquire_file_lock(key)
+        try:
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    return result
+            return func()
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _lock_path(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        name = '_'.join(_UNSAFE_CHARS_RE.sub('-', str(part)) for part in parts)
+        return os.path.join(self.lock_dir, f'{name}.lock')
+
+    def _acquire_file_lock(self, key):
+        """flock exclusivo no arquivo da chave; None se indisponível ou se a espera estourou."""
+        if fcntl is None:
+            return None
+        path = self._lock_path(key)
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            logger.warning(f"Não foi possível abrir {path}: {e}")
+            return None
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Lock {path} ocupado há mais de {self.timeout}s; coletando sem ele")
+                    os.close(fd)
+                    return None
+                time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+
+snmp_flights = SingleFlight()
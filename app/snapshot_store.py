@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Snapshots versionados compartilhados entre os workers do gunicorn.
+
+Cada worker tinha o próprio cache do dashboard e coletava a OLT por conta
+própria. Aqui o resultado de uma coleta vai para um SQLite em modo WAL em
+instance/ (leitores não bloqueiam o escritor), uma linha por (olt,
+conjunto) com:
+
+- version: incrementada a cada gravação; o worker só relê o conteúdo
+  quando a versão muda;
+- fetched_at: hora da coleta (epoch), base da validade do cache;
+- meta: JSON pequeno (informações da OLT, erros...);
+- data: blob opcional (ex.: OnuTable.to_bytes()).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SNAPSHOT_DB_FILE = os.environ.get('SNAPSHOT_DB_FILE') or os.path.join(basedir, 'instance', 'snapshots.db')
+SNAPSHOT_BUSY_TIMEOUT = 10 # segundos esperando o lock de escrita do SQLite
+
+SnapshotInfo = namedtuple('SnapshotInfo', 'version fetched_at')
+Snapshot = namedtuple('Snapshot', 'version fetched_at meta data')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    olt TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    meta TEXT,
+    data BLOB,
+    PRIMARY KEY (olt, dataset)
+)
+"""
+
+
+class SnapshotStore:
+    """Tabela snapshots em SQLite WAL, uma conexão por thread."""
+
+    def __init__(self, path=SNAPSHOT_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=SNAPSHOT_BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def info(self, olt, dataset):
+        """SnapshotInfo (versão e hora da coleta) sem ler o conteúdo; None se não houver."""
+        row = self._connection().execute(
+            'SELECT version, fetched_at FROM snapshots WHERE olt = ? AND dataset = ?', (olt, dataset)).fetchone()
+        return SnapshotInfo(*row) if row else None
+
+    def get(self, olt, dataset):
+        """Snapshot completo (meta já decodificado do JSON); None se não houver."""
+        row = self._connection().execute(
+            'SELECT version, fetched_at, meta, data FROM snapshots WHERE olt = ? AND dataset = ?',
+            (olt, dataset)).fetchone()
+        if row is None:
+            return None
+        version, fetched_at, meta, data = row
+        return Snapshot(version, fetched_at, json.loads(meta) if meta else None, data)
+
+    def meta(self, olt, dataset):
+        """Só o meta (decodificado) do snapshot, sem ler o blob; None se não houver."""
+        row = self._connection().execute(
+            'SELECT meta FROM snapshots WHERE olt = ? AND dataset = ?', (olt, dataset)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def put(self, olt, dataset, meta=None, data=None, fetched_at=None):
+        """Grava um snapshot novo e retorna a versão atribuída."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT INTO snapshots (olt, dataset, version, fetched_at, meta, data) VALUES (?, ?, 1, ?, ?, ?) '
+                'ON CONFLICT (olt, dataset) DO UPDATE SET version = version + 1, fetched_at = excluded.fetched_at, '
+                'meta = excluded.meta, data = excluded.data',
+                (olt, dataset, fetched_at, json.dumps(meta) if meta is not None else None, data))
+            version = connection.execute(
+                'SELECT version FROM snapshots WHERE olt = ? AND dataset = ?', (olt, dataset)).fetchone()[0]
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return version
+
+    def expire(self, olt, dataset=None):
+        """Marca os snapshots da OLT como vencidos (a próxima leitura força coleta); o conteúdo fica."""
+        if dataset is None:
+            self._connection().execute('UPDATE snapshots SET fetched_at = 0 WHERE olt = ?', (olt,))
+        else:
+            self._connection().execute(
+                'UPDATE snapshots SET fetched_at = 0 WHERE olt = ? AND dataset = ?', (olt, dataset))
+
+
+snapshot_store = SnapshotStore()
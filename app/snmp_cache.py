@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""Caches de estado SNMP por OLT.
+
+Os caches persistentes guardam dados que quase nunca mudam na OLT (índice
+da entidade principal, mapa de interfaces) em um arquivo JSON em instance/,
+compartilhado entre os workers do gunicorn. Cada um sabe quando invalidar a
+entrada a partir de um GET barato, evitando refazer walks completos a cada
+coleta.
+
+SnapshotCache é o cache em memória do worker para os dados já coletados,
+por (olt, conjunto): validade própria para dados lentos (informações da
+entidade, mapa de interfaces) e rápidos (estado/potência das ONUs), limite
+de memória com despejo LRU e estatísticas de acerto. payload_cache é uma
+instância à parte, pequena e limitada também em número de entradas, para as
+respostas de /api/onus: as chaves vêm de parâmetros do usuário (busca,
+página) e não podem despejar os snapshots.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+try:
+    import fcntl
+except ImportError: # Sem flock (Windows): só a coordenação entre threads
+    fcntl = None
+
+from app.snmp_decode import port_positions
+
+logger = logging.getLogger(__name__)
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SNMP_STATE_FILE = os.environ.get('SNMP_STATE_FILE') or os.path.join(basedir, 'instance', 'snmp_state.json')
+
+# Folga ao comparar sysUpTime com o tempo decorrido (centésimos de segundo):
+# 60s fixos + 1% do intervalo, para absorver deriva de relógio da OLT.
+UPTIME_TOLERANCE_TICKS = 6000
+UPTIME_TOLERANCE_RATIO = 0.01
+
+# Conjuntos do SnapshotCache e validade de cada um (segundos)
+DATASET_OLT_INFO = 'olt_info'
+DATASET_INTERFACE_MAP = 'interface_map'
+DATASET_ONUS = 'onus'
+DATASET_ONUS_JSON = 'onus_json' # Respostas de /api/onus pré-codificadas, por consulta (filtro, ordem, busca, página)
+SLOW_DATA_TTL = 900 # Entidade e interfaces: só mudam com troca de placa/configuração
+FAST_DATA_TTL = 60 # Estado e potência das ONUs
+DATASET_TTLS = {
+    DATASET_OLT_INFO: SLOW_DATA_TTL,
+    DATASET_INTERFACE_MAP: SLOW_DATA_TTL,
+    DATASET_ONUS: FAST_DATA_TTL
+}
+
+# Memória total do SnapshotCache por worker; uma entrada acima da fração
+# máxima não é guardada, para uma OLT grande não despejar todas as outras
+SNAPSHOT_CACHE_MAX_BYTES = int(os.environ.get('SNAPSHOT_CACHE_MAX_MB') or 256) * 1024 * 1024
+SNAPSHOT_CACHE_MAX_ENTRY_RATIO = 0.25
+
+# Respostas pré-codificadas de /api/onus (payload_cache), por worker
+PAYLOAD_CACHE_MAX_BYTES = int(os.environ.get('PAYLOAD_CACHE_MAX_MB') or 32) * 1024 * 1024
+PAYLOAD_CACHE_MAX_ENTRIES = 128
+
+# Mapa de interfaces decodificado: {ifIndex: ifDescr} e {ifIndex: (frame, slot, porta)}
+InterfaceMap = namedtuple('InterfaceMap', 'ports positions')
+
+
+class SidecarStore:
+    """Arquivo JSON {olt: {nome: registro}} com recarga por mtime e escrita atômica.
+
+    A gravação (ler, alterar, escrever) roda sob flock em um arquivo .lock ao
+    lado, como o single-flight: dois workers gravando ao mesmo tempo não
+    perdem o registro um do outro.
+    """
+
+    def __init__(self, path=SNMP_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        self._mtime = None
+
+    def _reload(self, force=False):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime and not force:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self._data = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"Não foi possível ler {self.path}: {e}")
+
+    def get(self, olt_key, name):
+        with self._lock:
+            self._reload()
+            return self._data.get(olt_key, {}).get(name)
+
+    def set(self, olt_key, name, record):
+        with self._lock, self._file_lock():
+            self._reload(force=True)
+            self._data.setdefault(olt_key, {})[name] = record
+            self._write()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """flock exclusivo entre processos; sem fcntl (ou sem acesso ao diretório), segue sem ele."""
+        fd = None
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning(f"Não foi possível travar {self.path}: {e}")
+                if fd is not None:
+                    os.close(fd)
+                    fd = None
+        try:
+            yield
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snmp_state.')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar {self.path}: {e}")
+
+
+def olt_rebooted(record, uptime_ticks, now=None):
+    """True se o sysUpTime atual é incompatível com o registrado (reboot ou wrap)."""
+    if uptime_ticks is None or record.get('uptime_ticks') is None:
+        return True
+    elapsed_ticks = ((now or time.time()) - record['checked_at']) * 100
+    expected = record['uptime_ticks'] + elapsed_ticks
+    tolerance = UPTIME_TOLERANCE_TICKS + elapsed_ticks * UPTIME_TOLERANCE_RATIO
+    return uptime_ticks + tolerance < expected
+
+
+class EntityIndexCache:
+    """Índice da entidade principal (chassis/MPLA/controladora) por OLT.
+
+    A entrada vale até a OLT reiniciar (sysUpTime menor que o esperado) ou o
+    entLastChangeTime mudar. O sysUpTime vem no GET do sysDescr; o
+    entLastChangeTime, em um GET à parte, porque nem todo agente o implementa.
+    """
+
+    NAME = 'entity_index'
+
+    def __init__(self, store):
+        self.store = store
+
+    def lookup(self, olt_key, uptime_ticks, ent_last_change):
+        record = self.store.get(olt_key, self.NAME)
+        if not record:
+            return None
+        if olt_rebooted(record, uptime_ticks):
+            logger.info(f"{olt_key}: reboot detectado, índice de entidade invalidado")
+            return None
+        # None: o agente não informa entLastChangeTime, só o reboot invalida
+        if ent_last_change is not None and record.get('ent_last_change') != ent_last_change:
+            logger.info(f"{olt_key}: entLastChangeTime mudou, índice de entidade invalidado")
+            return None
+        return record['index']
+
+    def store_index(self, olt_key, index, uptime_ticks, ent_last_change):
+        self.store.set(olt_key, self.NAME, {
+            'index': index,
+            'uptime_ticks': uptime_ticks,
+            'ent_last_change': ent_last_change,
+            'checked_at': time.time()
+        })
+
+
+class InterfaceMapCache:
+    """Mapa ifIndex -> porta por OLT.
+
+    Validado por sysUpTime, ifNumber e ifTableLastChange (este em GET à
+    parte, None se o agente não o tiver): o walk em ifDescr só é refeito
+    quando a OLT reinicia ou a tabela de interfaces muda. As posições (frame, slot, porta) são decodificadas uma vez, ao
+    gravar, e mantidas também em memória para não reconverter o JSON.
+    """
+
+    NAME = 'interface_map'
+
+    def __init__(self, store):
+        self.store = store
+        self._decoded = {}
+
+    def lookup(self, olt_key, uptime_ticks, if_last_change, if_number):
+        record = self.store.get(olt_key, self.NAME)
+        if not record:
+            return None
+        if olt_rebooted(record, uptime_ticks):
+            logger.info(f"{olt_key}: reboot detectado, mapa de interfaces invalidado")
+            return None
+        if (record.get('if_last_change'), record.get('if_number')) != (if_last_change, if_number):
+            logger.info(f"{olt_key}: tabela de interfaces mudou, mapa invalidado")
+            return None
+        return self._decode(olt_key, record)
+
+    def store_map(self, olt_key, ports, uptime_ticks, if_last_change, if_number):
+        record = {
+            'ports': {str(if_index): descr for if_index, descr in ports.items()},
+            'positions': {str(if_index): position for if_index, position in port_positions(ports).items()},
+            'uptime_ticks': uptime_ticks,
+            'if_last_change': if_last_change,
+            'if_number': if_number,
+            'checked_at': time.time()
+        }
+        self.store.set(olt_key, self.NAME, record)
+        return self._decode(olt_key, record)
+
+    def _decode(self, olt_key, record):
+        key = record['checked_at']
+        cached = self._decoded.get(olt_key)
+        if cached and cached[0] == key:
+            return cached[1]
+        if_map = InterfaceMap(
+            {int(if_index): descr for if_index, descr in record['ports'].items()},
+            {int(if_index): tuple(position) for if_index, position in record['positions'].items()})
+        self._decoded[olt_key] = (key, if_map)
+        return if_map
+
+
+sidecar_store = SidecarStore()
+entity_index_cache = EntityIndexCache(sidecar_store)
+interface_map_cache = InterfaceMapCache(sidecar_store)
+
+
+def estimate_size(value):
+    """Memória aproximada de um valor em cache (bytes).
+
+    Usa value.nbytes quando existe (OnuTable); dicts e tuplas somam o
+    tamanho raso dos itens.
+    """
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(key) + sys.getsizeof(item) for key, item in value.items())
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class CacheEntry:
+    """Valor em cache com a hora da coleta (epoch) e a versão do snapshot compartilhado."""
+
+    __slots__ = ('value', 'fetched_at', 'version', 'size')
+
+    def __init__(self, value, fetched_at, version, size):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.version = version
+        self.size = size
+
+    def age(self, now=None):
+        return (time.time() if now is None else now) - self.fetched_at
+
+
+class SnapshotCache:
+    """Cache LRU em memória por (olt, conjunto), limitado em bytes (e, se max_entries, em entradas)."""
+
+    def __init__(self, max_bytes=SNAPSHOT_CACHE_MAX_BYTES, ttls=None,
+                 max_entry_ratio=SNAPSHOT_CACHE_MAX_ENTRY_RATIO, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_entry_bytes = int(max_bytes * max_entry_ratio)
+        self.ttls = dict(DATASET_TTLS if ttls is None else ttls)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Reentrante e público: quem chama pode ler e trocar uma entrada (e o próprio estado) de forma atômica
+        self.lock = threading.RLock()
+        self._stats = dict.fromkeys(('hits', 'misses', 'expired', 'evictions', 'rejected'), 0)
+
+    def ttl(self, dataset):
+        return self.ttls.get(dataset, FAST_DATA_TTL)
+
+    def get(self, olt_key, dataset, max_age=None):
+        """Entrada com idade menor que max_age (padrão: a validade do conjunto), ou None.
+
+        Uma entrada vencida não é removida: uma leitura com max_age maior
+        (ex.: servir dado antigo enquanto atualiza) ainda a encontra.
+        """
+        max_age = self.ttl(dataset) if max_age is None else max_age
+        key = (olt_key, dataset)
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry.age() >= max_age:
+                self._stats['expired'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def peek(self, olt_key, dataset):
+        """Entrada de qualquer idade, sem contar nas estatísticas nem mexer na ordem LRU."""
+        with self.lock:
+            return self._entries.get((olt_key, dataset))
+
+    def put(self, olt_key, dataset, value, fetched_at=None, version=None):
+        """Guarda o valor e devolve a CacheEntry (também quando ela é grande demais para ficar)."""
+        entry = CacheEntry(value, time.time() if fetched_at is None else fetched_at, version, estimate_size(value))
+        key = (olt_key, dataset)
+        with self.lock:
+            self._remove(key)
+            if entry.size > self.max_entry_bytes:
+                self._stats['rejected'] += 1
+                logger.warning(f"{olt_key}/{dataset}: {entry.size} bytes, acima do limite por entrada; não guardado")
+                return entry
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > 1 and (self._bytes > self.max_bytes or
+                                              (self.max_entries and len(self._entries) > self.max_entries)):
+                evicted_key, _ = next(iter(self._entries.items()))
+                self._remove(evicted_key)
+                self._stats['evictions'] += 1
+        return entry
+
+    def invalidate(self, olt_key, dataset=None):
+        """Remove as entradas da OLT (ou só a do conjunto)."""
+        with self.lock:
+            keys = [key for key in self._entries if key[0] == olt_key and dataset in (None, key[1])]
+            for key in keys:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self):
+        """Contadores de acerto/falta/despejo e ocupação atual."""
+        with self.lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes,
+                         max_entries=self.max_entries)
+        lookups = stats['hits'] + stats['misses'] + stats['expired']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+snapshot_cache = SnapshotCache()
+payload_cache = SnapshotCache(PAYLOAD_CACHE_MAX_BYTES, max_entries=PAYLOAD_CACHE_MAX_ENTRIES)
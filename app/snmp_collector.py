@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Coletor SNMP assíncrono (asyncio) para várias OLTs.
+
+Todas as OLTs são consultadas ao mesmo tempo, respeitando um limite global de
+PDUs em voo e um limite por OLT, de modo que uma varredura completa leve
+aproximadamente o tempo da OLT mais lenta e não a soma de todas. Cada PDU
+respeita também a política da OLT (token bucket, timeout adaptativo e
+backoff), a mesma usada pelas sessões síncronas.
+"""
+
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from pysnmp.hlapi.asyncio import (
+    getCmd, bulkCmd, SnmpEngine, CommunityData, UdpTransportTarget,
+    ContextData, ObjectType, ObjectIdentity
+)
+
+from pysnmp.proto import errind
+
+from app.onu_categories import configure_olt_thresholds, get_thresholds
+from app.snmp_policy import TIMEOUT_MAX, configure_olt_policy, get_policy
+from app.snmp_session import BulkWalkState, SnmpError, oid_tuple
+from app.snmp_usm import olt_credentials, usm_user_data
+from app.snmp_utils import (
+    OID_SYS_DESCR, OID_SYS_UPTIME, OID_IF_DESCR, ONT_TABLE_OIDS, SNMP_MAX_REPETITIONS,
+    SNMP_SHARD_CONCURRENCY, build_interface_map, build_ont_list, parse_basic_info,
+    pon_if_indexes, varbind_table_to_dict
+)
+
+logger = logging.getLogger(__name__)
+
+# Limites de PDUs simultâneos (todas as OLTs / cada OLT)
+GLOBAL_MAX_IN_FLIGHT = 64
+PER_OLT_MAX_IN_FLIGHT = 4
+
+# usm: snmp_usm.V3Credentials quando version == '3'
+OltTarget = namedtuple('OltTarget', 'id name host community port version usm')
+
+
+def olt_targets(olts):
+    """Converte linhas da tabela OLT em alvos do coletor, aplicando os limites de cada uma."""
+    for olt in olts:
+        configure_olt_policy(olt)
+        configure_olt_thresholds(olt)
+    return [OltTarget(olt.id, olt.name, olt.ip_address, olt.snmp_community,
+                      olt.snmp_port or 161, olt.snmp_version or '2c', olt_credentials(olt))
+            for olt in olts]
+
+
+class _OltContext:
+    """Estado de uma OLT durante a varredura."""
+
+    def __init__(self, target, per_olt_limit, collection=False):
+        self.target = target
+        self.semaphore = asyncio.Semaphore(per_olt_limit)
+        self.policy = get_policy(target.host)
+        self.bucket = self.policy.bucket_for(collection)
+        if target.version == '3':
+            self.auth = usm_user_data(target.usm)
+        else:
+            self.auth = CommunityData(target.community, mpModel=1)
+        self.pdus = 0
+        self._transports = {}
+
+    def transport(self, timeout):
+        # Retentativas ficam a cargo de _request; o LCD do engine separa os
+        # degraus pelo timeout (sem tagList: em v2c ela descartaria as respostas).
+        transport = self._transports.get(timeout)
+        if transport is None:
+            transport = self._transports[timeout] = UdpTransportTarget(
+                (self.target.host, self.target.port), timeout=timeout, retries=0)
+        return transport
+
+
+class AsyncOltCollector:
+    """Varre várias OLTs em paralelo com um único SnmpEngine asyncio.
+
+    collection=True usa o bucket da coleta do dashboard (snmp_policy), que
+    só pode ser usado sob o single-flight entre workers.
+    """
+
+    def __init__(self, global_limit=GLOBAL_MAX_IN_FLIGHT, per_olt_limit=PER_OLT_MAX_IN_FLIGHT,
+                 max_repetitions=SNMP_MAX_REPETITIONS, shard_by_port=False, collection=False):
+        self.global_limit = global_limit
+        self.per_olt_limit = per_olt_limit
+        self.max_repetitions = max_repetitions
+        self.shard_by_port = shard_by_port
+        self.collection = collection
+        self._engine = None
+        self._global = None
+        self._context = ContextData()
+
+    async def collect(self, targets):
+        """Coleta todas as OLTs e retorna {'elapsed': s, 'olts': [resultado por OLT]}."""
+        # O engine asyncio fica preso ao loop em que foi criado, então nasce
+        # e morre com cada varredura (em v3 a descoberta do engineID custa um
+        # PDU por OLT e varredura; as chaves mestras vêm do cache de snmp_usm).
+        self._open()
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*[self._collect_olt(target) for target in targets])
+        finally:
+            self._close()
+        return {'elapsed': time.perf_counter() - started, 'olts': results}
+
+    async def walk_ont_table(self, target, if_indexes, oids=ONT_TABLE_OIDS):
+        """Walk das colunas de ONU (padrão ONT_TABLE_OIDS) de uma OLT, fatiado pelas portas PON indicadas."""
+        self._open()
+        try:
+            return await self._walk_shards(_OltContext(target, self.per_olt_limit, self.collection),
+                                           oids, if_indexes)
+        finally:
+            self._close()
+
+    def _open(self):
+        self._engine = SnmpEngine()
+        self._global = asyncio.Semaphore(self.global_limit)
+
+    def _close(self):
+        self._engine.transportDispatcher.closeDispatcher()
+        self._engine = None
+
+    async def _collect_olt(self, target):
+        started = time.perf_counter()
+        result = {'olt_id': target.id, 'name': target.name, 'ip': target.host,
+                  'olt_info': None, 'ont_list': None, 'error': None}
+        ctx = None
+        try:
+            if target.version not in ('2c', '3'):
+                # Os walks do coletor são todos GETBULK
+                raise ValueError("Versão SNMP não suportada")
+            ctx = _OltContext(target, self.per_olt_limit)
+            if self.shard_by_port:
+                # As fatias dependem das portas PON do mapa de interfaces
+                basic_info, if_data = await asyncio.gather(
+                    self._get(ctx, [OID_SYS_DESCR, OID_SYS_UPTIME]),
+                    self._walk(ctx, [OID_IF_DESCR]))
+                if_map = build_interface_map(if_data)
+                rows = await self._walk_shards(ctx, ONT_TABLE_OIDS, pon_if_indexes(if_map))
+            else:
+                # Cada coluna é um walk independente; o semáforo da OLT limita
+                # quantos deles têm PDU em voo ao mesmo tempo.
+                basic_info, if_data, *columns = await asyncio.gather(
+                    self._get(ctx, [OID_SYS_DESCR, OID_SYS_UPTIME]),
+                    self._walk(ctx, [OID_IF_DESCR]),
+                    *[self._walk(ctx, [oid]) for oid in ONT_TABLE_OIDS]
+                )
+                if_map = build_interface_map(if_data)
+                rows = (pair for column in columns for pair in column)
+            result['olt_info'] = dict(parse_basic_info(basic_info), ip=target.host)
+            result['ont_list'] = build_ont_list(rows, if_map, get_thresholds(target.host))
+        except Exception as e:
+            logger.error(f"Erro ao coletar OLT {target.name} ({target.host}): {e}")
+            result['error'] = str(e)
+        result['pdus'] = ctx.pdus if ctx else 0
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    async def _walk_shards(self, ctx, columns, if_indexes):
+        """Walk multi-coluna por porta PON (subárvore coluna.ifIndex), fatias em paralelo.
+
+        Sem portas conhecidas recai no walk das colunas inteiras. As fatias
+        dividem o bucket da OLT: o ganho sobre o walk serial é limitado pelo
+        ritmo configurado (ver snmp_policy).
+        """
+        if not if_indexes:
+            columns_rows = await asyncio.gather(*[self._walk(ctx, [oid]) for oid in columns])
+            return [pair for rows in columns_rows for pair in rows]
+        shards = await asyncio.gather(*[
+            self._walk(ctx, [f"{oid}.{if_index}" for oid in columns]) for if_index in if_indexes])
+        return [pair for rows in shards for pair in rows]
+
+    async def _request(self, ctx, command, *args, **options):
+        # Semáforo da OLT antes do global: quem espera pela própria OLT não
+        # ocupa vaga global.
+        policy = ctx.policy
+        timeout = policy.timeout()
+        async with ctx.semaphore:
+            for attempt in range(policy.retries + 1):
+                wait = ctx.bucket.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+                async with self._global:
+                    ctx.pdus += 1
+                    started = time.monotonic()
+                    error_indication, error_status, error_index, var_binds = await command(
+                        self._engine, ctx.auth, ctx.transport(timeout), self._context, *args, **options)
+                if not isinstance(error_indication, errind.RequestTimedOut):
+                    if not error_indication:
+                        policy.rtt.add(time.monotonic() - started)
+                    break
+                if attempt < policy.retries:
+                    await asyncio.sleep(policy.backoff(attempt))
+                    timeout = min(timeout * 2, TIMEOUT_MAX)
+        if error_indication:
+            raise SnmpError(error_indication)
+        return error_status, error_index, var_binds
+
+    async def _get(self, ctx, oids):
+        error_status, error_index, var_binds = await self._request(
+            ctx, getCmd, *[ObjectType(ObjectIdentity(oid)) for oid in oids])
+        if error_status:
+            raise SnmpError(None, error_status, error_index)
+        return varbind_table_to_dict([var_binds])
+
+    async def _walk(self, ctx, oids):
+        """Walk GETBULK; retorna [(oid_tupla, valor bruto)]."""
+        state = BulkWalkState(oids, self.max_repetitions, self.max_repetitions)
+        table = []
+        while state.active:
+            error_status, error_index, rows = await self._request(
+                ctx, bulkCmd, 0, state.repetitions,
+                *[ObjectType(ObjectIdentity(oid)) for oid in state.next_oids()], lookupMib=False)
+            if state.too_big(error_status):
+                continue
+            if error_status:
+                raise SnmpError(None, error_status, error_index)
+            for row in state.feed(rows):
+                table.extend((oid_tuple(name), value) for name, value in row)
+        return table
+
+
+def collect_olts(targets, **kwargs):
+    """Executa uma varredura completa de forma síncrona (CLI, jobs)."""
+    return asyncio.run(AsyncOltCollector(**kwargs).collect(targets))
+
+
+def walk_ont_shards(target, if_indexes, concurrency=SNMP_SHARD_CONCURRENCY, collection=False, oids=ONT_TABLE_OIDS):
+    """Walk fatiado por porta PON de forma síncrona; até concurrency fatias em voo.
+
+    Retorna [(oid_tupla, valor)] na mesma forma de iter_snmp_walk.
+    """
+    collector = AsyncOltCollector(per_olt_limit=concurrency, collection=collection)
+    return asyncio.run(collector.walk_ont_table(target, if_indexes, oids))
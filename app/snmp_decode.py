@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Decodificação tipada dos valores SNMP das tabelas de ONU.
+
+Os valores saem dos objetos pysnmp direto para tipos nativos (bytes, int,
+float em dBm) e seguem assim até a categorização. A formatação em texto
+('online', '-15.23 dBm', serial legível) só acontece na borda JSON/template,
+em format_ont.
+"""
+
+import re
+
+# Estados (HUAWEI-GONU-MIB)
+LINK_ONLINE = 1
+LINK_OFFLINE = 2
+REG_REGISTERED = 1
+REG_UNREGISTERED = 2
+
+LINK_STATUS_NAMES = {1: 'online', 2: 'offline', 3: 'unknown'}
+REG_STATUS_NAMES = {1: 'registered', 2: 'unregistered', 3: 'unknown'}
+
+# entPhysicalClass (ENTITY-MIB, PhysicalClass)
+PHYSICAL_CLASS_NAMES = {
+    1: 'other', 2: 'unknown', 3: 'chassis', 4: 'backplane', 5: 'container', 6: 'powerSupply',
+    7: 'fan', 8: 'sensor', 9: 'module', 10: 'port', 11: 'stack', 12: 'cpu'
+}
+
+# frame/slot/porta no ifDescr (ex.: "GPON 0/1/0", "PON0/6/0", "GE0/2/0")
+_PORT_POSITION_RE = re.compile(r'(\d+)/(\d+)/(\d+)')
+
+# Valor que a OLT devolve quando não há leitura óptica (ONU offline)
+POWER_NOT_AVAILABLE = 2147483647
+
+
+def decode_octets(value):
+    """OctetString -> bytes."""
+    return value.asOctets()
+
+
+def decode_int(value):
+    """Integer/Integer32 -> int."""
+    return int(value)
+
+
+def decode_text(value):
+    """DisplayString -> str (como prettyPrint: hex se não for imprimível)."""
+    return value.prettyPrint()
+
+
+def decode_physical_class(value):
+    """entPhysicalClass -> nome da classe ('chassis', 'module'...)."""
+    return PHYSICAL_CLASS_NAMES.get(int(value), 'unknown')
+
+
+def decode_power(value):
+    """Potência em centésimos de dBm -> float em dBm (None se indisponível)."""
+    raw = int(value)
+    if raw == POWER_NOT_AVAILABLE:
+        return None
+    return raw / 100.0
+
+
+def decode_port_position(descr):
+    """ifDescr -> (frame, slot, porta), ou None se a descrição não tiver esse formato."""
+    match = _PORT_POSITION_RE.search(descr)
+    if not match:
+        return None
+    return tuple(int(part) for part in match.groups())
+
+
+def port_positions(ports):
+    """{ifIndex: ifDescr} -> {ifIndex: (frame, slot, porta)}, ignorando interfaces sem posição."""
+    positions = {}
+    for if_index, descr in ports.items():
+        position = decode_port_position(descr)
+        if position:
+            positions[if_index] = position
+    return positions
+
+
+def format_serial(raw):
+    """Serial GPON em texto: ASCII se imprimível, senão fabricante + hex (ex.: HWTC1A2B3C4D)."""
+    if raw is None:
+        return 'N/A'
+    if raw.isascii() and raw.decode('ascii').isprintable():
+        return raw.decode('ascii')
+    vendor = raw[:4]
+    if len(raw) > 4 and vendor.isalnum() and vendor.isupper():
+        return vendor.decode('ascii') + raw[4:].hex().upper()
+    return raw.hex().upper()
+
+
+def format_text(raw):
+    """OctetString textual (ex.: LOID) -> str."""
+    if raw is None:
+        return 'N/A'
+    return raw.decode('utf-8', errors='replace')
+
+
+def format_power(dbm):
+    if dbm is None:
+        return 'N/A'
+    return f"{dbm:.2f} dBm"
+
+
+def format_ont(ont):
+    """Converte uma ONU com valores nativos para o formato texto da API/template."""
+    link_status = ont['linkStatus']
+    reg_status = ont['regStatus']
+    return {
+        'ifIndex': ont['ifIndex'],
+        'onuId': ont['onuId'],
+        'portName': ont['portName'],
+        'serialNumber': format_serial(ont['serialNumber']),
+        'loid': format_text(ont['loid']),
+        'linkStatus': 'unknown' if link_status is None else LINK_STATUS_NAMES.get(link_status, 'invalid'),
+        'regStatus': 'unknown' if reg_status is None else REG_STATUS_NAMES.get(reg_status, 'invalid'),
+        'rxPower': format_power(ont['rxPower']),
+        'txPower': format_power(ont['txPower']),
+        'category': ont['category']
+    }
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Despacho de varbinds por prefixo de OID, sobre tuplas numéricas.
+
+Um OidDispatcher é montado uma vez por tabela (coluna -> campo e
+decodificador) e resolve cada varbind de um walk com uma busca em dict
+pelo prefixo da coluna: sem montar strings de OID e sem comparar o OID
+com cada coluna em sequência. O que sobra depois do prefixo é o índice
+da linha (ex.: (ifIndex, onuId) nas tabelas de ONU).
+"""
+
+import logging
+from collections import namedtuple
+
+from app.snmp_session import oid_tuple
+
+logger = logging.getLogger(__name__)
+
+# Erros de decodificação que descartam só o varbind
+DECODE_ERRORS = (ValueError, TypeError, AttributeError)
+
+# Resultado de OidDispatcher.match
+OidMatch = namedtuple('OidMatch', 'field decoder index')
+
+
+class OidDispatcher:
+    """Tabela {prefixo da coluna: (campo, decodificador)} para varbinds de walk.
+
+    columns: {oid da coluna (str ou tupla): (campo, decodificador)}.
+    index_length: tamanho esperado do índice; OIDs com outro tamanho são
+    ignorados (None aceita qualquer tamanho a partir de 1).
+    """
+
+    def __init__(self, columns, index_length=None):
+        self.index_length = index_length
+        self._columns = {}
+        for oid, (field, decoder) in columns.items():
+            self._columns[oid_tuple(oid)] = (field, decoder)
+        # Colunas de mesmo tamanho (o caso comum) custam uma busca só
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._columns}, reverse=True)
+
+    def match(self, oid):
+        """OidMatch do OID (tupla), ou None se não for de nenhuma coluna."""
+        for length in self._prefix_lengths:
+            column = self._columns.get(oid[:length])
+            if column is not None:
+                index = oid[length:]
+                if not index or (self.index_length is not None and len(index) != self.index_length):
+                    return None
+                return OidMatch(column[0], column[1], index)
+        return None
+
+    def dispatch(self, rows):
+        """Gera (índice, campo, valor decodificado) para as linhas (oid_tupla, valor) reconhecidas.
+
+        Varbinds que o decodificador recusa são registrados e pulados.
+        """
+        columns = self._columns
+        index_length = self.index_length
+        if len(self._prefix_lengths) == 1 and index_length is not None:
+            # Caminho rápido: prefixo e índice de tamanho fixo, um slice e um get por varbind
+            length = self._prefix_lengths[0]
+            total = length + index_length
+            for oid, value in rows:
+                if len(oid) != total:
+                    continue
+                column = columns.get(oid[:length])
+                if column is None:
+                    continue
+                try:
+                    decoded = column[1](value)
+                except DECODE_ERRORS as e:
+                    logger.warning(f"Erro ao processar OID {oid} com valor {value!r}: {e}")
+                    continue
+                yield oid[length:], column[0], decoded
+            return
+        for oid, value in rows:
+            match = self.match(oid)
+            if match is None:
+                continue
+            try:
+                decoded = match.decoder(value)
+            except DECODE_ERRORS as e:
+                logger.warning(f"Erro ao processar OID {oid} com valor {value!r}: {e}")
+                continue
+            yield match.index, match.field, decoded
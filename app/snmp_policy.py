@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Política de tráfego SNMP por OLT: ritmo de PDUs, timeout e retentativas.
+
+Todo PDU enviado a uma OLT (SnmpSession, e por ela SNMPManager, snmp_utils
+e os controllers; e o coletor asyncio) passa pela política do host:
+
+- um token bucket limita os PDUs por segundo, para não saturar a CPU da
+  controladora quando vários workers e atualizações manuais coincidem;
+- o timeout acompanha o percentil das RTTs medidas, arredondado para
+  poucos degraus (cada valor distinto vira uma entrada no LCD do pysnmp);
+- timeouts são retentados com backoff exponencial e timeout dobrado.
+
+O ritmo da OLT é repartido em dois buckets por processo, de modo que a soma
+entre todos os workers respeite o valor configurado:
+
+- collection_bucket: SNMP_COLLECTION_SHARE do limite, inteiro, para os walks
+  da coleta do dashboard. Ela roda sob o single-flight entre workers
+  (app.single_flight), então só um processo por vez usa esse bucket;
+- bucket: o restante, dividido por WEB_CONCURRENCY, para os demais PDUs
+  (GETs pontuais, controllers, walks avulsos).
+
+Walks fatiados por porta (SNMP_SHARD_CONCURRENCY) só ganham enquanto o ritmo
+não é o gargalo: o walk leva cerca de PDUs / min(ritmo, fatias / RTT). Com os
+padrões (80 PDU/s, 75% para a coleta = 60 PDU/s), quatro fatias a 40 ms de
+RTT pedem 100 PDU/s e ficam em 60, ~2,4x o walk serial (25 PDU/s); para o
+ganho inteiro, suba SNMP_RATE_LIMIT ou o snmp_rate_limit da OLT.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# PDUs/s e rajada por OLT quando a linha da OLT não define outro valor
+SNMP_DEFAULT_RATE_LIMIT = float(os.environ.get('SNMP_RATE_LIMIT') or 80)
+SNMP_DEFAULT_BURST = int(os.environ.get('SNMP_RATE_BURST') or 10)
+# Fração do limite reservada aos walks da coleta (um worker por vez)
+SNMP_COLLECTION_SHARE = min(0.95, max(0.0, float(os.environ.get('SNMP_COLLECTION_SHARE') or 0.75)))
+SNMP_DEFAULT_TIMEOUT = 1
+SNMP_DEFAULT_RETRIES = 5
+SNMP_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY') or 1))
+
+# Timeout adaptativo: percentil das RTTs x fator, entre MIN e MAX, em degraus
+RTT_WINDOW = 64
+RTT_MIN_SAMPLES = 8
+RTT_PERCENTILE = 0.95
+RTT_TIMEOUT_FACTOR = 3
+TIMEOUT_MIN = 0.5
+TIMEOUT_MAX = 8.0
+TIMEOUT_STEP = 0.25
+
+# Backoff entre retentativas (segundos): base * 2^tentativa, com jitter
+RETRY_BACKOFF_BASE = 0.2
+RETRY_BACKOFF_MAX = 5.0
+
+
+class TokenBucket:
+    """Token bucket thread-safe com reserva: tokens podem ficar negativos.
+
+    reserve() desconta um token e devolve quanto esperar antes de enviar, o
+    que serve tanto para time.sleep quanto para asyncio.sleep.
+    """
+
+    def __init__(self, rate, burst):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def configure(self, rate, burst):
+        with self._lock:
+            self.rate = max(float(rate), 0.01)
+            self.burst = max(int(burst), 1)
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+
+class RttEstimator:
+    """Janela das últimas RTTs e o timeout derivado delas."""
+
+    def __init__(self, window=RTT_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, rtt):
+        with self._lock:
+            self._samples.append(rtt)
+
+    def percentile(self, fraction=RTT_PERCENTILE):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self, default=SNMP_DEFAULT_TIMEOUT):
+        with self._lock:
+            enough = len(self._samples) >= RTT_MIN_SAMPLES
+        if not enough:
+            return quantize_timeout(default)
+        return quantize_timeout(self.percentile() * RTT_TIMEOUT_FACTOR)
+
+
+def quantize_timeout(seconds):
+    """Arredonda para cima no degrau TIMEOUT_STEP, dentro de [TIMEOUT_MIN, TIMEOUT_MAX]."""
+    steps = math.ceil(seconds / TIMEOUT_STEP)
+    return min(TIMEOUT_MAX, max(TIMEOUT_MIN, steps * TIMEOUT_STEP))
+
+
+class OltPolicy:
+    """Buckets, estimador de RTT e retentativas de uma OLT."""
+
+    def __init__(self, host, rate=None, burst=None, retries=None):
+        self.host = host
+        self.bucket = TokenBucket(SNMP_DEFAULT_RATE_LIMIT, SNMP_DEFAULT_BURST)
+        self.collection_bucket = TokenBucket(SNMP_DEFAULT_RATE_LIMIT, SNMP_DEFAULT_BURST)
+        self.rtt = RttEstimator()
+        self.retries = SNMP_DEFAULT_RETRIES
+        self.configure(rate, burst, retries)
+
+    def configure(self, rate=None, burst=None, retries=None):
+        """Aplica limites da linha da OLT; None mantém o padrão."""
+        rate = rate or SNMP_DEFAULT_RATE_LIMIT
+        burst = burst or SNMP_DEFAULT_BURST
+        self.bucket.configure(rate * (1 - SNMP_COLLECTION_SHARE) / SNMP_WORKERS, burst)
+        self.collection_bucket.configure(rate * SNMP_COLLECTION_SHARE, burst)
+        self.retries = SNMP_DEFAULT_RETRIES if retries is None else max(0, int(retries))
+
+    def bucket_for(self, collection=False):
+        """Bucket dos walks da coleta (collection=True) ou dos demais PDUs."""
+        return self.collection_bucket if collection else self.bucket
+
+    def timeout(self):
+        return self.rtt.timeout()
+
+    def backoff(self, attempt):
+        """Espera antes da retentativa número attempt (0 = primeira)."""
+        delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def __repr__(self):
+        return (f'<OltPolicy {self.host} {self.bucket.rate:.1f}+{self.collection_bucket.rate:.1f} PDU/s '
+                f'burst={self.bucket.burst} '
+                f'timeout={self.timeout()}s retries={self.retries}>')
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(host):
+    """Política compartilhada da OLT (criada com os padrões se necessário)."""
+    with _policies_lock:
+        policy = _policies.get(host)
+        if policy is None:
+            policy = _policies[host] = OltPolicy(host)
+        return policy
+
+
+def configure_policy(host, rate=None, burst=None, retries=None):
+    policy = get_policy(host)
+    policy.configure(rate, burst, retries)
+    return policy
+
+
+def configure_olt_policy(olt):
+    """Aplica os limites de uma linha da tabela OLT."""
+    return configure_policy(olt.ip_address, olt.snmp_rate_limit, olt.snmp_rate_burst, olt.snmp_retries)
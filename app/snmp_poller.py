@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Coleta incremental da tabela de ONUs.
+
+Entre duas coletas só uma pequena parte das ONUs muda, e quase sempre nas
+colunas voláteis (estado do link, registro, potências). O poller guarda o
+último snapshot de cada OLT, relê a cada coleta apenas essas colunas e só
+volta às colunas de identidade (serial, LOID) quando aparecem ONUs novas ou
+no ciclo lento. O resultado é um delta (adicionadas/removidas/alteradas) que
+pode ser aplicado sobre a lista que o chamador já tem.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from app.onu_categories import categorize_onts, get_thresholds
+from app.onu_table import OnuTable
+from app.snmp_session import SnmpError, oid_tuple
+from app.snmp_utils import (
+    OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_LOID, OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER, OID_HW_GONU_TX_POWER,
+    get_interface_map, get_olt_session, merge_ont_rows, walk_ont_columns
+)
+
+logger = logging.getLogger(__name__)
+
+# Colunas relidas em toda coleta
+VOLATILE_OIDS = [
+    OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS,
+    OID_HW_GONU_RX_POWER,
+    OID_HW_GONU_TX_POWER
+]
+# Colunas relidas só quando o conjunto de ONUs cresce ou no ciclo lento
+IDENTITY_OIDS = [
+    OID_HW_GONU_SERIAL_NUMBER,
+    OID_HW_GONU_LOID
+]
+IDENTITY_FIELDS = ('serialNumber', 'loid')
+# Campos comparados para decidir se a ONU mudou: só o que vem da OLT. A
+# categoria é derivada (e depende dos limites), não entra.
+SNMP_FIELDS = ('portName', 'serialNumber', 'loid', 'linkStatus', 'regStatus', 'rxPower', 'txPower')
+
+# Até quantas ONUs novas a identidade vem por GET em vez de walk, e quantos
+# varbinds por PDU nesses GETs
+IDENTITY_GET_MAX_ONUS = 32
+IDENTITY_GET_BATCH = 20
+
+# Intervalo do ciclo lento (segundos): pega troca de ONU na mesma posição
+IDENTITY_REFRESH_INTERVAL = 900
+
+# full=True quando o snapshot foi montado do zero (primeira coleta da OLT):
+# nesse caso todas as ONUs vêm em added.
+OntDelta = namedtuple('OntDelta', 'full added removed changed')
+
+
+def ont_changed(ont, previous):
+    """True se algum campo lido da OLT difere entre as duas versões da ONU."""
+    return any(ont[field] != previous[field] for field in SNMP_FIELDS)
+
+
+class _Snapshot:
+    """Última coleta de uma OLT; as ONUs ficam em uma OnuTable."""
+
+    def __init__(self, onts, identity_at):
+        self.onts = onts
+        self.identity_at = identity_at
+
+
+class IncrementalOntPoller:
+    """Mantém o último snapshot por OLT e devolve deltas a cada poll."""
+
+    def __init__(self, identity_interval=IDENTITY_REFRESH_INTERVAL):
+        self.identity_interval = identity_interval
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def seed(self, target_ip, onts, identity_at):
+        """Adota uma OnuTable coletada em outro lugar (ex.: snapshot de outro worker) como snapshot.
+
+        O próximo poll devolve o delta em relação a ela.
+        """
+        with self._lock:
+            self._snapshots[target_ip] = _Snapshot(onts, identity_at)
+
+    def table(self, target_ip):
+        """OnuTable da última coleta da OLT (não alterar: é o snapshot do poller), ou None."""
+        with self._lock:
+            snapshot = self._snapshots.get(target_ip)
+        return snapshot.onts if snapshot else None
+
+    def identity_at(self, target_ip):
+        """Hora (epoch) da última leitura das colunas de identidade, ou None sem snapshot."""
+        with self._lock:
+            snapshot = self._snapshots.get(target_ip)
+        return snapshot.identity_at if snapshot else None
+
+    def poll(self, target_ip, community, if_map=None):
+        """Coleta a OLT e retorna o OntDelta em relação ao snapshot anterior.
+
+        Erros SNMP (SnmpError) sobem para o chamador e não alteram o snapshot.
+        """
+        if if_map is None:
+            if_map = get_interface_map(target_ip, community)
+        with self._lock:
+            previous = self._snapshots.get(target_ip)
+        now = time.time()
+        # Dicts só durante a coleta; entre coletas fica a tabela colunar
+        previous_onts = previous.onts.to_dict() if previous else {}
+
+        # Roda sob o single-flight do dashboard: walks no bucket da coleta, fatiados por
+        # porta PON quando SNMP_SHARD_CONCURRENCY > 1
+        onts = merge_ont_rows({}, walk_ont_columns(target_ip, community, VOLATILE_OIDS, if_map, collection=True),
+                              if_map)
+
+        old_keys = set(previous_onts)
+        added_keys = onts.keys() - old_keys
+        slow_cycle = previous is None or now - previous.identity_at >= self.identity_interval
+        if slow_cycle or len(added_keys) > IDENTITY_GET_MAX_ONUS:
+            logger.debug(f"{target_ip}: relendo colunas de identidade")
+            merge_ont_rows(onts, walk_ont_columns(target_ip, community, IDENTITY_OIDS, if_map, collection=True),
+                           if_map)
+            identity_at = now
+        else:
+            identity_at = previous.identity_at
+            for key, ont in onts.items():
+                old = previous_onts.get(key)
+                if old is not None:
+                    for field in IDENTITY_FIELDS:
+                        ont[field] = old[field]
+            if added_keys:
+                merge_ont_rows(onts, self._get_identity(target_ip, community, added_keys), if_map)
+
+        thresholds = get_thresholds(target_ip)
+        categorize_onts(onts.values(), thresholds)
+
+        with self._lock:
+            self._snapshots[target_ip] = _Snapshot(OnuTable.from_onts(onts.values(), thresholds), identity_at)
+
+        if previous is None:
+            return OntDelta(True, list(onts.values()), [], [])
+        return OntDelta(
+            False,
+            [onts[key] for key in onts.keys() - old_keys],
+            list(old_keys - onts.keys()),
+            [ont for key, ont in onts.items() if key in previous_onts and ont_changed(ont, previous_onts[key])]
+        )
+
+    @staticmethod
+    def _get_identity(target_ip, community, keys):
+        """Serial/LOID das ONUs indicadas via GET, como linhas (oid_tupla, valor)."""
+        oids = ['.'.join(map(str, oid_tuple(column) + key)) for key in sorted(keys) for column in IDENTITY_OIDS]
+        session = get_olt_session(target_ip, community)
+        rows = []
+        for start in range(0, len(oids), IDENTITY_GET_BATCH):
+            error_indication, error_status, error_index, var_binds = session.get(
+                oids[start:start + IDENTITY_GET_BATCH], lookup_mib=False)
+            if error_indication or error_status:
+                raise SnmpError(error_indication, error_status, error_index)
+            rows.extend((oid_tuple(name), value) for name, value in var_binds)
+        return rows
+
+
+ont_poller = IncrementalOntPoller()
+
+
+def get_ont_delta():
+    """Versão incremental de get_ont_list para a OLT configurada no ambiente.
+
+    Retorna um OntDelta, ou {'error': ...} como get_ont_list.
+    """
+    olt_ip = os.environ.get('OLT_IP')
+    community = os.environ.get('SNMP_COMMUNITY')
+
+    if not olt_ip or not community:
+        logger.error("OLT_IP ou SNMP_COMMUNITY não definidos nas variáveis de ambiente.")
+        return {'error': 'Configuração SNMP ausente.'}
+
+    try:
+        return ont_poller.poll(olt_ip, community)
+    except SnmpError as e:
+        logger.error(f"Erro SNMP na coleta incremental de {olt_ip}: {e}")
+        return {'error': 'Falha ao obter dados SNMP das ONUs.'}
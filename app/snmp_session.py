@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""Sessões SNMP reutilizáveis por OLT.
+
+Cada sessão mantém o próprio SnmpEngine (com o estado do resolvedor de MIBs
+e a configuração LCD já montados), o alvo UDP e o socket do dispatcher
+durante toda a vida do processo. Criar um SnmpEngine por chamada custa mais
+que o próprio PDU quando uma OLT tem milhares de ONUs.
+
+Todo PDU passa pela política da OLT (app.snmp_policy): ritmo do token
+bucket, timeout adaptativo e retentativas com backoff.
+"""
+
+import atexit
+import contextlib
+import logging
+import threading
+import time
+
+from pysnmp.hlapi import (
+    getCmd, nextCmd, setCmd, SnmpEngine, CommunityData, UdpTransportTarget,
+    ContextData, ObjectType, ObjectIdentity
+)
+from pysnmp.hlapi.asyncore import bulkCmd as async_bulk_cmd
+from pysnmp.proto import errind
+from pysnmp.proto.rfc1905 import EndOfMibView
+
+from app.snmp_policy import TIMEOUT_MAX, get_policy
+from app.snmp_usm import usm_user_data
+
+logger = logging.getLogger(__name__)
+
+# Sessões ociosas por mais tempo que isso são encerradas (segundos)
+SESSION_IDLE_TIMEOUT = 300
+
+# GETBULK: max-repetitions inicial/teto; cai pela metade a cada tooBig e
+# volta a crescer a cada resposta bem-sucedida.
+BULK_MAX_REPETITIONS = 25
+BULK_GROWTH_FACTOR = 1.25
+SNMP_ERROR_TOO_BIG = 1
+
+
+def oid_tuple(name):
+    """Converte OID em texto, ObjectIdentity ou ObjectName para tupla de inteiros."""
+    if isinstance(name, str):
+        return tuple(int(part) for part in name.strip('.').split('.'))
+    if hasattr(name, 'getOid'):
+        name = name.getOid()
+    return tuple(name)
+
+
+class SnmpError(Exception):
+    """Falha SNMP (errorIndication ou errorStatus) durante um walk."""
+
+    def __init__(self, error_indication=None, error_status=0, error_index=0):
+        self.error_indication = error_indication
+        self.error_status = error_status
+        self.error_index = error_index
+        if error_indication:
+            message = f"Erro: {error_indication}"
+        else:
+            message = f"Erro: {error_status.prettyPrint()} em {error_index or '?'}"
+        super().__init__(message)
+
+
+class BulkWalkState:
+    """Estado de paginação de um walk GETBULK multi-coluna.
+
+    Independe do transporte: SnmpSession (síncrono) e o coletor asyncio
+    usam a mesma lógica de cursores, término de coluna e ajuste de
+    max-repetitions.
+    """
+
+    def __init__(self, oids, repetitions=BULK_MAX_REPETITIONS, max_repetitions=None):
+        self.roots = [oid_tuple(oid) for oid in oids]
+        self.cursors = list(self.roots)
+        self.active = list(range(len(self.roots)))
+        self.ceiling = max(1, int(max_repetitions or BULK_MAX_REPETITIONS))
+        self.repetitions = max(1, min(int(repetitions), self.ceiling))
+
+    def next_oids(self):
+        """OIDs de partida do próximo GETBULK (um por coluna ativa)."""
+        return ['.'.join(map(str, self.cursors[col])) for col in self.active]
+
+    def too_big(self, error_status):
+        """Reduz max-repetitions se a resposta foi tooBig e ainda há margem."""
+        if error_status and int(error_status) == SNMP_ERROR_TOO_BIG and self.repetitions > 1:
+            self.repetitions = max(1, self.repetitions // 2)
+            return True
+        return False
+
+    def feed(self, rows):
+        """Processa as linhas de uma resposta e devolve as que estão dentro das colunas."""
+        table = []
+        finished = set()
+        for row in rows:
+            table_row = []
+            for position, var_bind in enumerate(row[:len(self.active)]):
+                col = self.active[position]
+                if col in finished:
+                    continue
+                oid = oid_tuple(var_bind[0])
+                root = self.roots[col]
+                if (isinstance(var_bind[1], EndOfMibView) or oid[:len(root)] != root
+                        or oid <= self.cursors[col]):
+                    finished.add(col)
+                    continue
+                self.cursors[col] = oid
+                table_row.append(var_bind)
+            if table_row:
+                table.append(table_row)
+        if not rows:
+            finished.update(self.active)
+        self.active = [col for col in self.active if col not in finished]
+        self.repetitions = min(self.ceiling, max(self.repetitions + 1,
+                                                 int(self.repetitions * BULK_GROWTH_FACTOR)))
+        return table
+
+
+class SnmpSession:
+    """Sessão SNMP de longa duração para um único agente (OLT).
+
+    Os métodos devolvem as mesmas tuplas do pysnmp
+    (errorIndication, errorStatus, errorIndex, varBinds) para que os
+    chamadores mantenham o tratamento de erro que já possuem. O SnmpEngine
+    do hlapi síncrono não é reentrante, então cada PDU roda sob o lock da
+    sessão; walks soltam o lock entre um PDU e o próximo, para que um
+    iterador abandonado ou uma chamada aninhada não travem os demais.
+    """
+
+    def __init__(self, host, community, port=161, version='2c', usm=None):
+        self.host = host
+        self.community = community
+        self.port = int(port)
+        self.version = version
+        self.usm = usm
+        self.policy = get_policy(host)
+        self.last_used = time.monotonic()
+        self.bulk_repetitions = BULK_MAX_REPETITIONS
+        self._lock = threading.Lock()
+        self._users = 0 # Operações em andamento; o pool só encerra sessões sem nenhuma
+        self._closed = False
+        self._engine = None
+        self._open()
+
+    def _open(self):
+        self._engine = SnmpEngine()
+        if self.version == '3':
+            # Chaves mestras já derivadas; o engine guarda a descoberta do
+            # engineID e as chaves localizadas enquanto a sessão viver.
+            self._auth = usm_user_data(self.usm)
+        else:
+            self._auth = CommunityData(self.community, mpModel=0 if self.version == '1' else 1)
+        self._targets = {}
+        self._context = ContextData()
+
+    def _target(self, timeout, retries=0):
+        """UdpTransportTarget para o par (timeout, retries).
+
+        O LCD do pysnmp já separa as entradas por timeout e retries. Sem
+        tagList: em v1/v2c a resposta só é aceita se a tag da community (vazia)
+        estiver na tagList do alvo, e uma tagList própria a descartaria.
+        """
+        key = (timeout, retries)
+        target = self._targets.get(key)
+        if target is None:
+            target = self._targets[key] = UdpTransportTarget(
+                (self.host, self.port), timeout=timeout, retries=retries)
+        return target
+
+    def _send(self, request, collection=False):
+        """Envia um PDU via request(target) respeitando a política da OLT.
+
+        Espera o token bucket (o da coleta se collection), mede a RTT das
+        respostas e, em timeout, tenta de novo com backoff e timeout
+        dobrado. Chamar com o lock.
+        """
+        policy = self.policy
+        bucket = policy.bucket_for(collection)
+        timeout = policy.timeout()
+        for attempt in range(policy.retries + 1):
+            bucket.acquire()
+            started = time.monotonic()
+            result = request(self._target(timeout))
+            if not isinstance(result[0], errind.RequestTimedOut):
+                if not result[0]:
+                    policy.rtt.add(time.monotonic() - started)
+                return result
+            if attempt < policy.retries:
+                delay = policy.backoff(attempt)
+                logger.debug(f"{self.host}: timeout de {timeout}s, nova tentativa em {delay:.2f}s")
+                time.sleep(delay)
+                timeout = min(timeout * 2, TIMEOUT_MAX)
+        return result
+
+    def _paced(self, iterator, collection=False):
+        """Itera um gerador do hlapi (um PDU por passo) esperando o bucket antes de cada PDU.
+
+        O lock da sessão é tomado só durante cada PDU.
+        """
+        bucket = self.policy.bucket_for(collection)
+        while True:
+            bucket.acquire()
+            try:
+                with self._lock:
+                    item = next(iterator)
+            except StopIteration:
+                return
+            yield item
+
+    def _next_cmd(self, oids, lookup_mib, collection=False):
+        """Walk GETNEXT do hlapi, no ritmo da política."""
+        return self._paced(nextCmd(
+            self._engine, self._auth, self._target(self.policy.timeout(), self.policy.retries), self._context,
+            *[ObjectType(ObjectIdentity(oid)) for oid in oids],
+            lexicographicMode=False, lookupMib=lookup_mib), collection)
+
+    @contextlib.contextmanager
+    def _using(self):
+        """Marca uma operação em andamento: o pool não encerra a sessão enquanto durar.
+
+        Sessões encerradas (ociosidade ou shutdown) saíram do pool e não são
+        reabertas, para não deixar um engine/socket sem dono; obtenha a
+        sessão com get_session() a cada uso em vez de guardá-la.
+        """
+        with _sessions_lock:
+            if self._closed:
+                raise RuntimeError(f"{self!r} foi encerrada; use get_session() para obter a sessão atual")
+            self._users += 1
+        try:
+            yield
+        finally:
+            with _sessions_lock:
+                self._users -= 1
+                self.last_used = time.monotonic()
+
+    @property
+    def busy(self):
+        return self._users > 0
+
+    def get(self, oids, lookup_mib=True):
+        """SNMP GET de um ou mais OIDs em um único PDU."""
+        with self._using(), self._lock:
+            var_binds = [ObjectType(ObjectIdentity(oid)) for oid in oids]
+            return self._send(lambda target: next(getCmd(
+                self._engine, self._auth, target, self._context, *var_binds, lookupMib=lookup_mib)))
+
+    def walk(self, oids, lookup_mib=True):
+        """SNMP WALK (GETNEXT) de uma ou mais colunas.
+
+        Retorna (errorIndication, errorStatus, errorIndex, varBindTable), no
+        formato do antigo cmdgen.CommandGenerator().nextCmd.
+        """
+        var_bind_table = []
+        with self._using():
+            for error_indication, error_status, error_index, var_binds in self._next_cmd(oids, lookup_mib):
+                if error_indication or error_status:
+                    return error_indication, error_status, error_index, var_bind_table
+                var_bind_table.append(var_binds)
+        return None, 0, 0, var_bind_table
+
+    def bulk_walk(self, oids, max_repetitions=None, lookup_mib=True):
+        """SNMP WALK via GETBULK de uma ou mais colunas (v2c/v3).
+
+        Cada PDU traz até max-repetitions linhas de todas as colunas ainda
+        ativas. O valor efetivo é aprendido por sessão: cai pela metade quando
+        o agente responde tooBig e cresce de novo (até max_repetitions) a cada
+        resposta bem-sucedida. Em SNMPv1 recai no walk por GETNEXT.
+
+        Retorna (errorIndication, errorStatus, errorIndex, varBindTable), com
+        apenas as variáveis dentro das colunas pedidas.
+        """
+        var_bind_table = []
+        with self._using():
+            try:
+                for row in self._iter_rows(oids, max_repetitions, lookup_mib):
+                    var_bind_table.append(row)
+            except SnmpError as e:
+                return e.error_indication, e.error_status, e.error_index, var_bind_table
+        return None, 0, 0, var_bind_table
+
+    def iter_walk(self, oids, max_repetitions=None, lookup_mib=False, collection=False):
+        """Gera (oid_tupla, valor bruto) à medida que os PDUs do walk chegam.
+
+        Nada além do PDU corrente fica em memória. Erros SNMP levantam
+        SnmpError. O lock da sessão só é tomado durante cada PDU, então o
+        gerador pode ser abandonado ou intercalado com outras chamadas.
+        collection=True usa o bucket da coleta (só sob o single-flight).
+        """
+        with self._using():
+            for row in self._iter_rows(oids, max_repetitions, lookup_mib, collection):
+                for name, value in row:
+                    yield oid_tuple(name), value
+
+    def _iter_rows(self, oids, max_repetitions, lookup_mib, collection=False):
+        """Gera as linhas do walk PDU a PDU (cada PDU sob o lock da sessão)."""
+        if self.version == '1':
+            for error_indication, error_status, error_index, var_binds in self._next_cmd(
+                    oids, lookup_mib, collection):
+                if error_indication or error_status:
+                    raise SnmpError(error_indication, error_status, error_index)
+                row = [var_bind for var_bind in var_binds if not isinstance(var_bind[1], EndOfMibView)]
+                if row:
+                    yield row
+            return
+
+        state = BulkWalkState(oids, self.bulk_repetitions, max_repetitions)
+        try:
+            while state.active:
+                error_indication, error_status, error_index, rows = self._bulk_request(
+                    state.next_oids(), state.repetitions, lookup_mib, collection)
+
+                if state.too_big(error_status):
+                    logger.info(f"{self.host}: tooBig no GETBULK, max-repetitions reduzido para {state.repetitions}")
+                    continue
+                if error_indication or error_status:
+                    raise SnmpError(error_indication, error_status, error_index)
+                yield from state.feed(rows)
+        finally:
+            self.bulk_repetitions = state.repetitions
+
+    def _bulk_request(self, oids, repetitions, lookup_mib, collection=False):
+        """Envia um único GETBULK e espera a resposta."""
+        var_binds = [ObjectType(ObjectIdentity(oid)) for oid in oids]
+        with self._lock:
+            return self._send(lambda target: self._bulk_once(target, repetitions, var_binds, lookup_mib),
+                              collection)
+
+    def _bulk_once(self, target, repetitions, var_binds, lookup_mib):
+        response = {}
+
+        def on_response(snmp_engine, send_request_handle, error_indication,
+                        error_status, error_index, var_bind_table, cb_ctx):
+            cb_ctx.update(error_indication=error_indication, error_status=error_status,
+                          error_index=error_index, var_bind_table=var_bind_table)
+            # Sem retorno verdadeiro o pysnmp não envia o próximo GETBULK:
+            # a paginação fica a cargo de bulk_walk.
+
+        async_bulk_cmd(self._engine, self._auth, target, self._context,
+                       0, repetitions, *var_binds,
+                       cbFun=on_response, cbCtx=response, lookupMib=lookup_mib)
+        self._engine.transportDispatcher.runDispatcher()
+        return (response.get('error_indication'), response.get('error_status', 0),
+                response.get('error_index', 0), response.get('var_bind_table') or [])
+
+    def set(self, var_binds):
+        """SNMP SET de uma lista de ObjectType já montados."""
+        with self._using(), self._lock:
+            return self._send(lambda target: next(setCmd(
+                self._engine, self._auth, target, self._context, *var_binds)))
+
+    def close(self):
+        """Libera o socket e o dispatcher do engine; a sessão não é reaberta depois disso."""
+        with _sessions_lock:
+            self._closed = True
+        with self._lock:
+            if self._engine is not None:
+                try:
+                    self._engine.transportDispatcher.closeDispatcher()
+                except Exception as e:
+                    logger.debug(f"Erro ao fechar dispatcher SNMP de {self.host}: {e}")
+                self._engine = None
+
+    def __repr__(self):
+        return f'<SnmpSession {self.host}:{self.port} v{self.version}>'
+
+
+# --- Pool de sessões --- #
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host, community, port=161, version='2c', usm=None):
+    """Retorna a sessão compartilhada da OLT, criando-a se necessário.
+
+    Em SNMPv3 usm traz as credenciais (snmp_usm.V3Credentials) no lugar da
+    community.
+    """
+    version = version or '2c'
+    key = (host, int(port or 161), version, usm if version == '3' else community)
+    now = time.monotonic()
+    with _sessions_lock:
+        idle = _reap_idle_sessions(now)
+        session = _sessions.get(key)
+        if session is None:
+            logger.info(f"Abrindo sessão SNMP para {host}:{key[1]} (v{key[2]})")
+            session = SnmpSession(host, community, port=key[1], version=version, usm=usm)
+            _sessions[key] = session
+        session.last_used = now
+    for stale in idle:
+        logger.info(f"Encerrando sessão SNMP ociosa {stale!r}")
+        stale.close()
+    return session
+
+
+def _reap_idle_sessions(now):
+    """Tira do pool sessões sem operação em andamento e sem uso há mais de SESSION_IDLE_TIMEOUT.
+
+    Chamar com o lock do pool; o fechamento em si acontece fora dele.
+    """
+    idle = []
+    for key, session in list(_sessions.items()):
+        if not session.busy and now - session.last_used > SESSION_IDLE_TIMEOUT:
+            del _sessions[key]
+            session._closed = True # Nenhuma operação nova a partir daqui
+            idle.append(session)
+    return idle
+
+
+def close_all_sessions():
+    """Encerra todas as sessões do pool (ex.: no shutdown do worker)."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_all_sessions)
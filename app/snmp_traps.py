@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""Receptor de traps/notificações SNMP (v2c/v3) com atualizações pontuais de ONU.
+
+O receptor roda como processo próprio (`flask trap-receiver`). Cada
+notificação de ONU (online, offline, dying gasp) ou de porta (linkUp,
+linkDown) vira um TrapEvent que:
+
+- é aplicado no banco (status/last_seen da ONU, log em quedas);
+- é gravado em um diário JSON lines em instance/, lido pelos workers do
+  gunicorn para aplicar o mesmo evento nas ONUs em memória sem esperar a
+  próxima coleta.
+
+Enquanto o receptor estiver vivo (diário tocado a cada HEARTBEAT_INTERVAL)
+o dashboard pode espaçar as coletas completas.
+"""
+
+import datetime
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+from pysnmp.carrier.asyncore.dgram import udp
+from pysnmp.entity import config, engine
+from pysnmp.entity.rfc3413 import ntfrcv
+from pysnmp.proto.api import v2c
+
+from app import db
+from app.models.models import OLT, ONU, LogEntry
+from app.snmp_decode import LINK_ONLINE, LINK_OFFLINE, decode_octets, format_serial
+from app.snmp_session import oid_tuple
+from app.snmp_usm import AUTH_PROTOCOLS, PRIV_PROTOCOLS
+from app.snmp_utils import (
+    OID_HW_GONU_AUTH_TABLE, OID_HW_GONU_STATUS_TABLE, OID_HW_GONU_SERIAL_NUMBER,
+    OID_HW_GONU_LINK_STATUS
+)
+
+logger = logging.getLogger(__name__)
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+TRAP_JOURNAL_FILE = os.environ.get('SNMP_TRAP_JOURNAL') or os.path.join(basedir, 'instance', 'trap_events.jsonl')
+TRAP_JOURNAL_MAX_BYTES = 1048576
+HEARTBEAT_INTERVAL = 30 # segundos
+SNMP_TRAP_PORT = int(os.environ.get('SNMP_TRAP_PORT') or 162)
+
+# --- OIDs de notificação --- #
+OID_SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+OID_TRAP_LINK_DOWN = '1.3.6.1.6.3.1.1.5.3'
+OID_TRAP_LINK_UP = '1.3.6.1.6.3.1.1.5.4'
+OID_IF_INDEX = '1.3.6.1.2.1.2.2.1.1'
+# Notificações de ONU da Huawei (HUAWEI-XPON-MIB)
+# Exemplo, precisa ser verificado com a MIB do firmware da OLT
+OID_HW_TRAP_ONT_ONLINE = '1.3.6.1.4.1.2011.6.128.2.0.1'
+OID_HW_TRAP_ONT_OFFLINE = '1.3.6.1.4.1.2011.6.128.2.0.2'
+OID_HW_TRAP_ONT_DYING_GASP = '1.3.6.1.4.1.2011.6.128.2.0.3'
+
+# Tipos de evento
+EVENT_ONLINE = 'online'
+EVENT_OFFLINE = 'offline'
+EVENT_DYING_GASP = 'dying_gasp'
+EVENT_LINK_UP = 'link_up'
+EVENT_LINK_DOWN = 'link_down'
+
+TRAP_KINDS = {
+    oid_tuple(OID_HW_TRAP_ONT_ONLINE): EVENT_ONLINE,
+    oid_tuple(OID_HW_TRAP_ONT_OFFLINE): EVENT_OFFLINE,
+    oid_tuple(OID_HW_TRAP_ONT_DYING_GASP): EVENT_DYING_GASP,
+    oid_tuple(OID_TRAP_LINK_UP): EVENT_LINK_UP,
+    oid_tuple(OID_TRAP_LINK_DOWN): EVENT_LINK_DOWN,
+}
+ONU_EVENTS = (EVENT_ONLINE, EVENT_OFFLINE, EVENT_DYING_GASP)
+
+_COL_TRAP_OID = oid_tuple(OID_SNMP_TRAP_OID)
+_COL_IF_INDEX = oid_tuple(OID_IF_INDEX)
+_COL_SERIAL_NUMBER = oid_tuple(OID_HW_GONU_SERIAL_NUMBER)
+_COL_LINK_STATUS = oid_tuple(OID_HW_GONU_LINK_STATUS)
+_GONU_TABLES = (oid_tuple(OID_HW_GONU_AUTH_TABLE), oid_tuple(OID_HW_GONU_STATUS_TABLE))
+
+# olt: IP de origem; onu_id None em eventos de porta; serial em bytes ou None
+TrapEvent = namedtuple('TrapEvent', 'olt kind if_index onu_id serial received_at')
+
+
+def _under(oid, prefix):
+    return len(oid) > len(prefix) and oid[:len(prefix)] == prefix
+
+
+def decode_notification(source_ip, var_binds, received_at=None):
+    """Converte os varbinds de uma notificação em TrapEvent (None se não for de interesse).
+
+    O índice da ONU vem do primeiro varbind das tabelas GONU
+    (coluna.ifIndex.onuId). A coluna de link status só define o tipo quando
+    o snmpTrapOID não é reconhecido: o tipo do trap prevalece (um dying gasp
+    também traz link status offline).
+    """
+    kind = link_kind = None
+    if_index = onu_id = serial = None
+    for name, value in var_binds:
+        oid = oid_tuple(name)
+        if oid == _COL_TRAP_OID:
+            kind = TRAP_KINDS.get(oid_tuple(value))
+        elif _under(oid, _COL_IF_INDEX):
+            if_index = int(value)
+        elif any(_under(oid, table) for table in _GONU_TABLES) and len(oid) >= 2:
+            if onu_id is None:
+                if_index, onu_id = oid[-2], oid[-1]
+            if oid[:-2] == _COL_SERIAL_NUMBER:
+                serial = decode_octets(value)
+            elif oid[:-2] == _COL_LINK_STATUS:
+                link_kind = {LINK_ONLINE: EVENT_ONLINE, LINK_OFFLINE: EVENT_OFFLINE}.get(int(value))
+    if kind is None:
+        kind = link_kind
+    if kind is None or if_index is None or (kind in ONU_EVENTS and onu_id is None):
+        return None
+    return TrapEvent(source_ip, kind, if_index, onu_id, serial, received_at or time.time())
+
+
+def apply_trap_event(table, event):
+    """Aplica o evento sobre a OnuTable das ONUs em cache, in-place.
+
+    Retorna as posições alteradas. linkDown derruba todas as ONUs da porta;
+    linkUp não muda nada (cada ONU avisa quando volta).
+    """
+    if event.kind in ONU_EVENTS:
+        positions = table.positions([(event.if_index, event.onu_id)])
+    elif event.kind == EVENT_LINK_DOWN:
+        positions = table.filter(if_index=event.if_index)
+    else:
+        return []
+    table.set_link_status(positions, LINK_ONLINE if event.kind == EVENT_ONLINE else LINK_OFFLINE)
+    return positions
+
+
+def apply_trap_event_to_db(event):
+    """Atualiza a ONU no banco (pelo serial do trap, entre as ONUs da OLT de origem). Chamar com app context.
+
+    Traps de um IP que não é de nenhuma OLT cadastrada só geram log.
+    """
+    olt = OLT.query.filter_by(ip_address=event.olt).first()
+    source = f'OLT {olt.name}' if olt else f'Trap {event.olt}'
+    if event.kind == EVENT_LINK_DOWN:
+        db.session.add(LogEntry(level='warning', source=source,
+                                message=f'linkDown na interface {event.if_index}'))
+    elif event.kind in ONU_EVENTS and event.serial:
+        onu = None
+        if olt:
+            onu = ONU.query.filter_by(olt_id=olt.id, serial_number=format_serial(event.serial)).first()
+        if onu:
+            onu.status = 'online' if event.kind == EVENT_ONLINE else 'offline'
+            onu.last_seen = datetime.datetime.utcfromtimestamp(event.received_at)
+        if event.kind == EVENT_DYING_GASP:
+            db.session.add(LogEntry(level='warning', source=source,
+                                    message=f'Dying gasp da ONU {format_serial(event.serial)}'))
+    db.session.commit()
+
+
+class TrapEventJournal:
+    """Diário JSON lines dos eventos, escrito pelo receptor e lido pelos workers.
+
+    Cada leitor guarda um cursor (inode, offset). Ao passar de
+    TRAP_JOURNAL_MAX_BYTES o arquivo é trocado por um vazio; o leitor
+    percebe pela mudança de inode e recomeça do início.
+    """
+
+    def __init__(self, path=TRAP_JOURNAL_FILE):
+        self.path = path
+
+    def append(self, events):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lines = ''.join(json.dumps({
+            'olt': event.olt, 'kind': event.kind, 'if_index': event.if_index, 'onu_id': event.onu_id,
+            'serial': event.serial.hex() if event.serial is not None else None,
+            'received_at': event.received_at}) + '\n' for event in events)
+        # Uma única escrita em O_APPEND por lote: leitores nunca veem linha pela metade
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode('utf-8'))
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > TRAP_JOURNAL_MAX_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        tmp_path = self.path + '.new'
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, self.path)
+
+    def heartbeat(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a'):
+            os.utime(self.path)
+
+    def alive(self, max_age=HEARTBEAT_INTERVAL * 3):
+        """True se o receptor tocou o diário recentemente."""
+        try:
+            return time.time() - os.path.getmtime(self.path) < max_age
+        except OSError:
+            return False
+
+    def read_since(self, cursor):
+        """Eventos novos desde o cursor; retorna (eventos, novo cursor).
+
+        Cursor None começa no fim do arquivo (só eventos futuros).
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return [], None
+        try:
+            stat = os.fstat(fd)
+            if cursor is None:
+                return [], (stat.st_ino, stat.st_size)
+            inode, offset = cursor
+            if inode != stat.st_ino or offset > stat.st_size:
+                offset = 0
+            os.lseek(fd, offset, os.SEEK_SET)
+            data = b''
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            os.close(fd)
+        # Só linhas completas; o resto fica para a próxima leitura
+        complete = data[:data.rfind(b'\n') + 1]
+        events = []
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+                serial = record.get('serial')
+                events.append(TrapEvent(record['olt'], record['kind'], record['if_index'], record['onu_id'],
+                                        bytes.fromhex(serial) if serial else None, record['received_at']))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Linha inválida no diário de traps: {e}")
+        return events, (stat.st_ino, offset + len(complete))
+
+
+trap_journal = TrapEventJournal()
+
+
+def run_trap_receiver(listen_host='0.0.0.0', listen_port=SNMP_TRAP_PORT, communities=(),
+                      v3_users=(), on_event=None, journal=trap_journal):
+    """Escuta notificações até ser interrompido.
+
+    v3_users: [(V3Credentials, engineID em hex)]; em traps (não confirmados)
+    o USM precisa do engineID de quem envia.
+    on_event(event) é chamado para cada evento decodificado, depois de
+    gravado no diário.
+    """
+    snmp_engine = engine.SnmpEngine()
+    config.addTransport(snmp_engine, udp.domainName,
+                        udp.UdpTransport().openServerMode((listen_host, listen_port)))
+    for position, community in enumerate(communities):
+        config.addV1System(snmp_engine, f'trap-area-{position}', community)
+    for credentials, engine_id in v3_users:
+        auth_oid = AUTH_PROTOCOLS[(credentials.auth_protocol or 'SHA').upper()][0]
+        priv_oid = PRIV_PROTOCOLS[(credentials.priv_protocol or 'AES').upper()]
+        config.addV3User(snmp_engine, credentials.user, auth_oid, credentials.auth_password,
+                         priv_oid, credentials.priv_password,
+                         securityEngineId=v2c.OctetString(hexValue=engine_id))
+
+    def on_notification(snmp_engine, state_reference, context_engine_id, context_name, var_binds, cb_ctx):
+        exec_context = snmp_engine.observer.getExecutionContext('rfc3412.receiveMessage:request')
+        source_ip = exec_context['transportAddress'][0]
+        event = decode_notification(source_ip, var_binds)
+        if event is None:
+            logger.debug(f"Notificação ignorada de {source_ip}")
+            return
+        logger.info(f"Trap {event.kind} de {source_ip}: ifIndex {event.if_index} ONU {event.onu_id}")
+        journal.append([event])
+        if on_event:
+            try:
+                on_event(event)
+            except Exception as e:
+                logger.error(f"Erro ao aplicar trap de {source_ip}: {e}")
+
+    ntfrcv.NotificationReceiver(snmp_engine, on_notification)
+    journal.heartbeat()
+    snmp_engine.transportDispatcher.registerTimerCbFun(lambda now: journal.heartbeat(), HEARTBEAT_INTERVAL)
+    snmp_engine.transportDispatcher.jobStarted(1)
+    try:
+        snmp_engine.transportDispatcher.runDispatcher()
+    finally:
+        snmp_engine.transportDispatcher.closeDispatcher()
+
+
+# --- Harness de teste --- #
+
+def build_test_trap(kind, if_index, onu_id=None, serial=None):
+    """(OID do trap, [(OID, valor)]) de uma notificação sintética no formato da OLT."""
+    trap_oid = {EVENT_ONLINE: OID_HW_TRAP_ONT_ONLINE, EVENT_OFFLINE: OID_HW_TRAP_ONT_OFFLINE,
+                EVENT_DYING_GASP: OID_HW_TRAP_ONT_DYING_GASP, EVENT_LINK_UP: OID_TRAP_LINK_UP,
+                EVENT_LINK_DOWN: OID_TRAP_LINK_DOWN}[kind]
+    if kind in ONU_EVENTS:
+        index = f"{if_index}.{onu_id}"
+        var_binds = [(f"{OID_HW_GONU_LINK_STATUS}.{index}",
+                      v2c.Integer(LINK_ONLINE if kind == EVENT_ONLINE else LINK_OFFLINE))]
+        if serial:
+            var_binds.append((f"{OID_HW_GONU_SERIAL_NUMBER}.{index}", v2c.OctetString(serial)))
+    else:
+        # ifIndex da Huawei passa de 2^31 (ex.: 4194304000): Integer32 não comporta
+        var_binds = [(f"{OID_IF_INDEX}.{if_index}", v2c.Unsigned32(if_index))]
+    return trap_oid, var_binds
+
+
+def send_test_trap(kind, if_index, onu_id=None, serial=None, host='127.0.0.1', port=SNMP_TRAP_PORT,
+                   community='public'):
+    """Envia uma notificação sintética v2c (harness do receptor). Retorna errorIndication."""
+    from pysnmp.hlapi import (
+        sendNotification, SnmpEngine, CommunityData, UdpTransportTarget, ContextData,
+        NotificationType, ObjectIdentity, ObjectType
+    )
+
+    trap_oid, var_binds = build_test_trap(kind, if_index, onu_id, serial)
+    notification = NotificationType(ObjectIdentity(trap_oid)).addVarBinds(
+        *[ObjectType(ObjectIdentity(oid), value) for oid, value in var_binds])
+    error_indication, _, _, _ = next(sendNotification(
+        SnmpEngine(), CommunityData(community, mpModel=1), UdpTransportTarget((host, port)),
+        ContextData(), 'trap', notification))
+    return error_indication
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Credenciais SNMPv3 (USM, authPriv) com chaves derivadas uma única vez.
+
+A conversão senha -> chave do RFC 3414 (A.2) expande a senha para 1 MB e
+calcula o hash do resultado; o pysnmp refaz isso a cada UsmUserData montado
+com senha. Aqui a chave mestra (Ku) é calculada uma vez por senha/protocolo
+e entregue ao pysnmp como usmKeyTypeMaster, restando a ele só a localização
+pelo engineID (um hash curto, feito uma vez por engine). Como as sessões do
+pool mantêm o SnmpEngine, a descoberta do engineID/boots/time também só
+acontece no primeiro PDU de cada OLT.
+"""
+
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+from pysnmp.hlapi import (
+    UsmUserData, usmKeyTypeMaster, usmNoAuthProtocol, usmNoPrivProtocol,
+    usmHMACMD5AuthProtocol, usmHMACSHAAuthProtocol, usmHMAC128SHA224AuthProtocol,
+    usmHMAC192SHA256AuthProtocol, usmHMAC256SHA384AuthProtocol, usmHMAC384SHA512AuthProtocol,
+    usmDESPrivProtocol, usm3DESEDEPrivProtocol, usmAesCfb128Protocol,
+    usmAesCfb192Protocol, usmAesCfb256Protocol
+)
+
+# Protocolo de autenticação -> (OID do pysnmp, hash usado na derivação)
+AUTH_PROTOCOLS = {
+    'MD5': (usmHMACMD5AuthProtocol, 'md5'),
+    'SHA': (usmHMACSHAAuthProtocol, 'sha1'),
+    'SHA224': (usmHMAC128SHA224AuthProtocol, 'sha224'),
+    'SHA256': (usmHMAC192SHA256AuthProtocol, 'sha256'),
+    'SHA384': (usmHMAC256SHA384AuthProtocol, 'sha384'),
+    'SHA512': (usmHMAC384SHA512AuthProtocol, 'sha512'),
+}
+PRIV_PROTOCOLS = {
+    'DES': usmDESPrivProtocol,
+    '3DES': usm3DESEDEPrivProtocol,
+    'AES': usmAesCfb128Protocol,
+    'AES192': usmAesCfb192Protocol,
+    'AES256': usmAesCfb256Protocol,
+}
+
+PASSWORD_EXPANSION_BYTES = 1048576
+
+V3Credentials = namedtuple('V3Credentials', 'user auth_protocol auth_password priv_protocol priv_password')
+
+_master_keys = {}
+_master_keys_lock = threading.Lock()
+
+
+def password_to_key(password, hash_name):
+    """Chave mestra Ku do RFC 3414: hash da senha repetida até 1 MB."""
+    data = password.encode('utf-8')
+    if not data:
+        raise ValueError("Senha SNMPv3 vazia")
+    expanded = (data * (PASSWORD_EXPANSION_BYTES // len(data) + 1))[:PASSWORD_EXPANSION_BYTES]
+    return hashlib.new(hash_name, expanded).digest()
+
+
+def master_key(password, hash_name):
+    """password_to_key com cache por processo."""
+    key = (hash_name, password)
+    with _master_keys_lock:
+        cached = _master_keys.get(key)
+    if cached is None:
+        cached = password_to_key(password, hash_name)
+        with _master_keys_lock:
+            _master_keys[key] = cached
+    return cached
+
+
+def usm_user_data(credentials):
+    """UsmUserData com chaves mestras já derivadas (authPriv, authNoPriv ou noAuthNoPriv)."""
+    auth_protocol = (credentials.auth_protocol or '').upper()
+    priv_protocol = (credentials.priv_protocol or '').upper()
+    if not credentials.auth_password:
+        return UsmUserData(credentials.user, authProtocol=usmNoAuthProtocol, privProtocol=usmNoPrivProtocol)
+    if auth_protocol not in AUTH_PROTOCOLS:
+        raise ValueError(f"Protocolo de autenticação SNMPv3 não suportado: {credentials.auth_protocol}")
+    auth_oid, hash_name = AUTH_PROTOCOLS[auth_protocol]
+    auth_key = master_key(credentials.auth_password, hash_name)
+    if not credentials.priv_password:
+        return UsmUserData(credentials.user, auth_key, authProtocol=auth_oid,
+                           privProtocol=usmNoPrivProtocol, authKeyType=usmKeyTypeMaster)
+    if priv_protocol not in PRIV_PROTOCOLS:
+        raise ValueError(f"Protocolo de privacidade SNMPv3 não suportado: {credentials.priv_protocol}")
+    # A chave de privacidade é derivada com o hash do protocolo de autenticação
+    priv_key = master_key(credentials.priv_password, hash_name)
+    return UsmUserData(credentials.user, auth_key, priv_key,
+                       authProtocol=auth_oid, privProtocol=PRIV_PROTOCOLS[priv_protocol],
+                       authKeyType=usmKeyTypeMaster, privKeyType=usmKeyTypeMaster)
+
+
+def olt_credentials(olt):
+    """Credenciais v3 de uma linha da tabela OLT (None se a OLT não usa v3)."""
+    if olt.snmp_version != '3':
+        return None
+    return V3Credentials(olt.snmp_v3_user, olt.snmp_v3_auth_protocol, olt.snmp_v3_auth_password,
+                         olt.snmp_v3_priv_protocol, olt.snmp_v3_priv_password)
+
+
+def env_credentials():
+    """Credenciais v3 da OLT configurada no ambiente (SNMP_V3_*)."""
+    return V3Credentials(os.environ.get('SNMP_V3_USER'),
+                         os.environ.get('SNMP_V3_AUTH_PROTOCOL') or 'SHA',
+                         os.environ.get('SNMP_V3_AUTH_PASSWORD'),
+                         os.environ.get('SNMP_V3_PRIV_PROTOCOL') or 'AES',
+                         os.environ.get('SNMP_V3_PRIV_PASSWORD'))
@@ -1,18 +1,40 @@
 # -*- coding: utf-8 -*-
 """Utilitários para coleta de dados SNMP da OLT."""
 
+import logging
 import os
-import re
-from pysnmp.hlapi import (
-    getCmd, nextCmd, SnmpEngine, CommunityData, UdpTransportTarget,
-    ContextData, ObjectType, ObjectIdentity, Integer32
-)
-from pysnmp.entity.rfc3413.oneliner import cmdgen
 import time # Para o uptime
 
-# --- Constantes de Limite --- #
-RX_POWER_CRITICAL_THRESHOLD = -28.0 # dBm - Abaixo disso é considerado baixo/crítico
-RX_POWER_VERY_LOW_THRESHOLD = -35.0 # dBm - Abaixo disso pode indicar problema físico
+from app.snmp_session import get_session, oid_tuple, SnmpError
+from app.snmp_usm import env_credentials
+from app.snmp_cache import (
+    DATASET_INTERFACE_MAP, InterfaceMap, entity_index_cache, interface_map_cache, snapshot_cache
+)
+from app.snmp_decode import (
+    LINK_ONLINE, LINK_OFFLINE, REG_REGISTERED, REG_UNREGISTERED,
+    decode_octets, decode_int, decode_physical_class, decode_power, decode_text, format_ont,
+    port_positions
+)
+from app.snmp_dispatch import OidDispatcher
+from app.single_flight import snmp_flights
+# Limites de RxPower (RX_POWER_*: padrão; por OLT/porta via get_thresholds)
+from app.onu_categories import (
+    DEFAULT_THRESHOLDS, RX_POWER_CRITICAL_THRESHOLD, RX_POWER_VERY_LOW_THRESHOLD,
+    categorize_onts, get_thresholds
+)
+
+logger = logging.getLogger(__name__)
+
+# Teto de max-repetitions dos walks GETBULK (ajustado automaticamente para baixo em tooBig)
+SNMP_MAX_REPETITIONS = int(os.environ.get('SNMP_MAX_REPETITIONS') or 25)
+
+# Walks das tabelas de ONU fatiados por porta PON: fatias em paralelo
+# (1 desliga e volta ao walk único em streaming)
+SNMP_SHARD_CONCURRENCY = int(os.environ.get('SNMP_SHARD_CONCURRENCY') or 4)
+
+# Versão SNMP e porta da OLT do ambiente; em '3' as credenciais vêm de SNMP_V3_*
+SNMP_VERSION = os.environ.get('SNMP_VERSION') or '2c'
+SNMP_PORT = int(os.environ.get('SNMP_PORT') or 161)
 
 # --- OIDs Gerais --- #
 OID_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
@@ -23,11 +45,14 @@ OID_ENT_PHYSICAL_TABLE = '1.3.6.1.2.1.47.1.1.1.1'
 OID_ENT_PHYSICAL_DESCR = OID_ENT_PHYSICAL_TABLE + '.2'
 OID_ENT_PHYSICAL_CLASS = OID_ENT_PHYSICAL_TABLE + '.5'
 OID_ENT_PHYSICAL_MODEL = OID_ENT_PHYSICAL_TABLE + '.13'
+OID_ENT_LAST_CHANGE_TIME = '1.3.6.1.2.1.47.1.4.1.0' # sysUpTime da última mudança na tabela de entidades
 OID_HW_ENTITY_STATE_TABLE = '1.3.6.1.4.1.2011.5.25.31.1.1.1'
 OID_HW_ENTITY_TEMP = OID_HW_ENTITY_STATE_TABLE + '.1.5'
 OID_HW_ENTITY_SW_REV = OID_HW_ENTITY_STATE_TABLE + '.1.7'
 
 # --- OIDs de Interface (IF-MIB) --- #
+OID_IF_NUMBER = '1.3.6.1.2.1.2.1.0' # Quantidade de interfaces
+OID_IF_TABLE_LAST_CHANGE = '1.3.6.1.2.1.31.1.5.0' # sysUpTime da última mudança na ifTable
 OID_IF_TABLE = '1.3.6.1.2.1.2.2.1'
 OID_IF_DESCR = OID_IF_TABLE + '.2' # Descrição da Interface (ex: GE0/2/0, PON0/6/0)
 OID_IF_TYPE = OID_IF_TABLE + '.3' # Tipo da Interface (ex: ethernetCsmacd(6), gpon(237))
@@ -47,80 +72,157 @@ OID_HW_GONU_REG_STATUS = OID_HW_GONU_STATUS_TABLE + '.1.2' # Integer: registered
 OID_HW_GONU_RX_POWER = OID_HW_GONU_STATUS_TABLE + '.1.9' # Integer32: Potência em 0.01 dBm
 OID_HW_GONU_TX_POWER = OID_HW_GONU_STATUS_TABLE + '.1.8' # Integer32: Potência em 0.01 dBm
 
+# Coluna -> (campo, decodificador) para os varbinds vindos dos walks
+ONT_COLUMNS = OidDispatcher({
+    OID_HW_GONU_SERIAL_NUMBER: ('serialNumber', decode_octets),
+    OID_HW_GONU_LOID: ('loid', decode_octets),
+    OID_HW_GONU_LINK_STATUS: ('linkStatus', decode_int),
+    OID_HW_GONU_REG_STATUS: ('regStatus', decode_int),
+    OID_HW_GONU_RX_POWER: ('rxPower', decode_power),
+    OID_HW_GONU_TX_POWER: ('txPower', decode_power)
+}, index_length=2) # ifIndex.onuId
+IF_COLUMNS = OidDispatcher({OID_IF_DESCR: ('descr', decode_text)}, index_length=1)
+ENTITY_COLUMNS = OidDispatcher({
+    OID_ENT_PHYSICAL_CLASS: ('class', decode_physical_class),
+    OID_ENT_PHYSICAL_DESCR: ('descr', decode_text)
+}, index_length=1)
+
+# Colunas lidas a cada coleta da lista de ONUs
+ONT_TABLE_OIDS = [
+    OID_HW_GONU_SERIAL_NUMBER,
+    OID_HW_GONU_LOID,
+    OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS,
+    OID_HW_GONU_RX_POWER,
+    OID_HW_GONU_TX_POWER
+]
+
 # --- Funções Auxiliares --- #
 
-def snmp_walk(target_ip, community, oids):
-    """Realiza um SNMP WALK (nextCmd) para um ou mais OIDs base."""
-    results = {}
-    cmdGen = cmdgen.CommandGenerator()
-    errorIndication, errorStatus, errorIndex, varBindTable = cmdGen.nextCmd(
-        cmdgen.CommunityData(community, mpModel=1),
-        cmdgen.UdpTransportTarget((target_ip, 161)),
-        *[cmdgen.MibVariable(oid) for oid in oids],
-        lexicographicMode=False
-    )
+def get_olt_session(target_ip, community):
+    """Sessão do pool para a OLT do ambiente, na versão SNMP_VERSION."""
+    if SNMP_VERSION == '3':
+        return get_session(target_ip, community, SNMP_PORT, version='3', usm=env_credentials())
+    return get_session(target_ip, community, SNMP_PORT, version=SNMP_VERSION)
+
+def snmp_walk(target_ip, community, oids, max_repetitions=SNMP_MAX_REPETITIONS):
+    """Realiza um SNMP WALK (GETBULK em v2c) para um ou mais OIDs base."""
+    errorIndication, errorStatus, errorIndex, varBindTable = get_olt_session(target_ip, community).bulk_walk(
+        oids, max_repetitions=max_repetitions)
 
     if errorIndication:
-        print(f"Erro SNMP WALK: {errorIndication}")
+        logger.error(f"Erro SNMP WALK: {errorIndication}")
         return None
     elif errorStatus:
-        print(f"Erro SNMP WALK: {errorStatus.prettyPrint()} at {errorIndex and varBindTable[int(errorIndex)-1][0] or '?'}")
+        logger.error(f"Erro SNMP WALK: {errorStatus.prettyPrint()} at {errorIndex or '?'}")
         return None
     else:
-        for varBindTableRow in varBindTable:
-            for name, val in varBindTableRow:
-                oid_str = str(name)
-                # Tenta decodificar se for OctetString, senão usa a representação padrão
-                try:
-                    results[oid_str] = val.prettyPrint()
-                except AttributeError:
-                    results[oid_str] = str(val)
-        return results
+        return varbind_table_to_dict(varBindTable)
+
+def iter_snmp_walk(target_ip, community, oids, max_repetitions=SNMP_MAX_REPETITIONS, collection=False):
+    """Gera (oid_tupla, valor bruto) à medida que os PDUs do walk chegam.
+
+    Diferente de snmp_walk, não monta a tabela inteira em memória. Erros SNMP
+    levantam SnmpError. collection=True: walk da coleta do dashboard, no
+    bucket reservado a ela (snmp_policy).
+    """
+    return get_olt_session(target_ip, community).iter_walk(oids, max_repetitions=max_repetitions,
+                                                           collection=collection)
+
+def varbind_table_to_dict(varBindTable):
+    """Converte as linhas de um walk em {oid: valor em texto}."""
+    results = {}
+    for varBindTableRow in varBindTable:
+        for name, val in varBindTableRow:
+            # Chave sempre numérica, mesmo que o OID tenha sido resolvido por uma MIB
+            oid_str = '.'.join(map(str, oid_tuple(name)))
+            # Tenta decodificar se for OctetString, senão usa a representação padrão
+            try:
+                results[oid_str] = val.prettyPrint()
+            except AttributeError:
+                results[oid_str] = str(val)
+    return results
 
 def get_interface_map(target_ip, community):
     """Cria um mapa de ifIndex para descrição da interface."""
-    if_map = {}
-    if_data = snmp_walk(target_ip, community, [OID_IF_DESCR])
-    if if_data:
-        for oid, descr in if_data.items():
-            if oid.startswith(OID_IF_DESCR + '.'):
-                try:
-                    if_index = int(oid.split('.')[-1])
-                    if_map[if_index] = descr
-                except ValueError:
-                    continue # Ignora OIDs malformados
-    return if_map
-
-def parse_rx_power(power_str):
-    """Converte a string de potência Rx (ex: '-15.23 dBm') para float."""
-    if not isinstance(power_str, str) or 'dBm' not in power_str:
-        return None
+    return load_interface_map(target_ip, community).ports
+
+def get_port_positions(target_ip, community):
+    """Mapa ifIndex -> (frame, slot, porta), decodificado do ifDescr."""
+    return load_interface_map(target_ip, community).positions
+
+def load_interface_map(target_ip, community):
+    """Mapa de interfaces via cache persistente por OLT.
+
+    Dentro da validade de dados lentos o mapa sai do snapshot_cache sem
+    tráfego SNMP; depois disso, GETs em sysUpTime/ifNumber e em
+    ifTableLastChange decidem se o walk em ifDescr precisa ser refeito. A
+    verificação passa pelo single-flight (OLT, mapa de interfaces): uma por
+    vez, sem esperar coletas de outros conjuntos da mesma OLT.
+    """
+    entry = snapshot_cache.get(target_ip, DATASET_INTERFACE_MAP)
+    if entry is not None:
+        return entry.value
+    return snmp_flights.do((target_ip, DATASET_INTERFACE_MAP),
+                           lambda: _refresh_interface_map(target_ip, community),
+                           recheck=lambda: _cached_interface_map(target_ip))
+
+def _cached_interface_map(target_ip):
+    entry = snapshot_cache.get(target_ip, DATASET_INTERFACE_MAP)
+    return entry.value if entry is not None else None
+
+def _refresh_interface_map(target_ip, community):
+    state = get_snmp_data(target_ip, community, [OID_SYS_UPTIME, OID_IF_NUMBER])
+    uptime_ticks = None
+    if state:
+        try:
+            uptime_ticks = int(state.get(OID_SYS_UPTIME))
+        except (TypeError, ValueError):
+            pass
+        if_number = state.get(OID_IF_NUMBER)
+        # ifTableLastChange é opcional no IF-MIB: GET à parte, sem derrubar o de cima em v1
+        if_last_change = get_optional_int(target_ip, community, OID_IF_TABLE_LAST_CHANGE)
+        cached = interface_map_cache.lookup(target_ip, uptime_ticks, if_last_change, if_number)
+        if cached is not None:
+            return snapshot_cache.put(target_ip, DATASET_INTERFACE_MAP, cached).value
+
     try:
-        # Extrai o número usando regex para mais robustez
-        match = re.match(r"(-?\[0-9\.]+)\s*dBm", power_str)
-        if match:
-            return float(match.group(1))
-        else:
-            return None
-    except (ValueError, TypeError):
-        return None
+        ports = build_interface_map(iter_snmp_walk(target_ip, community, [OID_IF_DESCR]))
+    except SnmpError as e:
+        logger.error(f"Erro SNMP WALK: {e}")
+        return InterfaceMap({}, {})
+
+    if ports and uptime_ticks is not None:
+        if_map = interface_map_cache.store_map(target_ip, ports, uptime_ticks, if_last_change, if_number)
+        return snapshot_cache.put(target_ip, DATASET_INTERFACE_MAP, if_map).value
+    return InterfaceMap(ports, port_positions(ports))
 
-def categorize_ont(ont_data):
-    """Classifica uma ONU em uma categoria com base em seus dados."""
+def build_interface_map(if_rows):
+    """Monta o mapa ifIndex -> descrição a partir de (oid_tupla, valor) de um walk em ifDescr."""
+    return {index[0]: descr for index, _, descr in IF_COLUMNS.dispatch(if_rows)}
+
+def pon_if_indexes(if_map):
+    """ifIndex das portas PON (GPON/XG-PON/EPON...) do mapa de interfaces, em ordem."""
+    return sorted(if_index for if_index, descr in if_map.items() if 'PON' in descr.upper())
+
+def categorize_ont(ont_data, limits=DEFAULT_THRESHOLDS):
+    """Classifica uma ONU em uma categoria a partir dos valores nativos (int/float).
+
+    Versão de uma ONU só; listas inteiras passam por onu_categories.categorize_onts.
+    """
     link_status = ont_data.get('linkStatus')
     reg_status = ont_data.get('regStatus')
-    rx_power_str = ont_data.get('rxPower')
-    rx_power_float = parse_rx_power(rx_power_str)
+    rx_power = ont_data.get('rxPower')
 
-    if reg_status == 'unregistered':
+    if reg_status == REG_UNREGISTERED:
         return 'Esperando Provisionamento'
-    elif link_status == 'offline':
+    elif link_status == LINK_OFFLINE:
         return 'Offline'
-    elif link_status == 'online' and reg_status == 'registered':
-        if rx_power_float is not None:
-            if rx_power_float < RX_POWER_VERY_LOW_THRESHOLD:
+    elif link_status == LINK_ONLINE and reg_status == REG_REGISTERED:
+        if rx_power is not None:
+            if rx_power < limits.very_low:
                 return 'Sinal Muito Baixo (Falha?)'
-            elif rx_power_float < RX_POWER_CRITICAL_THRESHOLD:
+            elif rx_power < limits.critical:
                 return 'Sinal Baixo/Crítico'
             else:
                 return 'Online (Sinal OK)'
@@ -133,106 +235,144 @@ def categorize_ont(ont_data):
 
 def get_snmp_data(target_ip, community, oids):
     """Busca um ou mais OIDs específicos via SNMP GET."""
-    results = {}
-    error_indication, error_status, error_index, var_binds = next(
-        getCmd(SnmpEngine(),
-               CommunityData(community, mpModel=1),
-               UdpTransportTarget((target_ip, 161)),
-               ContextData(),
-               *[ObjectType(ObjectIdentity(oid)) for oid in oids])
-    )
+    error_indication, error_status, error_index, var_binds = get_olt_session(target_ip, community).get(
+        oids, lookup_mib=False)
 
     if error_indication:
-        print(f"Erro SNMP GET: {error_indication}")
+        logger.error(f"Erro SNMP GET: {error_indication}")
         return None
     elif error_status:
-        print(f"Erro SNMP GET: {error_status.prettyPrint()} at {error_index and var_binds[int(error_index) - 1][0] or '?'}")
+        logger.error(f"Erro SNMP GET: {error_status.prettyPrint()} at {error_index and var_binds[int(error_index) - 1][0] or '?'}")
         return None
     else:
-        for var_bind in var_binds:
-            oid_str = str(var_bind[0])
-            value = var_bind[1]
-            try:
-                results[oid_str] = value.prettyPrint()
-            except AttributeError:
-                 results[oid_str] = str(value)
-        return results
+        return varbind_table_to_dict([var_binds])
 
-def find_entity_index(target_ip, community, desired_class='chassis', desired_descr_part=None):
-    """Encontra o entPhysicalIndex de uma entidade baseado na classe ou descrição."""
-    # Reutiliza snmp_walk para simplificar
-    entity_data = snmp_walk(target_ip, community, [OID_ENT_PHYSICAL_CLASS, OID_ENT_PHYSICAL_DESCR])
+def walk_entities(target_ip, community):
+    """Walk em entPhysicalClass/Descr como linhas (oid_tupla, valor); None em erro SNMP."""
+    try:
+        return list(iter_snmp_walk(target_ip, community, [OID_ENT_PHYSICAL_CLASS, OID_ENT_PHYSICAL_DESCR]))
+    except SnmpError as e:
+        logger.error(f"Erro SNMP WALK: {e}")
+        return None
+
+def find_entity_index(target_ip, community, desired_class='chassis', desired_descr_part=None, entity_data=None):
+    """Encontra o entPhysicalIndex de uma entidade baseado na classe ou descrição.
+
+    entity_data permite reaproveitar um walk já feito (linhas de walk_entities).
+    """
+    if entity_data is None:
+        entity_data = walk_entities(target_ip, community)
     if not entity_data:
         return None
 
     found_indices = {}
-    # Agrupa por índice
-    for oid, value in entity_data.items():
-        try:
-            parts = oid.split('.')
-            index = int(parts[-1])
-            base_oid = '.'.join(parts[:-1])
-            if index not in found_indices:
-                found_indices[index] = {}
-            found_indices[index][base_oid] = value
-        except (ValueError, IndexError):
-            continue
+    # Agrupa por índice (classe já como nome: 'chassis', 'container', 'module'...)
+    for index, field, value in ENTITY_COLUMNS.dispatch(entity_data):
+        found_indices.setdefault(index[0], {})[field] = value
 
     # Itera sobre os índices encontrados
     for index, data in found_indices.items():
-        entity_class = data.get(OID_ENT_PHYSICAL_CLASS, '')
-        entity_descr = data.get(OID_ENT_PHYSICAL_DESCR, '')
+        entity_class = data.get('class', '')
+        entity_descr = data.get('descr', '')
 
         class_match = entity_class == desired_class
         descr_match = desired_descr_part and desired_descr_part.lower() in entity_descr.lower()
 
         if class_match or descr_match:
-            print(f"Índice encontrado: {index} (Classe: {entity_class}, Descrição: {entity_descr})")
+            logger.info(f"Índice encontrado: {index} (Classe: {entity_class}, Descrição: {entity_descr})")
             return index
 
-    print(f"Nenhum índice encontrado para classe '{desired_class}' ou descrição contendo '{desired_descr_part}'")
+    logger.warning(f"Nenhum índice encontrado para classe '{desired_class}' ou descrição contendo '{desired_descr_part}'")
     return None
 
+def get_optional_int(target_ip, community, oid):
+    """Valor inteiro de um OID opcional em um GET à parte; None se o agente não o implementa.
+
+    Em SNMPv1 um OID inexistente (noSuchName) derruba o PDU inteiro, então
+    OIDs que nem todo agente tem não vão junto com os obrigatórios.
+    """
+    values = get_snmp_data(target_ip, community, [oid])
+    try:
+        return int(values.get(oid))
+    except (AttributeError, TypeError, ValueError): # Erro SNMP ou noSuchObject/noSuchInstance
+        return None
+
+def get_ent_last_change(target_ip, community):
+    """entLastChangeTime (muitos agentes não têm o ENTITY-MIB); None se indisponível."""
+    return get_optional_int(target_ip, community, OID_ENT_LAST_CHANGE_TIME)
+
+def get_entity_index(olt_ip, community, basic_info):
+    """Índice da entidade principal, via cache persistente por OLT.
+
+    Os walks no ENTITY-MIB só são refeitos quando o sysUpTime (do GET de
+    get_olt_info) ou o entLastChangeTime indicam reboot ou mudança na tabela
+    de entidades. Sem entLastChangeTime, vale só a checagem de reboot.
+    """
+    uptime_ticks = None
+    if basic_info:
+        try:
+            uptime_ticks = int(basic_info.get(OID_SYS_UPTIME))
+        except (TypeError, ValueError):
+            pass
+    ent_last_change = get_ent_last_change(olt_ip, community)
+
+    entity_index = entity_index_cache.lookup(olt_ip, uptime_ticks, ent_last_change)
+    if entity_index is not None:
+        return entity_index
+
+    # Um único walk atende as três tentativas
+    entity_data = walk_entities(olt_ip, community)
+    entity_index = find_entity_index(olt_ip, community, desired_class='chassis', entity_data=entity_data)
+    if not entity_index:
+         entity_index = find_entity_index(olt_ip, community, desired_class='container', desired_descr_part='MPLA',
+                                          entity_data=entity_data)
+         if not entity_index:
+             entity_index = find_entity_index(olt_ip, community, desired_class='module', desired_descr_part='Control',
+                                              entity_data=entity_data)
+
+    if entity_index and uptime_ticks is not None:
+        entity_index_cache.store_index(olt_ip, entity_index, uptime_ticks, ent_last_change)
+    return entity_index
+
+def parse_basic_info(basic_info):
+    """Extrai sysDescr e uptime formatado do resultado de um GET em sysDescr/sysUpTime."""
+    if not basic_info:
+        return {'sysDescr': 'Erro ao buscar', 'uptime': 'Erro ao buscar', 'uptime_seconds': 0}
+
+    info = {'sysDescr': basic_info.get(OID_SYS_DESCR, 'N/A')}
+    try:
+        uptime_ticks = int(basic_info.get(OID_SYS_UPTIME, 0))
+        uptime_seconds = uptime_ticks / 100
+        days = int(uptime_seconds // (24 * 3600))
+        hours = int((uptime_seconds % (24 * 3600)) // 3600)
+        minutes = int((uptime_seconds % 3600) // 60)
+        info['uptime'] = f"{days}d {hours}h {minutes}m"
+        info['uptime_seconds'] = uptime_seconds
+    except ValueError:
+        info['uptime'] = 'Erro na conversão'
+        info['uptime_seconds'] = 0
+    return info
+
 def get_olt_info():
     """Coleta informações básicas da OLT via SNMP."""
     olt_ip = os.environ.get('OLT_IP')
     community = os.environ.get('SNMP_COMMUNITY')
 
     if not olt_ip or not community:
-        print("OLT_IP ou SNMP_COMMUNITY não definidos nas variáveis de ambiente.")
+        logger.error("OLT_IP ou SNMP_COMMUNITY não definidos nas variáveis de ambiente.")
         return {'error': 'Configuração SNMP ausente.'}
 
     olt_data = {'ip': olt_ip}
 
-    # 1. Obter sysDescr e sysUpTime
+    # 1. Obter sysDescr e sysUpTime (este também valida o cache de entidade)
     basic_info = get_snmp_data(olt_ip, community, [OID_SYS_DESCR, OID_SYS_UPTIME])
-    if basic_info:
-        olt_data['sysDescr'] = basic_info.get(OID_SYS_DESCR, 'N/A')
-        try:
-            uptime_ticks = int(basic_info.get(OID_SYS_UPTIME, 0))
-            uptime_seconds = uptime_ticks / 100
-            days = int(uptime_seconds // (24 * 3600))
-            hours = int((uptime_seconds % (24 * 3600)) // 3600)
-            minutes = int((uptime_seconds % 3600) // 60)
-            olt_data['uptime'] = f"{days}d {hours}h {minutes}m"
-            olt_data['uptime_seconds'] = uptime_seconds
-        except ValueError:
-            olt_data['uptime'] = 'Erro na conversão'
-            olt_data['uptime_seconds'] = 0
-    else:
-        olt_data['sysDescr'] = 'Erro ao buscar'
-        olt_data['uptime'] = 'Erro ao buscar'
-        olt_data['uptime_seconds'] = 0
+    olt_data.update(parse_basic_info(basic_info))
 
     # 2. Encontrar índice da entidade principal
-    entity_index = find_entity_index(olt_ip, community, desired_class='chassis')
-    if not entity_index:
-         entity_index = find_entity_index(olt_ip, community, desired_class='container', desired_descr_part='MPLA')
-         if not entity_index:
-             entity_index = find_entity_index(olt_ip, community, desired_class='module', desired_descr_part='Control')
+    entity_index = get_entity_index(olt_ip, community, basic_info)
 
     if entity_index:
-        print(f"Usando índice de entidade: {entity_index}")
+        logger.debug(f"Usando índice de entidade: {entity_index}")
         # 3. Obter Modelo, Versão SW e Temperatura
         oids_with_index = [
             f"{OID_ENT_PHYSICAL_MODEL}.{entity_index}",
@@ -250,7 +390,7 @@ def get_olt_info():
             olt_data['sw_version'] = 'Erro ao buscar'
             olt_data['temperature'] = 'Erro ao buscar'
     else:
-        print("Não foi possível determinar o índice da entidade principal.")
+        logger.error("Não foi possível determinar o índice da entidade principal.")
         olt_data['model'] = 'Índice não encontrado'
         olt_data['sw_version'] = 'Índice não encontrado'
         olt_data['temperature'] = 'Índice não encontrado'
@@ -269,7 +409,7 @@ def get_olt_info():
                      olt_data['sw_version'] = part
                      break
 
-    print(f"Dados da OLT coletados: {olt_data}")
+    logger.debug(f"Dados da OLT coletados: {olt_data}")
     return olt_data
 
 def get_ont_list():
@@ -278,110 +418,92 @@ def get_ont_list():
     community = os.environ.get('SNMP_COMMUNITY')
 
     if not olt_ip or not community:
-        print("OLT_IP ou SNMP_COMMUNITY não definidos nas variáveis de ambiente.")
+        logger.error("OLT_IP ou SNMP_COMMUNITY não definidos nas variáveis de ambiente.")
         return {'error': 'Configuração SNMP ausente.'}
 
-    onts = {}
-    print("Iniciando coleta de interfaces...")
+    logger.debug("Iniciando coleta de interfaces...")
     if_map = get_interface_map(olt_ip, community)
-    print(f"Mapa de interfaces obtido: {len(if_map)} entradas.")
-
-    # OIDs a serem buscados no walk
-    oids_to_walk = [
-        OID_HW_GONU_SERIAL_NUMBER,
-        OID_HW_GONU_LOID,
-        OID_HW_GONU_LINK_STATUS,
-        OID_HW_GONU_REG_STATUS,
-        OID_HW_GONU_RX_POWER,
-        OID_HW_GONU_TX_POWER
-    ]
-
-    print("Iniciando SNMP walk nas tabelas de ONU...")
-    walk_data = snmp_walk(olt_ip, community, oids_to_walk)
-
-    if not walk_data:
-        print("Falha ao obter dados das tabelas de ONU.")
-        return {'error': 'Falha ao obter dados SNMP das ONUs.'}
+    logger.info(f"Mapa de interfaces obtido: {len(if_map)} entradas.")
 
-    print(f"Dados brutos do walk obtidos: {len(walk_data)} entradas.")
+    try:
+        logger.debug("Iniciando SNMP walk nas tabelas de ONU...")
+        ont_list = build_ont_list(walk_ont_columns(olt_ip, community, ONT_TABLE_OIDS, if_map, collection=True),
+                                  if_map, get_thresholds(olt_ip))
+    except SnmpError as e:
+        logger.error(f"Erro SNMP WALK: {e}")
+        ont_list = None
+
+    if not ont_list:
+        logger.error("Falha ao obter dados das tabelas de ONU.")
+        return {'error': 'Falha ao obter dados SNMP das ONUs.'}
 
-    # Processar os dados do walk
-    for oid, value in walk_data.items():
-        try:
-            parts = oid.split('.')
-            # O índice da ONU geralmente é composto por ifIndex.onuId
-            if len(parts) < 2:
-                continue
-            onu_id = int(parts[-1])
-            if_index = int(parts[-2])
-            base_oid = '.'.join(parts[:-2])
-
-            # Cria a entrada para a ONU se não existir
-            ont_key = f"{if_index}.{onu_id}"
-            if ont_key not in onts:
-                onts[ont_key] = {
-                    'ifIndex': if_index,
-                    'onuId': onu_id,
-                    'portName': if_map.get(if_index, f"ifIndex {if_index}"),
-                    'serialNumber': 'N/A',
-                    'loid': 'N/A',
-                    'linkStatus': 'unknown',
-                    'regStatus': 'unknown',
-                    'rxPower': 'N/A',
-                    'txPower': 'N/A',
-                    'category': 'Desconhecido' # Inicializa categoria
-                }
-
-            # Preenche os dados da ONU
-            if base_oid == OID_HW_GONU_SERIAL_NUMBER:
-                try:
-                    hex_serial = value.replace('0x', '').replace(' ', '')
-                    ascii_serial = bytes.fromhex(hex_serial).decode('ascii', errors='ignore')
-                    if len(ascii_serial) > 4 and ascii_serial[:4].isalnum() and ascii_serial[:4].isupper():
-                         onts[ont_key]['serialNumber'] = ascii_serial
-                    else:
-                         onts[ont_key]['serialNumber'] = hex_serial
-                except Exception as e:
-                    print(f"Erro ao formatar serial {value}: {e}")
-                    onts[ont_key]['serialNumber'] = value
-            elif base_oid == OID_HW_GONU_LOID:
-                onts[ont_key]['loid'] = value
-            elif base_oid == OID_HW_GONU_LINK_STATUS:
-                status_map = {1: 'online', 2: 'offline', 3: 'unknown'}
-                onts[ont_key]['linkStatus'] = status_map.get(int(value), 'invalid')
-            elif base_oid == OID_HW_GONU_REG_STATUS:
-                status_map = {1: 'registered', 2: 'unregistered', 3: 'unknown'}
-                onts[ont_key]['regStatus'] = status_map.get(int(value), 'invalid')
-            elif base_oid == OID_HW_GONU_RX_POWER:
-                try:
-                    power_val = float(value) / 100.0
-                    onts[ont_key]['rxPower'] = f"{power_val:.2f} dBm"
-                except ValueError:
-                    onts[ont_key]['rxPower'] = 'Invalid Value'
-            elif base_oid == OID_HW_GONU_TX_POWER:
-                try:
-                    power_val = float(value) / 100.0
-                    onts[ont_key]['txPower'] = f"{power_val:.2f} dBm"
-                except ValueError:
-                    onts[ont_key]['txPower'] = 'Invalid Value'
-
-        except (ValueError, IndexError) as e:
-            print(f"Erro ao processar OID {oid} com valor {value}: {e}")
-            continue
-
-    # Categorizar ONUs após coletar todos os dados
-    for key in onts:
-        onts[key]['category'] = categorize_ont(onts[key])
-
-    print(f"Total de ONUs processadas e categorizadas: {len(onts)}")
+    return ont_list
+
+def walk_ont_columns(target_ip, community, oids, if_map, collection=False):
+    """Linhas (oid_tupla, valor) das colunas de ONU indicadas, da OLT configurada no ambiente.
+
+    Com SNMP_SHARD_CONCURRENCY > 1 (e GETBULK, v2c/v3) o walk é fatiado
+    pelas portas PON do mapa de interfaces, com até essa quantidade de
+    fatias em paralelo. Senão é um walk só, consumido em streaming: as
+    linhas são processadas conforme os PDUs chegam.
+    """
+    pon_ports = pon_if_indexes(if_map)
+    if SNMP_SHARD_CONCURRENCY > 1 and pon_ports and SNMP_VERSION != '1':
+        # Import tardio: snmp_collector importa este módulo
+        from app.snmp_collector import OltTarget, walk_ont_shards
+        target = OltTarget(None, target_ip, target_ip, community, SNMP_PORT, SNMP_VERSION,
+                           env_credentials() if SNMP_VERSION == '3' else None)
+        return walk_ont_shards(target, pon_ports, collection=collection, oids=oids)
+    return iter_snmp_walk(target_ip, community, oids, collection=collection)
+
+def build_ont_list(walk_rows, if_map, thresholds=None):
+    """Monta e categoriza a lista de ONUs a partir de (oid_tupla, valor) das colunas ONT_TABLE_OIDS.
+
+    Os campos guardam tipos nativos (bytes, int, float em dBm); use
+    snmp_decode.format_ont para obter a versão em texto. thresholds é o
+    OltThresholds da OLT (padrão do módulo se None).
+    """
+    onts = merge_ont_rows({}, walk_rows, if_map)
+
+    # Categorizar ONUs após coletar todos os dados, em lote
+    categorize_onts(onts.values(), thresholds)
+
+    logger.info(f"Total de ONUs processadas e categorizadas: {len(onts)}")
     # Retorna a lista de dicionários de ONUs
     return list(onts.values())
 
+def merge_ont_rows(onts, walk_rows, if_map):
+    """Preenche onts {(ifIndex, onuId): ont} com as linhas de um walk nas colunas de ONU.
+
+    Só decodifica os valores; a categorização fica a cargo de quem chama.
+    """
+    for (if_index, onu_id), field, value in ONT_COLUMNS.dispatch(walk_rows):
+        # Cria a entrada para a ONU se não existir
+        ont_key = (if_index, onu_id)
+        ont = onts.get(ont_key)
+        if ont is None:
+            ont = onts[ont_key] = {
+                'ifIndex': if_index,
+                'onuId': onu_id,
+                'portName': if_map.get(if_index, f"ifIndex {if_index}"),
+                'serialNumber': None,
+                'loid': None,
+                'linkStatus': None,
+                'regStatus': None,
+                'rxPower': None,
+                'txPower': None,
+                'category': 'Desconhecido' # Inicializa categoria
+            }
+        ont[field] = value
+
+    return onts
+
 # --- Teste Local --- #
 if __name__ == '__main__':
     # Defina as variáveis de ambiente OLT_IP e SNMP_COMMUNITY
     # Exemplo: export OLT_IP='10.0.0.10'
     #          export SNMP_COMMUNITY='cloudfibertelecom1@'
+    logging.basicConfig(level=logging.INFO)
 
     print("--- Testando get_olt_info() ---")
     olt_info = get_olt_info()
@@ -398,7 +520,7 @@ if __name__ == '__main__':
         # Imprime detalhes das 5 primeiras ONTs como exemplo
         for i, ont in enumerate(ont_list[:5]):
             print(f"\nONT #{i+1}:")
-            for key, value in ont.items():
+            for key, value in format_ont(ont).items():
                 print(f"  {key}: {value}")
         # Contagem por categoria
         categories = {}
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Benchmark ponta a ponta dos coletores contra a OLT simulada.
+
+Sobe benchmarks.simulator em uma thread (latência e perda configuráveis),
+aponta OLT_IP/SNMP_PORT para ele e mede, para cada tamanho de OLT, o tempo
+mínimo e a mediana de:
+
+- get_olt_info;
+- walk da tabela de ONUs em streaming (um walk) e fatiado por porta PON;
+- coleta incremental (IncrementalOntPoller, a partir da segunda rodada);
+- coletor asyncio (collect_olts);
+- HuaweiOLTManager.get_onu_states.
+
+Sai com código 1 se o walk fatiado não trouxer as mesmas ONUs do walk em
+streaming. As mesmas medições, com as conferências de cada caminho, estão
+em benchmarks/test_collectors.py (pytest -m benchmark). O simulador só fala
+v2c: os caminhos v1 e v3 não são exercitados aqui.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_collectors [--onus 100 1000 10000] [--rounds 5] [--latency 0.005] [--loss 0]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+COMMUNITY = 'public'
+
+
+def measure(label, func, rounds):
+    times = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    print(f"  {label:<28} min {min(times) * 1000:9.1f} ms   mediana {statistics.median(times) * 1000:9.1f} ms")
+    return result
+
+
+def run(onus, port, rounds, latency, loss):
+    """Mede os coletores contra um simulador de `onus` ONUs; retorna as divergências encontradas."""
+    # Imports tardios: os módulos da aplicação leem OLT_IP/SNMP_PORT na importação
+    from app.models.snmp_manager import HuaweiOLTManager, SNMPManager
+    from app.snmp_collector import OltTarget, collect_olts, walk_ont_shards
+    from app.snmp_poller import IncrementalOntPoller
+    from app.snmp_utils import (
+        ONT_TABLE_OIDS, build_ont_list, get_interface_map, get_olt_info, iter_snmp_walk,
+        pon_if_indexes
+    )
+    from benchmarks.simulator import SimulatedOlt, synthetic_olt
+
+    with SimulatedOlt(synthetic_olt(onus), COMMUNITY, port=port, latency=latency, loss=loss) as agent:
+        host = agent.address[0]
+
+        print(f"\n{onus} ONUs ({len(agent._oids)} OIDs) em {host}:{port}, "
+              f"latência {latency * 1000:.1f} ms, perda {loss:.1%}")
+        if_map = get_interface_map(host, COMMUNITY)
+        pon_ports = pon_if_indexes(if_map)
+        target = OltTarget(None, 'simulador', host, COMMUNITY, port, '2c', None)
+
+        measure('get_olt_info', get_olt_info, rounds)
+        streamed = measure('walk em streaming',
+                           lambda: build_ont_list(iter_snmp_walk(host, COMMUNITY, ONT_TABLE_OIDS), if_map), rounds)
+        sharded = measure(f'walk fatiado ({len(pon_ports)} portas)',
+                          lambda: build_ont_list(walk_ont_shards(target, pon_ports), if_map), rounds)
+        problems = []
+        if sorted(streamed, key=ont_key) != sorted(sharded, key=ont_key):
+            problems.append(f"{onus} ONUs: streaming trouxe {len(streamed)} ONUs e o walk fatiado {len(sharded)}, "
+                            f"com conteúdo diferente")
+
+        poller = IncrementalOntPoller()
+        poller.poll(host, COMMUNITY, if_map)
+        measure('poller incremental', lambda: poller.poll(host, COMMUNITY, if_map), rounds)
+        measure('collect_olts', lambda: collect_olts([target]), rounds)
+
+        manager = HuaweiOLTManager(SNMPManager(host, COMMUNITY, port))
+        measure('get_onu_states', manager.get_onu_states, rounds)
+        print(f"  PDUs recebidos pelo simulador: {agent.requests} ({agent.dropped} descartados)")
+    return problems
+
+
+def ont_key(ont):
+    return ont['ifIndex'], ont['onuId']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--onus', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--port', type=int, default=1161, help='porta UDP do simulador')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.005, help='segundos por resposta')
+    parser.add_argument('--loss', type=float, default=0.0, help='fração de pacotes descartados')
+    args = parser.parse_args(argv)
+
+    # A porta é fixa para todos os tamanhos porque snmp_utils a lê uma vez só.
+    # O cache lateral é descartável.
+    os.environ.update({'OLT_IP': '127.0.0.1', 'SNMP_PORT': str(args.port), 'SNMP_COMMUNITY': COMMUNITY})
+    os.environ.setdefault('SNMP_STATE_FILE', os.path.join(tempfile.mkdtemp(), 'snmp_state.json'))
+    problems = [problem for onus in args.onus for problem in run(onus, args.port, args.rounds, args.latency, args.loss)]
+    for problem in problems:
+        print(f"ERRO: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
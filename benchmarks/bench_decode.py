@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark: decodificação tipada vs. ida e volta por prettyPrint.
+
+Gera uma tabela sintética de 100k varbinds (6 colunas GONU) com objetos
+pysnmp reais e mede o tempo de build_ont_list contra a implementação antiga,
+que convertia tudo para texto e depois fazia o parse de volta.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_decode [VARBINDS]
+"""
+
+import random
+import re
+import sys
+import time
+
+from pysnmp.proto.rfc1902 import Integer32, OctetString
+
+from app.snmp_session import oid_tuple
+from app.snmp_utils import (
+    OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_LOID, OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER, OID_HW_GONU_TX_POWER,
+    RX_POWER_CRITICAL_THRESHOLD, RX_POWER_VERY_LOW_THRESHOLD, build_ont_list
+)
+
+COLUMNS = [OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_LOID, OID_HW_GONU_LINK_STATUS,
+           OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER, OID_HW_GONU_TX_POWER]
+PON_BASE_IFINDEX = 4194304000
+
+
+def synthetic_rows(varbinds):
+    """[(oid_tupla, valor pysnmp)] com ~varbinds entradas, coluna a coluna."""
+    rng = random.Random(42)
+    onus = max(1, varbinds // len(COLUMNS))
+    index = [(PON_BASE_IFINDEX + (n // 128) * 256, n % 128) for n in range(onus)]
+    rows = []
+    for column in COLUMNS:
+        base = oid_tuple(column)
+        for if_index, onu_id in index:
+            if column == OID_HW_GONU_SERIAL_NUMBER:
+                value = OctetString(b'HWTC' + rng.getrandbits(32).to_bytes(4, 'big'))
+            elif column == OID_HW_GONU_LOID:
+                value = OctetString(f'loid{if_index % 1000}{onu_id}'.encode())
+            elif column in (OID_HW_GONU_LINK_STATUS, OID_HW_GONU_REG_STATUS):
+                value = Integer32(rng.choice((1, 1, 1, 2)))
+            else:
+                value = Integer32(rng.randint(-3800, -1200))
+            rows.append((base + (if_index, onu_id), value))
+    return rows
+
+
+def legacy_build_ont_list(walk_rows, if_map):
+    """Reprodução do caminho antigo: prettyPrint, parse de texto e regex na categorização."""
+    walk_data = {'.'.join(map(str, oid)): value.prettyPrint() for oid, value in walk_rows}
+    onts = {}
+    for oid, value in walk_data.items():
+        parts = oid.split('.')
+        onu_id = int(parts[-1])
+        if_index = int(parts[-2])
+        base_oid = '.'.join(parts[:-2])
+        ont = onts.setdefault(f"{if_index}.{onu_id}", {
+            'ifIndex': if_index, 'onuId': onu_id,
+            'portName': if_map.get(if_index, f"ifIndex {if_index}"),
+            'serialNumber': 'N/A', 'loid': 'N/A', 'linkStatus': 'unknown',
+            'regStatus': 'unknown', 'rxPower': 'N/A', 'txPower': 'N/A'})
+        if base_oid == OID_HW_GONU_SERIAL_NUMBER:
+            try:
+                hex_serial = value.replace('0x', '').replace(' ', '')
+                ont['serialNumber'] = bytes.fromhex(hex_serial).decode('ascii', errors='ignore')
+            except ValueError:
+                ont['serialNumber'] = value
+        elif base_oid == OID_HW_GONU_LOID:
+            ont['loid'] = value
+        elif base_oid == OID_HW_GONU_LINK_STATUS:
+            ont['linkStatus'] = {1: 'online', 2: 'offline', 3: 'unknown'}.get(int(value), 'invalid')
+        elif base_oid == OID_HW_GONU_REG_STATUS:
+            ont['regStatus'] = {1: 'registered', 2: 'unregistered', 3: 'unknown'}.get(int(value), 'invalid')
+        elif base_oid == OID_HW_GONU_RX_POWER:
+            ont['rxPower'] = f"{float(value) / 100.0:.2f} dBm"
+        elif base_oid == OID_HW_GONU_TX_POWER:
+            ont['txPower'] = f"{float(value) / 100.0:.2f} dBm"
+    for ont in onts.values():
+        match = re.match(r"(-?[0-9\.]+)\s*dBm", ont['rxPower'])
+        rx_power = float(match.group(1)) if match else None
+        if ont['regStatus'] == 'unregistered':
+            ont['category'] = 'Esperando Provisionamento'
+        elif ont['linkStatus'] == 'offline':
+            ont['category'] = 'Offline'
+        elif rx_power is None:
+            ont['category'] = 'Online (Sinal Desconhecido)'
+        elif rx_power < RX_POWER_VERY_LOW_THRESHOLD:
+            ont['category'] = 'Sinal Muito Baixo (Falha?)'
+        elif rx_power < RX_POWER_CRITICAL_THRESHOLD:
+            ont['category'] = 'Sinal Baixo/Crítico'
+        else:
+            ont['category'] = 'Online (Sinal OK)'
+    return list(onts.values())
+
+
+def bench(label, func, rows, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(rows, {})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<22} {best * 1000:9.1f} ms  {best / len(rows) * 1e6:7.2f} µs/varbind  ({len(result)} ONUs)")
+
+
+if __name__ == '__main__':
+    varbinds = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = synthetic_rows(varbinds)
+    print(f"{len(rows)} varbinds sintéticos")
+    bench("texto (antigo)", legacy_build_ont_list, rows)
+    bench("tipado", build_ont_list, rows)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark: custo de parse por varbind nas tabelas de ONU.
+
+Compara, sobre a mesma tabela sintética de bench_decode, só a etapa de
+identificar a coluna/índice de cada varbind e decodificar o valor:
+
+- strings: '.'.join do OID, split, join da base e if/elif em seis strings;
+- tuplas: fatia oid[:-2] comparada em if/elif com seis tuplas;
+- despacho: OidDispatcher (um slice e uma busca em dict), via merge_ont_rows.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_dispatch [VARBINDS]
+"""
+
+import sys
+import time
+
+from app.snmp_decode import decode_int, decode_octets, decode_power
+from app.snmp_session import oid_tuple
+from app.snmp_utils import (
+    OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_LOID, OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER, OID_HW_GONU_TX_POWER, merge_ont_rows
+)
+from benchmarks.bench_decode import synthetic_rows
+
+COL_SERIAL_NUMBER = oid_tuple(OID_HW_GONU_SERIAL_NUMBER)
+COL_LOID = oid_tuple(OID_HW_GONU_LOID)
+COL_LINK_STATUS = oid_tuple(OID_HW_GONU_LINK_STATUS)
+COL_REG_STATUS = oid_tuple(OID_HW_GONU_REG_STATUS)
+COL_RX_POWER = oid_tuple(OID_HW_GONU_RX_POWER)
+COL_TX_POWER = oid_tuple(OID_HW_GONU_TX_POWER)
+
+
+def _ont(onts, if_index, onu_id):
+    ont = onts.get((if_index, onu_id))
+    if ont is None:
+        ont = onts[(if_index, onu_id)] = {'ifIndex': if_index, 'onuId': onu_id}
+    return ont
+
+
+def parse_strings(walk_rows):
+    """Caminho com OIDs em texto."""
+    onts = {}
+    for oid, value in walk_rows:
+        parts = '.'.join(map(str, oid)).split('.')
+        ont = _ont(onts, int(parts[-2]), int(parts[-1]))
+        base_oid = '.'.join(parts[:-2])
+        if base_oid == OID_HW_GONU_SERIAL_NUMBER:
+            ont['serialNumber'] = decode_octets(value)
+        elif base_oid == OID_HW_GONU_LOID:
+            ont['loid'] = decode_octets(value)
+        elif base_oid == OID_HW_GONU_LINK_STATUS:
+            ont['linkStatus'] = decode_int(value)
+        elif base_oid == OID_HW_GONU_REG_STATUS:
+            ont['regStatus'] = decode_int(value)
+        elif base_oid == OID_HW_GONU_RX_POWER:
+            ont['rxPower'] = decode_power(value)
+        elif base_oid == OID_HW_GONU_TX_POWER:
+            ont['txPower'] = decode_power(value)
+    return onts
+
+
+def parse_tuple_chain(walk_rows):
+    """Caminho com tuplas e comparação coluna a coluna."""
+    onts = {}
+    for oid, value in walk_rows:
+        ont = _ont(onts, oid[-2], oid[-1])
+        base_oid = oid[:-2]
+        if base_oid == COL_SERIAL_NUMBER:
+            ont['serialNumber'] = decode_octets(value)
+        elif base_oid == COL_LOID:
+            ont['loid'] = decode_octets(value)
+        elif base_oid == COL_LINK_STATUS:
+            ont['linkStatus'] = decode_int(value)
+        elif base_oid == COL_REG_STATUS:
+            ont['regStatus'] = decode_int(value)
+        elif base_oid == COL_RX_POWER:
+            ont['rxPower'] = decode_power(value)
+        elif base_oid == COL_TX_POWER:
+            ont['txPower'] = decode_power(value)
+    return onts
+
+
+def parse_dispatch(walk_rows):
+    return merge_ont_rows({}, walk_rows, {})
+
+
+def bench(label, func, rows, rounds=5):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<10} {best * 1000:9.1f} ms  {best / len(rows) * 1e9:7.0f} ns/varbind  ({len(result)} ONUs)")
+
+
+if __name__ == '__main__':
+    varbinds = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = synthetic_rows(varbinds)
+    print(f"{len(rows)} varbinds sintéticos")
+    bench("strings", parse_strings, rows)
+    bench("tuplas", parse_tuple_chain, rows)
+    bench("despacho", parse_dispatch, rows)
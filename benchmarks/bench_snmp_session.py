@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Compara GETs SNMP com um SnmpEngine novo por chamada vs. sessão do pool.
+
+Uso (a partir da raiz do projeto):
+    OLT_IP=10.0.0.10 SNMP_COMMUNITY=public python -m benchmarks.bench_snmp_session [N]
+"""
+
+import os
+import sys
+import time
+
+from pysnmp.hlapi import (
+    getCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData,
+    ObjectType, ObjectIdentity
+)
+
+from app.snmp_session import get_session
+
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+
+
+def get_engine_per_call(host, port, community):
+    """Comportamento antigo: engine, transporte e LCD montados a cada chamada."""
+    return next(getCmd(SnmpEngine(),
+                       CommunityData(community, mpModel=1),
+                       UdpTransportTarget((host, port)),
+                       ContextData(),
+                       ObjectType(ObjectIdentity(OID_SYS_UPTIME))))
+
+
+def get_pooled(host, port, community):
+    return get_session(host, community, port).get([OID_SYS_UPTIME])
+
+
+def run(label, func, calls, *args):
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        error_indication, error_status, _, _ = func(*args)
+        if error_indication or error_status:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {calls / elapsed:10.1f} chamadas/s  ({elapsed:.2f}s, {errors} erros)")
+
+
+if __name__ == '__main__':
+    host = os.environ.get('OLT_IP', '127.0.0.1')
+    port = int(os.environ.get('SNMP_PORT') or 161)
+    community = os.environ.get('SNMP_COMMUNITY', 'public')
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print(f"Alvo {host}:{port}, {calls} GETs de sysUpTime")
+    run("engine por chamada", get_engine_per_call, calls, host, port, community)
+    run("sessão do pool", get_pooled, calls, host, port, community)
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Permite rodar `pytest benchmarks` da raiz sem instalar o pacote
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: coletores contra a OLT simulada (selecione com -m benchmark)')
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""Agente SNMP v2c local que imita uma OLT Huawei MA5800, para benchmarks.
+
+Só v2c: mensagens v1 e v3 são ignoradas (o cliente vê timeout), então o
+suporte v1/v3 de snmp_session/snmp_usm não é exercitado pelo simulador.
+
+Serve GET, GETNEXT, GETBULK e SET sobre uma tabela de OIDs em memória:
+
+- sintética (synthetic_olt): system, IF-MIB, ENTITY-MIB, HUAWEI-GONU-MIB e as
+  colunas usadas por HuaweiOLTManager, com 100 a 100k ONUs;
+- ou gravada de um equipamento real em formato .snmprec (oid|tipo|valor,
+  o mesmo do snmpsim), via `record`.
+
+Latência (média + jitter) e perda de pacotes são injetáveis, e respostas
+maiores que max_message_size voltam como tooBig, como em um agente real.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.simulator serve --onus 2000 --port 1161 --latency 0.01 --loss 0.01
+    python -m benchmarks.simulator serve --snmprec olt.snmprec --port 1161
+    python -m benchmarks.simulator record 10.0.0.10 public olt.snmprec
+
+Depois aponte a aplicação para ele: OLT_IP=127.0.0.1 SNMP_PORT=1161 SNMP_COMMUNITY=public
+"""
+
+import argparse
+import bisect
+import heapq
+import random
+import select
+import socket
+import sys
+import threading
+import time
+
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.error import PyAsn1Error
+from pysnmp.proto import api
+from pysnmp.proto.rfc1905 import endOfMibView, noSuchInstance
+
+from app.snmp_decode import POWER_NOT_AVAILABLE
+from app.snmp_session import oid_tuple
+from app.snmp_utils import (
+    OID_SYS_DESCR, OID_SYS_UPTIME, OID_ENT_PHYSICAL_DESCR, OID_ENT_PHYSICAL_CLASS,
+    OID_ENT_PHYSICAL_MODEL, OID_ENT_LAST_CHANGE_TIME, OID_HW_ENTITY_TEMP, OID_HW_ENTITY_SW_REV,
+    OID_IF_NUMBER, OID_IF_TABLE_LAST_CHANGE, OID_IF_DESCR, OID_IF_TYPE, OID_IF_ADMIN_STATUS,
+    OID_IF_OPER_STATUS, OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_LOID, OID_HW_GONU_LINK_STATUS,
+    OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER, OID_HW_GONU_TX_POWER
+)
+
+v2c = api.protoModules[api.protoVersion2c]
+
+OID_SYS_NAME = '1.3.6.1.2.1.1.5.0'
+# Colunas lidas por HuaweiOLTManager (app/models/snmp_manager.py)
+OID_MANAGER_ONU_LIST = '1.3.6.1.4.1.2011.6.128.1.1.2.43.1.3'
+OID_MANAGER_ONU_STATUS = '1.3.6.1.4.1.2011.6.128.1.1.2.43.1.8'
+OID_MANAGER_ONU_SIGNAL = '1.3.6.1.4.1.2011.6.128.1.1.2.51.1.4'
+
+# ifIndex das portas na MA5800: base + slot * 8192 + porta * 256
+HW_IFINDEX_BASE = 4194304000
+HW_IFINDEX_SLOT = 8192
+HW_IFINDEX_PORT = 256
+
+# Subárvores gravadas por `record`
+RECORD_ROOTS = ['1.3.6.1.2.1.1', '1.3.6.1.2.1.2', '1.3.6.1.2.1.31.1.5', '1.3.6.1.2.1.47.1',
+                '1.3.6.1.4.1.2011.5.25.31.1.1.1', '1.3.6.1.4.1.2011.5.104.1',
+                '1.3.6.1.4.1.2011.6.128.1.1.2.43.1', '1.3.6.1.4.1.2011.6.128.1.1.2.51.1']
+
+
+# Tipos SNMP além de int (Integer32) e bytes (OctetString)
+class Ticks(int):
+    pass
+
+
+class Gauge(int):
+    pass
+
+
+class Counter(int):
+    pass
+
+
+class Counter64(int):
+    pass
+
+
+class Oid(tuple):
+    pass
+
+
+class IpAddress(str):
+    pass
+
+
+def to_snmp(value):
+    """Valor Python da tabela -> objeto pysnmp da resposta."""
+    if callable(value):
+        value = value()
+    if isinstance(value, Ticks):
+        return v2c.TimeTicks(value)
+    if isinstance(value, Gauge):
+        return v2c.Gauge32(value)
+    if isinstance(value, Counter):
+        return v2c.Counter32(value)
+    if isinstance(value, Counter64):
+        return v2c.Counter64(value)
+    if isinstance(value, Oid):
+        return v2c.ObjectIdentifier(value)
+    if isinstance(value, IpAddress):
+        return v2c.IpAddress(value)
+    if isinstance(value, int):
+        return v2c.Integer32(value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return v2c.OctetString(value)
+
+
+def synthetic_olt(onus=1000, boards=16, ports_per_board=16, offline_ratio=0.05,
+                  unregistered_ratio=0.01, seed=42):
+    """Tabela [(oid_tupla, valor)] de uma MA5800 com `onus` ONUs espalhadas pelas portas PON."""
+    rng = random.Random(seed)
+    started = time.monotonic()
+    rows = []
+
+    def add(oid, value):
+        rows.append((oid_tuple(oid) if isinstance(oid, str) else oid, value))
+
+    add(OID_SYS_DESCR, b'Huawei Integrated Access Software (MA5800). VERSION : MA5800V100R019C10 (simulador)')
+    add(OID_SYS_UPTIME, lambda: Ticks(int((time.monotonic() - started) * 100) + 8640000))
+    add(OID_SYS_NAME, b'MA5800-SIM')
+
+    # ENTITY-MIB: chassis (classe 3), placa de controle (9) e placas de serviço (9)
+    add(OID_ENT_LAST_CHANGE_TIME, Ticks(0))
+    entities = [(1, b'MA5800-X17 Chassis', 3, b'MA5800-X17'), (2, b'MPLA Control Board', 9, b'H901MPLA')]
+    entities += [(10 + slot, f'GPHF GPON Board {slot}'.encode(), 9, b'H901GPHF') for slot in range(1, boards + 1)]
+    for index, descr, physical_class, model in entities:
+        add(f"{OID_ENT_PHYSICAL_DESCR}.{index}", descr)
+        add(f"{OID_ENT_PHYSICAL_CLASS}.{index}", physical_class)
+        add(f"{OID_ENT_PHYSICAL_MODEL}.{index}", model)
+        add(f"{OID_HW_ENTITY_TEMP}.{index}", rng.randint(38, 55))
+        add(f"{OID_HW_ENTITY_SW_REV}.{index}", b'MA5800V100R019C10')
+
+    # IF-MIB: portas PON (gpon = 250) e uplinks GE
+    pon_ports = []
+    interfaces = []
+    for slot in range(1, boards + 1):
+        for port in range(ports_per_board):
+            if_index = HW_IFINDEX_BASE + slot * HW_IFINDEX_SLOT + port * HW_IFINDEX_PORT
+            pon_ports.append(if_index)
+            interfaces.append((if_index, f'GPON 0/{slot}/{port}'.encode(), 250))
+    uplink_slot = boards + 1
+    for port in range(4):
+        if_index = HW_IFINDEX_BASE + uplink_slot * HW_IFINDEX_SLOT + port * HW_IFINDEX_PORT
+        interfaces.append((if_index, f'GE0/{uplink_slot}/{port}'.encode(), 6))
+    add(OID_IF_NUMBER, len(interfaces))
+    add(OID_IF_TABLE_LAST_CHANGE, Ticks(1200))
+    for if_index, descr, if_type in interfaces:
+        add(f"{OID_IF_DESCR}.{if_index}", descr)
+        add(f"{OID_IF_TYPE}.{if_index}", if_type)
+        add(f"{OID_IF_ADMIN_STATUS}.{if_index}", 1)
+        add(f"{OID_IF_OPER_STATUS}.{if_index}", 1)
+
+    # HUAWEI-GONU-MIB (ifIndex.onuId) e colunas de HuaweiOLTManager (índice sequencial)
+    for n in range(onus):
+        if_index = pon_ports[n % len(pon_ports)]
+        onu_id = n // len(pon_ports)
+        index = f"{if_index}.{onu_id}"
+        serial = b'HWTC' + rng.getrandbits(32).to_bytes(4, 'big')
+        unregistered = rng.random() < unregistered_ratio
+        offline = unregistered or rng.random() < offline_ratio
+        rx_power = POWER_NOT_AVAILABLE if offline else rng.randint(-3800, -1200)
+        add(f"{OID_HW_GONU_SERIAL_NUMBER}.{index}", serial)
+        add(f"{OID_HW_GONU_LOID}.{index}", f'loid{n:06d}'.encode())
+        add(f"{OID_HW_GONU_LINK_STATUS}.{index}", 2 if offline else 1)
+        add(f"{OID_HW_GONU_REG_STATUS}.{index}", 2 if unregistered else 1)
+        add(f"{OID_HW_GONU_RX_POWER}.{index}", rx_power)
+        add(f"{OID_HW_GONU_TX_POWER}.{index}", POWER_NOT_AVAILABLE if offline else rng.randint(150, 350))
+        add(f"{OID_MANAGER_ONU_LIST}.{n + 1}", serial.hex().upper())
+        add(f"{OID_MANAGER_ONU_STATUS}.{n + 1}", 2 if offline else 1)
+        add(f"{OID_MANAGER_ONU_SIGNAL}.{n + 1}", 0 if offline else rx_power // 10)
+    return rows
+
+
+# --- .snmprec --- #
+
+_SNMPREC_TYPES = {
+    '2': int, '65': Counter, '66': Gauge, '67': Ticks, '70': Counter64,
+    '6': lambda text: Oid(oid_tuple(text)), '64': IpAddress,
+}
+
+
+def load_snmprec(path):
+    """Lê um arquivo .snmprec (oid|tipo|valor; tipo com sufixo x = valor em hex)."""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            try:
+                oid, tag, text = line.split('|', 2)
+                if tag.endswith('x'):
+                    raw = bytes.fromhex(text)
+                    tag = tag[:-1]
+                    value = raw if tag == '4' else _SNMPREC_TYPES[tag](raw.decode('ascii'))
+                elif tag == '4':
+                    value = text.encode('utf-8')
+                else:
+                    value = _SNMPREC_TYPES[tag](text)
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{path}:{line_number}: linha inválida ({e})")
+            rows.append((oid_tuple(oid), value))
+    return rows
+
+
+def snmprec_line(oid, value):
+    """(oid_tupla, valor pysnmp) -> linha .snmprec."""
+    oid_text = '.'.join(map(str, oid))
+    tag = value.getTagSet()[0].tagId if value.getTagSet() else 4
+    tag_class = value.getTagSet()[0].tagClass if value.getTagSet() else 0
+    # Tipos de aplicação (classe 0x40) usam o tagId + 64 no snmprec
+    code = tag + 64 if tag_class == 0x40 else tag
+    if code == 4:
+        raw = value.asOctets()
+        if all(32 <= byte < 127 for byte in raw):
+            return f"{oid_text}|4|{raw.decode('ascii')}"
+        return f"{oid_text}|4x|{raw.hex()}"
+    return f"{oid_text}|{code}|{value.prettyPrint()}"
+
+
+def record_walk(host, community, path, roots=RECORD_ROOTS, port=161):
+    """Grava as subárvores usadas pela aplicação de um equipamento real em .snmprec."""
+    from app.snmp_session import get_session
+
+    session = get_session(host, community, port)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for root in roots:
+            for oid, value in session.iter_walk([root]):
+                f.write(snmprec_line(oid, value) + '\n')
+                count += 1
+    return count
+
+
+# --- Agente --- #
+
+class SimulatedOlt:
+    """Agente SNMP v2c em uma thread, com latência/perda injetáveis.
+
+    Cada resposta é agendada para now + latency ± jitter, sem bloquear as
+    demais: requisições concorrentes se sobrepõem como em um agente real.
+    """
+
+    def __init__(self, rows, community='public', host='127.0.0.1', port=0,
+                 latency=0.0, jitter=0.0, loss=0.0, max_message_size=65000, seed=None):
+        rows = sorted(rows, key=lambda row: row[0])
+        self._oids = [oid for oid, _ in rows]
+        self._values = [value for _, value in rows]
+        self.community = community.encode()
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.max_message_size = max_message_size
+        self.requests = 0
+        self.dropped = 0
+        self._rng = random.Random(seed)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self._pending = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._socket.getsockname()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='snmp-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        sequence = 0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            while self._pending and self._pending[0][0] <= now:
+                _, _, data, address = heapq.heappop(self._pending)
+                self._socket.sendto(data, address)
+            timeout = 0.05
+            if self._pending:
+                timeout = max(0.0, min(timeout, self._pending[0][0] - now))
+            readable, _, _ = select.select([self._socket], [], [], timeout)
+            if not readable:
+                continue
+            data, address = self._socket.recvfrom(65535)
+            self.requests += 1
+            if self.loss and self._rng.random() < self.loss:
+                self.dropped += 1
+                continue
+            response = self.handle(data)
+            if response is None:
+                continue
+            delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            sequence += 1
+            heapq.heappush(self._pending, (time.monotonic() + max(0.0, delay), sequence, response, address))
+
+    def handle(self, data):
+        """Mensagem recebida -> resposta codificada (None para ignorar).
+
+        Só v2c com a community configurada; v1 e v3 são ignoradas.
+        """
+        try:
+            if api.decodeMessageVersion(data) != api.protoVersion2c:
+                return None
+            request, _ = decoder.decode(data, asn1Spec=v2c.Message())
+        except PyAsn1Error:
+            return None
+        if bytes(v2c.apiMessage.getCommunity(request)) != self.community:
+            return None
+        response = v2c.apiMessage.getResponse(request)
+        request_pdu = v2c.apiMessage.getPDU(request)
+        response_pdu = v2c.apiMessage.getPDU(response)
+        var_binds = [(oid_tuple(oid), value) for oid, value in v2c.apiPDU.getVarBinds(request_pdu)]
+
+        if request_pdu.isSameTypeWith(v2c.GetRequestPDU()):
+            result = [(oid, self._get(oid)) for oid in (oid for oid, _ in var_binds)]
+        elif request_pdu.isSameTypeWith(v2c.GetNextRequestPDU()):
+            result = [self._next(oid) for oid, _ in var_binds]
+        elif request_pdu.isSameTypeWith(v2c.GetBulkRequestPDU()):
+            result = self._bulk(var_binds, v2c.apiBulkPDU.getNonRepeaters(request_pdu),
+                                v2c.apiBulkPDU.getMaxRepetitions(request_pdu))
+        elif request_pdu.isSameTypeWith(v2c.SetRequestPDU()):
+            result, error_index = self._set(var_binds)
+            if error_index:
+                v2c.apiPDU.setErrorStatus(response_pdu, 17) # notWritable
+                v2c.apiPDU.setErrorIndex(response_pdu, error_index)
+                result = var_binds
+        else:
+            return None
+
+        v2c.apiPDU.setVarBinds(response_pdu, result)
+        encoded = encoder.encode(response)
+        if len(encoded) > self.max_message_size:
+            v2c.apiPDU.setErrorStatus(response_pdu, 1) # tooBig
+            v2c.apiPDU.setErrorIndex(response_pdu, 0)
+            v2c.apiPDU.setVarBinds(response_pdu, [])
+            encoded = encoder.encode(response)
+        return encoded
+
+    def _get(self, oid):
+        position = bisect.bisect_left(self._oids, oid)
+        if position < len(self._oids) and self._oids[position] == oid:
+            return to_snmp(self._values[position])
+        return noSuchInstance
+
+    def _next(self, oid):
+        position = bisect.bisect_right(self._oids, oid)
+        if position < len(self._oids):
+            return self._oids[position], to_snmp(self._values[position])
+        return oid, endOfMibView
+
+    def _bulk(self, var_binds, non_repeaters, max_repetitions):
+        non_repeaters = max(0, int(non_repeaters))
+        result = [self._next(oid) for oid, _ in var_binds[:non_repeaters]]
+        cursors = [oid for oid, _ in var_binds[non_repeaters:]]
+        for _ in range(max(0, int(max_repetitions))):
+            if not cursors:
+                break
+            row = [self._next(oid) for oid in cursors]
+            result.extend(row)
+            if all(value is endOfMibView for _, value in row):
+                break
+            cursors = [oid for oid, _ in row]
+        return result
+
+    def _set(self, var_binds):
+        positions = []
+        for number, (oid, _) in enumerate(var_binds, 1):
+            position = bisect.bisect_left(self._oids, oid)
+            if position >= len(self._oids) or self._oids[position] != oid:
+                return None, number
+            positions.append(position)
+        for position, (_, value) in zip(positions, var_binds):
+            self._values[position] = int(value) if isinstance(self._values[position], int) else value.asOctets()
+        return var_binds, 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='inicia o agente simulado')
+    serve.add_argument('--onus', type=int, default=1000)
+    serve.add_argument('--boards', type=int, default=16)
+    serve.add_argument('--snmprec', help='replay de uma gravação em vez da tabela sintética')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=1161)
+    serve.add_argument('--community', default='public')
+    serve.add_argument('--latency', type=float, default=0.0, help='segundos por resposta')
+    serve.add_argument('--jitter', type=float, default=0.0)
+    serve.add_argument('--loss', type=float, default=0.0, help='fração de pacotes descartados')
+    serve.add_argument('--max-message-size', type=int, default=65000)
+
+    record = commands.add_parser('record', help='grava um equipamento real em .snmprec')
+    record.add_argument('host')
+    record.add_argument('community')
+    record.add_argument('path')
+    record.add_argument('--port', type=int, default=161)
+
+    args = parser.parse_args(argv)
+    if args.command == 'record':
+        count = record_walk(args.host, args.community, args.path, port=args.port)
+        print(f"{count} OIDs gravados em {args.path}")
+        return
+
+    rows = load_snmprec(args.snmprec) if args.snmprec else synthetic_olt(args.onus, args.boards)
+    agent = SimulatedOlt(rows, args.community, args.host, args.port, args.latency, args.jitter,
+                         args.loss, args.max_message_size)
+    print(f"Simulador em {agent.address[0]}:{agent.address[1]} com {len(rows)} OIDs (Ctrl+C para sair)")
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
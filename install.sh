@@ -111,6 +111,7 @@ After=network.target
 [Service]
 User=$([ "$create_user" = "s" ] || [ "$create_user" = "S" ] && echo "oltmanager" || echo "$USER")
 WorkingDirectory=$INSTALL_DIR
+Environment=WEB_CONCURRENCY=4
 ExecStart=$INSTALL_DIR/venv/bin/gunicorn -w 4 -b 0.0.0.0:5000 run:app
 Restart=always
 StandardOutput=append:/var/log/olt-manager/stdout.log
@@ -0,0 +1,30 @@
+"""Limites SNMP por OLT (taxa, rajada e retentativas)
+
+Revision ID: 3b9f1c2d7e41
+Revises: aee592ba7530
+Create Date: 2026-10-17 10:12:31.418204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f1c2d7e41'
+down_revision = 'aee592ba7530'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('snmp_rate_limit', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('snmp_rate_burst', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('snmp_retries', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.drop_column('snmp_retries')
+        batch_op.drop_column('snmp_rate_burst')
+        batch_op.drop_column('snmp_rate_limit')
@@ -0,0 +1,30 @@
+"""Limites de RxPower por OLT e por porta PON
+
+Revision ID: 5d7a3e1c9f62
+Revises: 8c4e2a9f0b17
+Create Date: 2026-10-17 13:41:08.527310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7a3e1c9f62'
+down_revision = '8c4e2a9f0b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rx_power_critical', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('rx_power_very_low', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('rx_power_port_thresholds', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.drop_column('rx_power_port_thresholds')
+        batch_op.drop_column('rx_power_very_low')
+        batch_op.drop_column('rx_power_critical')
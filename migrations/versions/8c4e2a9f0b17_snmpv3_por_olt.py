@@ -0,0 +1,34 @@
+"""Credenciais SNMPv3 por OLT
+
+Revision ID: 8c4e2a9f0b17
+Revises: 3b9f1c2d7e41
+Create Date: 2026-10-17 11:02:47.903155
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2a9f0b17'
+down_revision = '3b9f1c2d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('snmp_v3_user', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('snmp_v3_auth_protocol', sa.String(length=8), nullable=True))
+        batch_op.add_column(sa.Column('snmp_v3_auth_password', sa.String(length=128), nullable=True))
+        batch_op.add_column(sa.Column('snmp_v3_priv_protocol', sa.String(length=8), nullable=True))
+        batch_op.add_column(sa.Column('snmp_v3_priv_password', sa.String(length=128), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('olt', schema=None) as batch_op:
+        batch_op.drop_column('snmp_v3_priv_password')
+        batch_op.drop_column('snmp_v3_priv_protocol')
+        batch_op.drop_column('snmp_v3_auth_password')
+        batch_op.drop_column('snmp_v3_auth_protocol')
+        batch_op.drop_column('snmp_v3_user')
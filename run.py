@@ -1,6 +1,9 @@
 from app import create_app, db
-from app.models.models import User
+from app.models.models import User, OLT, LogEntry
 import os
+import datetime
+import sqlite3
+import time
 import click
 from flask.cli import with_appcontext
 
@@ -27,5 +30,92 @@ def create_admin(username, email, password):
     db.session.commit()
     click.echo(f'Usuário administrador {username} criado com sucesso.')
 
+@app.cli.command("collect-olts")
+@click.option('--global-limit', default=64, help='Máximo de PDUs SNMP simultâneos no total')
+@click.option('--per-olt-limit', default=4, help='Máximo de PDUs SNMP simultâneos por OLT')
+@click.option('--shard/--no-shard', default=False, help='Fatia as tabelas de ONU por porta PON')
+@with_appcontext
+def collect_olts_command(global_limit, per_olt_limit, shard):
+    """Coleta todas as OLTs cadastradas em paralelo via SNMP.
+
+    As ONUs de cada OLT vão para o snapshot compartilhado (pelo IP da OLT),
+    com os contadores usados na tela de detalhes.
+    """
+    from app.snmp_collector import collect_olts, olt_targets
+
+    olts = {olt.id: olt for olt in OLT.query.all()}
+    sweep = collect_olts(olt_targets(olts.values()), global_limit=global_limit, per_olt_limit=per_olt_limit,
+                         shard_by_port=shard)
+
+    for result in sweep['olts']:
+        olt = olts[result['olt_id']]
+        olt.last_check = datetime.datetime.utcnow()
+        if result['error']:
+            olt.status = 'error'
+            db.session.add(LogEntry(level='error', source=f'OLT {olt.name}',
+                                    message=f"Erro na coleta SNMP: {result['error']}"))
+            click.echo(f"{olt.name:<20} ERRO  {result['elapsed']:6.2f}s  {result['error']}")
+        else:
+            olt.status = 'online'
+            _store_onus_snapshot(olt, result['ont_list'])
+            click.echo(f"{olt.name:<20} OK    {result['elapsed']:6.2f}s  "
+                       f"{len(result['ont_list'])} ONUs, {result['pdus']} PDUs")
+    db.session.commit()
+    click.echo(f"Varredura de {len(olts)} OLTs concluída em {sweep['elapsed']:.2f}s")
+
+def _store_onus_snapshot(olt, ont_list):
+    """Grava as ONUs coletadas como snapshot compartilhado da OLT (mesmo formato do dashboard)."""
+    from app.onu_categories import get_thresholds
+    from app.onu_table import OnuTable
+    from app.snapshot_store import snapshot_store
+    from app.snmp_cache import DATASET_ONUS
+
+    table = OnuTable.from_onts(ont_list, get_thresholds(olt.ip_address))
+    now = time.time()
+    try:
+        snapshot_store.put(olt.ip_address, DATASET_ONUS, {'identity_at': now, 'summary': table.summary()},
+                           table.to_bytes(), now)
+    except sqlite3.Error as e:
+        click.echo(f"{olt.name:<20} falha ao gravar o snapshot: {e}")
+
+@app.cli.command("trap-receiver")
+@click.option('--host', default='0.0.0.0', help='Endereço de escuta')
+@click.option('--port', default=None, type=int, help='Porta UDP (padrão SNMP_TRAP_PORT ou 162)')
+@click.option('--engine-id', multiple=True, help='engineID (hex) de OLT que envia traps v3')
+@with_appcontext
+def trap_receiver_command(host, port, engine_id):
+    """Recebe traps SNMP das OLTs e aplica os eventos de ONU."""
+    from app.snmp_traps import SNMP_TRAP_PORT, apply_trap_event_to_db, run_trap_receiver
+    from app.snmp_usm import olt_credentials
+
+    olts = OLT.query.all()
+    communities = sorted({olt.snmp_community for olt in olts if olt.snmp_community} |
+                         {os.environ.get('SNMP_COMMUNITY') or 'public'})
+    v3_users = [(olt_credentials(olt), hex_id) for olt in olts if olt.snmp_version == '3'
+                for hex_id in engine_id]
+    port = port or SNMP_TRAP_PORT
+    click.echo(f"Escutando traps em {host}:{port} ({len(communities)} communities, {len(v3_users)} usuários v3)")
+    run_trap_receiver(host, port, communities, v3_users, on_event=apply_trap_event_to_db)
+
+@app.cli.command("send-test-trap")
+@click.argument('kind', type=click.Choice(['online', 'offline', 'dying_gasp', 'link_up', 'link_down']))
+@click.option('--if-index', required=True, type=int, help='ifIndex da porta PON')
+@click.option('--onu-id', type=int, help='ID da ONU na porta (eventos de ONU)')
+@click.option('--serial', help='Serial da ONU (ex.: HWTC1A2B3C4D)')
+@click.option('--host', default='127.0.0.1', help='Destino do trap')
+@click.option('--port', default=None, type=int, help='Porta UDP do receptor')
+@click.option('--community', default='public', help='Community v2c')
+def send_test_trap_command(kind, if_index, onu_id, serial, host, port, community):
+    """Envia um trap sintético para testar o receptor (ex.: em localhost)."""
+    from app.snmp_traps import SNMP_TRAP_PORT, send_test_trap
+
+    if kind in ('online', 'offline', 'dying_gasp') and onu_id is None:
+        raise click.UsageError('--onu-id é obrigatório para eventos de ONU')
+    error = send_test_trap(kind, if_index, onu_id, serial.encode() if serial else None,
+                           host=host, port=port or SNMP_TRAP_PORT, community=community)
+    if error:
+        raise click.ClickException(str(error))
+    click.echo(f"Trap {kind} enviado para {host}:{port or SNMP_TRAP_PORT}")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
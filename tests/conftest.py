@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+# Permite rodar `pytest` da raiz sem instalar o pacote
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pysnmp.proto.rfc1902 import Integer, OctetString # noqa: E402
+
+from app.onu_table import OnuTable # noqa: E402
+from app.snmp_decode import LINK_OFFLINE, LINK_ONLINE, REG_REGISTERED # noqa: E402
+from app.snmp_session import oid_tuple # noqa: E402
+from app.snmp_utils import ( # noqa: E402
+    OID_HW_GONU_LINK_STATUS, OID_HW_GONU_LOID, OID_HW_GONU_REG_STATUS, OID_HW_GONU_RX_POWER,
+    OID_HW_GONU_SERIAL_NUMBER, OID_HW_GONU_TX_POWER
+)
+
+# ifIndex das portas PON como na MA5800 (passam de 2^31)
+PON_IF_INDEX = 4194304000
+IF_MAP = {PON_IF_INDEX: 'GPON 0/1/0', PON_IF_INDEX + 256: 'GPON 0/1/1'}
+
+
+def _make_ont(if_index, onu_id, rx_power=-20.0, link_status=LINK_ONLINE, port=None):
+    """ONU no formato de merge_ont_rows."""
+    return {
+        'ifIndex': if_index, 'onuId': onu_id, 'portName': port or f'GPON 0/1/{if_index}',
+        'serialNumber': b'HWTC%04d' % (if_index * 100 + onu_id), 'loid': None,
+        'linkStatus': link_status, 'regStatus': REG_REGISTERED,
+        'rxPower': rx_power if link_status == LINK_ONLINE else None, 'txPower': 2.0, 'category': None
+    }
+
+
+@pytest.fixture
+def make_ont():
+    return _make_ont
+
+
+@pytest.fixture
+def onu_table():
+    """15 ONUs em três portas (ifIndex 2, 1 e 10), a de onuId 3 offline em cada uma."""
+    onts = [_make_ont(if_index, onu_id, rx_power=-15.0 - onu_id * 2,
+                      link_status=LINK_OFFLINE if onu_id == 3 else LINK_ONLINE)
+            for if_index in (2, 1, 10) for onu_id in range(5)]
+    return OnuTable.from_onts(onts)
+
+
+class FakeOlt:
+    """Tabela de ONUs servida como linhas de walk (oid_tupla, valor), no lugar de walk_ont_columns."""
+
+    def __init__(self):
+        self.onts = {
+            (PON_IF_INDEX, 0): {'serial': b'HWTC0001', 'link': LINK_ONLINE, 'rx': -2500},
+            (PON_IF_INDEX + 256, 0): {'serial': b'HWTC0002', 'link': LINK_ONLINE, 'rx': -2500},
+        }
+        self.walks = []
+
+    def walk(self, target_ip, community, oids, if_map=None, collection=False):
+        self.walks.append(tuple(oids))
+        for oid in oids:
+            for key, ont in sorted(self.onts.items()):
+                yield oid_tuple(oid) + key, self._value(oid, ont)
+
+    @staticmethod
+    def _value(oid, ont):
+        return {
+            OID_HW_GONU_SERIAL_NUMBER: OctetString(ont['serial']),
+            OID_HW_GONU_LOID: OctetString(b''),
+            OID_HW_GONU_LINK_STATUS: Integer(ont['link']),
+            OID_HW_GONU_REG_STATUS: Integer(REG_REGISTERED),
+            OID_HW_GONU_RX_POWER: Integer(ont['rx']),
+            OID_HW_GONU_TX_POWER: Integer(210),
+        }[oid]
+
+
+@pytest.fixture
+def fake_olt():
+    return FakeOlt()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from app.onu_categories import (
+    CATEGORY_CRITICAL, CATEGORY_NO_SIGNAL, CATEGORY_OFFLINE, CATEGORY_OK, CATEGORY_UNKNOWN,
+    CATEGORY_UNPROVISIONED, CATEGORY_VERY_LOW, STATUS_MISSING, OltThresholds, RxThresholds,
+    categorize, categorize_onts, parse_port_thresholds
+)
+from app.snmp_decode import LINK_OFFLINE, LINK_ONLINE, REG_REGISTERED, REG_UNREGISTERED
+
+
+def test_categorize_covers_every_category():
+    link = np.array([LINK_ONLINE, LINK_ONLINE, LINK_ONLINE, LINK_ONLINE, LINK_OFFLINE, LINK_ONLINE, STATUS_MISSING],
+                    dtype=np.int8)
+    reg = np.array([REG_REGISTERED] * 4 + [REG_REGISTERED, REG_UNREGISTERED, STATUS_MISSING], dtype=np.int8)
+    rx = np.array([-20.0, -30.0, -36.0, np.nan, np.nan, -20.0, -20.0], dtype=np.float32)
+    codes, counts = categorize(link, reg, rx)
+    assert codes.tolist() == [CATEGORY_OK, CATEGORY_CRITICAL, CATEGORY_VERY_LOW, CATEGORY_NO_SIGNAL,
+                              CATEGORY_OFFLINE, CATEGORY_UNPROVISIONED, CATEGORY_UNKNOWN]
+    assert counts.sum() == len(codes)
+
+
+def test_categorize_threshold_tie_is_not_below():
+    link = np.array([LINK_ONLINE], dtype=np.int8)
+    reg = np.array([REG_REGISTERED], dtype=np.int8)
+    codes, _ = categorize(link, reg, np.array([-28.0], dtype=np.float32))
+    assert codes.tolist() == [CATEGORY_OK]
+
+
+def test_categorize_accepts_per_row_limits():
+    link = np.array([LINK_ONLINE, LINK_ONLINE], dtype=np.int8)
+    reg = np.array([REG_REGISTERED, REG_REGISTERED], dtype=np.int8)
+    rx = np.array([-25.0, -25.0], dtype=np.float32)
+    codes, _ = categorize(link, reg, rx, critical=np.array([-28.0, -24.0]), very_low=np.array([-35.0, -35.0]))
+    assert codes.tolist() == [CATEGORY_OK, CATEGORY_CRITICAL]
+
+
+def test_parse_port_thresholds():
+    text = """
+    # porta com splitter longo
+    0/1/0 -30 -36
+    0/2/15  -29.5 -35.5   # comentário no fim
+    """
+    assert parse_port_thresholds(text) == {
+        (0, 1, 0): RxThresholds(-30.0, -36.0),
+        (0, 2, 15): RxThresholds(-29.5, -35.5)
+    }
+    assert parse_port_thresholds(None) == {}
+
+
+@pytest.mark.parametrize('text', ['0/1/0 -30', 'porta -30 -36', '0/1/0 baixo -36'])
+def test_parse_port_thresholds_rejects_invalid_lines(text):
+    with pytest.raises(ValueError, match='Linha 1'):
+        parse_port_thresholds(text)
+
+
+def test_olt_thresholds_use_port_exceptions():
+    thresholds = OltThresholds(ports={(0, 1, 1): RxThresholds(-24.0, -30.0)})
+    onts = [
+        {'ifIndex': 10, 'portName': 'GPON 0/1/0', 'linkStatus': LINK_ONLINE, 'regStatus': REG_REGISTERED,
+         'rxPower': -25.0},
+        {'ifIndex': 11, 'portName': 'GPON 0/1/1', 'linkStatus': LINK_ONLINE, 'regStatus': REG_REGISTERED,
+         'rxPower': -25.0},
+    ]
+    counts = categorize_onts(onts, thresholds)
+    assert [ont['category'] for ont in onts] == ['Online (Sinal OK)', 'Sinal Baixo/Crítico']
+    assert counts == {'Online (Sinal OK)': 1, 'Sinal Baixo/Crítico': 1}
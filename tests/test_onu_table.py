@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from app.onu_categories import CATEGORY_CODES, OltThresholds, RxThresholds
+from app.onu_table import OnuTable
+from app.snmp_decode import LINK_OFFLINE, LINK_ONLINE
+from app.snmp_poller import OntDelta
+
+
+def test_rows_are_sorted_by_if_index_and_onu_id(onu_table):
+    keys = list(onu_table)
+    assert keys == sorted(keys)
+    assert onu_table.get((10, 4))['rxPower'] == -23.0
+
+
+def test_apply_delta_incremental(onu_table, make_ont):
+    revision = onu_table.revision
+    onu_table.apply_delta(OntDelta(False, [make_ont(3, 0)], [(2, 4)], [make_ont(1, 0, rx_power=-30.0)]))
+    assert (3, 0) in onu_table and (2, 4) not in onu_table
+    assert onu_table.get((1, 0))['category'] == 'Sinal Baixo/Crítico'
+    assert onu_table.revision != revision
+
+
+def test_changed_row_that_disappeared_is_added(onu_table, make_ont):
+    onu_table.apply_delta(OntDelta(False, [], [], [make_ont(7, 1)]))
+    assert (7, 1) in onu_table
+
+
+def test_copy_is_independent(onu_table):
+    published = onu_table.copy()
+    onu_table.set_link_status(onu_table.filter(if_index=2), LINK_OFFLINE)
+    assert published.count(link_status=LINK_OFFLINE) == 3
+    assert onu_table.count(link_status=LINK_OFFLINE) == 7
+
+
+def test_bytes_round_trip(onu_table):
+    restored = OnuTable.from_bytes(onu_table.to_bytes())
+    assert restored.rows() == onu_table.rows()
+
+
+def test_recategorize_with_port_thresholds(onu_table):
+    onu_table.thresholds = OltThresholds(ports={(0, 1, 10): RxThresholds(-10.0, -40.0)})
+    onu_table.recategorize()
+    online = onu_table.rows(onu_table.filter(if_index=10, link_status=LINK_ONLINE))
+    assert {ont['category'] for ont in online} == {'Sinal Baixo/Crítico'}
+    assert onu_table.count(category='Sinal Baixo/Crítico') == 4
+
+
+def brute_filter(table, category=None, link_status=None, if_index=None):
+    mask = np.ones(len(table), dtype=bool)
+    if category is not None:
+        mask &= table.category == CATEGORY_CODES.get(category, -1)
+    if link_status is not None:
+        mask &= table.link_status == link_status
+    if if_index is not None:
+        mask &= table.if_index == if_index
+    return np.flatnonzero(mask)
+
+
+def test_select_sorts_only_the_filtered_rows(onu_table):
+    for sort in (None, 'rxPower', '-rxPower', 'portName', '-status'):
+        order = onu_table.order(sort)
+        expected = order[np.isin(order, brute_filter(onu_table, link_status=LINK_ONLINE))]
+        assert onu_table.select(sort, link_status=LINK_ONLINE).tolist() == expected.tolist()
+
+
+def test_port_name_sorts_by_position(make_ont):
+    onts = [make_ont(if_index, 0, port=name) for if_index, name in
+            enumerate(['GPON 0/1/10', 'GPON 0/1/2', 'sem posição', 'GPON 0/2/0', 'GPON 0/1/1'])]
+    table = OnuTable.from_onts(onts)
+    assert [table.port_name[p] for p in table.order('portName')] == \
+        ['GPON 0/1/1', 'GPON 0/1/2', 'GPON 0/1/10', 'GPON 0/2/0', 'sem posição']
+
+
+def test_search_matches_serial(onu_table):
+    positions = onu_table.search('HWTC0104')
+    assert [onu_table.row(p)['onuId'] for p in positions] == [4]
+
+
+def assert_indexes_consistent(table):
+    for category in list(CATEGORY_CODES) + [None]:
+        for link_status in (None, LINK_ONLINE, LINK_OFFLINE):
+            for if_index in (None, 1, 2, 99):
+                expected = brute_filter(table, category, link_status, if_index)
+                assert table.filter(category=category, link_status=link_status, if_index=if_index).tolist() == \
+                    expected.tolist()
+    assert table.category_counts() == {
+        name: int(np.count_nonzero(table.category == code)) for name, code in CATEGORY_CODES.items()
+        if np.count_nonzero(table.category == code)}
+
+
+def test_apply_delta_keeps_indexes_consistent(onu_table, make_ont):
+    onu_table.apply_delta(OntDelta(False, [make_ont(3, 0)], [(2, 4)], [make_ont(1, 0, rx_power=-30.0)]))
+    assert_indexes_consistent(onu_table)
+
+
+def test_apply_delta_full_rebuilds_orders_and_revision(onu_table, make_ont):
+    # Ordens e índice de busca já montados na tabela antiga
+    onu_table.select('rxPower')
+    onu_table.search('HWTC')
+    revision = onu_table.revision
+    replaced = onu_table.copy().apply_delta(OntDelta(True, [make_ont(1, 5)], [], []))
+    assert len(replaced) == 1
+    assert replaced.select('rxPower').tolist() == [0]
+    assert replaced.rows(replaced.select('rxPower'))[0]['onuId'] == 5
+    assert replaced.search('HWTC').tolist() == [0]
+    assert replaced.revision != revision
+    assert replaced.summary()['total'] == 1
+    # A original não muda
+    assert len(onu_table) == 15
+
+
+def test_set_link_status_updates_indexes_incrementally(onu_table):
+    published = onu_table.copy()
+    positions = onu_table.filter(if_index=2)
+    onu_table.set_link_status(positions, LINK_OFFLINE)
+    assert np.isnan(onu_table.rx_power[positions]).all()
+    assert_indexes_consistent(onu_table)
+    assert onu_table.summary()['offline'] == 3 + 4
+    onu_table.set_link_status(onu_table.positions([(2, 0)]), LINK_ONLINE)
+    assert_indexes_consistent(onu_table)
+    # A cópia publicada antes continua com os próprios índices
+    assert_indexes_consistent(published)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import datetime
+import gzip
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request, Response
+
+from app.response_cache import EncodedPayload
+
+BODY = b'{"onus": [' + b','.join(b'{"id": %d}' % n for n in range(200)) + b']}'
+LAST_MODIFIED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_request(**headers):
+    return Request(EnvironBuilder(headers=headers).get_environ())
+
+
+def test_gzip_when_accepted():
+    payload = EncodedPayload(BODY, LAST_MODIFIED)
+    response = payload.response(make_request(**{'Accept-Encoding': 'gzip'}), Response)
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == BODY
+    assert response.get_etag()[0] == f'{payload.etag}-gzip'
+
+
+def test_identity_and_not_modified():
+    payload = EncodedPayload(BODY, LAST_MODIFIED)
+    response = payload.response(make_request(), Response)
+    assert 'Content-Encoding' not in response.headers and response.get_data() == BODY
+    cached = payload.response(make_request(**{'If-None-Match': f'"{payload.etag}"'}), Response)
+    assert cached.status_code == 304
+
+
+def test_small_bodies_are_not_compressed():
+    payload = EncodedPayload(b'{}', LAST_MODIFIED)
+    assert set(payload.encodings) == {'identity'}
+    # Mesmo corpo, mesmo ETag (em qualquer worker)
+    assert payload.etag == EncodedPayload(b'{}', LAST_MODIFIED).etag
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution(tmp_path):
+    flights = SingleFlight(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def collect():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'snapshot'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do(('olt', 'onus'), collect)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do(('olt', 'onus'), collect)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ['snapshot'] * 4
+
+
+def test_recheck_result_skips_func(tmp_path):
+    flights = SingleFlight(str(tmp_path))
+    assert flights.do('olt', lambda: pytest.fail('coletou'), recheck=lambda: 'cache') == 'cache'
+    assert flights.do('olt', lambda: 'coleta', recheck=lambda: None) == 'coleta'
+
+
+def test_errors_propagate_and_release_the_key(tmp_path):
+    flights = SingleFlight(str(tmp_path))
+
+    def fail():
+        raise RuntimeError('timeout')
+
+    with pytest.raises(RuntimeError):
+        flights.do('olt', fail)
+    assert flights.do('olt', lambda: 'ok') == 'ok'
+
+
+def test_different_keys_do_not_wait_for_each_other(tmp_path):
+    flights = SingleFlight(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_onus():
+        started.set()
+        release.wait(5)
+        return 'onus'
+
+    leader = threading.Thread(target=flights.do, args=(('olt', 'onus'), slow_onus))
+    leader.start()
+    started.wait(5)
+    assert flights.do(('olt', 'olt_info'), lambda: 'olt_info') == 'olt_info'
+    release.set()
+    leader.join(5)
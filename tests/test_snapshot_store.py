@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from app.snapshot_store import SnapshotStore
+
+
+def test_put_get_and_versions(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.db'))
+    assert store.get('olt', 'onus') is None and store.info('olt', 'onus') is None
+    assert store.put('olt', 'onus', {'summary': {'total': 2}}, b'dados', fetched_at=100.0) == 1
+    assert store.put('olt', 'onus', {'summary': {'total': 3}}, b'novos', fetched_at=200.0) == 2
+    snapshot = store.get('olt', 'onus')
+    assert (snapshot.version, snapshot.fetched_at, snapshot.meta, snapshot.data) == \
+        (2, 200.0, {'summary': {'total': 3}}, b'novos')
+    assert store.meta('olt', 'onus') == {'summary': {'total': 3}}
+    assert store.info('outra', 'onus') is None
+
+
+def test_expire_keeps_content(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.db'))
+    store.put('olt', 'onus', None, b'dados', fetched_at=100.0)
+    store.put('olt', 'info', {'sysDescr': 'MA5800'}, fetched_at=100.0)
+    store.expire('olt', 'onus')
+    assert store.info('olt', 'onus').fetched_at == 0
+    assert store.info('olt', 'info').fetched_at == 100.0
+    store.expire('olt')
+    assert store.info('olt', 'info').fetched_at == 0
+    assert store.get('olt', 'onus').data == b'dados'
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import time
+
+from pysnmp.proto.rfc1902 import OctetString
+
+from app import snmp_cache, snmp_utils
+from app.snmp_cache import EntityIndexCache, SidecarStore, SnapshotCache
+from app.snmp_session import oid_tuple
+from app.snmp_utils import OID_IF_DESCR, OID_IF_NUMBER, OID_IF_TABLE_LAST_CHANGE, OID_SYS_UPTIME
+
+
+def test_entity_index_without_ent_last_change_relies_on_reboot_check(tmp_path):
+    cache = EntityIndexCache(SidecarStore(str(tmp_path / 'state.json')))
+    cache.store_index('olt', '17', 100000, None)
+    assert cache.lookup('olt', 100000, None) == '17'
+    cache.store_index('olt', '17', 100000, 500)
+    assert cache.lookup('olt', 100000, None) == '17'
+    assert cache.lookup('olt', 100000, 501) is None
+    assert cache.lookup('olt', 10, None) is None # reboot
+
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = SnapshotCache(max_bytes=300, max_entry_ratio=1.0)
+    cache.put('a', 'onus', Sized(100))
+    cache.put('b', 'onus', Sized(100))
+    cache.put('c', 'onus', Sized(100))
+    assert cache.get('a', 'onus') is not None # 'a' passa a ser o mais recente
+    cache.put('d', 'onus', Sized(100))
+    assert cache.peek('b', 'onus') is None
+    assert {olt for olt in 'acd' if cache.peek(olt, 'onus')} == set('acd')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_by_entry_count():
+    cache = SnapshotCache(max_bytes=10 ** 6, max_entries=2)
+    for number in range(5):
+        cache.put('olt', ('json', number), b'x')
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 3
+    assert cache.peek('olt', ('json', 4)) is not None
+
+
+def test_rejects_entries_above_the_ratio():
+    cache = SnapshotCache(max_bytes=1000, max_entry_ratio=0.25)
+    entry = cache.put('olt', 'onus', Sized(500))
+    assert entry.value.nbytes == 500
+    assert cache.peek('olt', 'onus') is None
+    assert cache.stats()['rejected'] == 1
+
+
+def test_expired_entries_stay_for_longer_reads():
+    cache = SnapshotCache(ttls={'onus': 60})
+    cache.put('olt', 'onus', 'valor', fetched_at=time.time() - 120)
+    assert cache.get('olt', 'onus') is None
+    assert cache.get('olt', 'onus', max_age=600).value == 'valor'
+
+
+def _write_records(path, worker):
+    store = SidecarStore(path)
+    for number in range(25):
+        store.set(f'olt-{worker}-{number}', 'entity_index', {'index': number})
+
+
+def test_sidecar_writes_from_several_processes_are_not_lost(tmp_path):
+    path = str(tmp_path / 'state.json')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_write_records, args=(path, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    store = SidecarStore(path)
+    assert all(store.get(f'olt-{worker}-{number}', 'entity_index') == {'index': number}
+               for worker in range(4) for number in range(25))
+
+
+def test_interface_map_without_if_table_last_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(snmp_cache.sidecar_store, 'path', str(tmp_path / 'state.json'))
+    snmp_cache.snapshot_cache.invalidate('olt')
+    gets, walks = [], []
+
+    def get_snmp_data(target_ip, community, oids):
+        gets.append(list(oids))
+        # Agente sem ifTableLastChange: em v1 o PDU que o trouxesse falharia inteiro
+        return None if OID_IF_TABLE_LAST_CHANGE in oids else {OID_SYS_UPTIME: '100000', OID_IF_NUMBER: '2'}
+
+    def iter_snmp_walk(target_ip, community, oids, **kwargs):
+        walks.append(list(oids))
+        return [(oid_tuple(OID_IF_DESCR) + (4194304000,), OctetString(b'GPON 0/1/0'))]
+
+    monkeypatch.setattr(snmp_utils, 'get_snmp_data', get_snmp_data)
+    monkeypatch.setattr(snmp_utils, 'iter_snmp_walk', iter_snmp_walk)
+    assert snmp_utils.get_interface_map('olt', 'public') == {4194304000: 'GPON 0/1/0'}
+    snmp_cache.snapshot_cache.invalidate('olt')
+    assert snmp_utils.get_interface_map('olt', 'public') == {4194304000: 'GPON 0/1/0'}
+    assert gets == [[OID_SYS_UPTIME, OID_IF_NUMBER], [OID_IF_TABLE_LAST_CHANGE]] * 2
+    assert len(walks) == 1
+    snmp_cache.snapshot_cache.invalidate('olt')
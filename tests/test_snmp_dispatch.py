@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from pysnmp.proto.rfc1902 import Integer, OctetString
+
+from app.snmp_decode import decode_int, decode_octets
+from app.snmp_dispatch import OidDispatcher
+
+COLUMNS = {
+    '1.3.6.1.4.1.2011.5.104.1.1.1.1.1.1': ('linkStatus', decode_int),
+    '1.3.6.1.4.1.2011.5.104.1.4.1.1.1.1': ('serialNumber', decode_octets),
+}
+LINK = (1, 3, 6, 1, 4, 1, 2011, 5, 104, 1, 1, 1, 1, 1, 1)
+SERIAL = (1, 3, 6, 1, 4, 1, 2011, 5, 104, 1, 4, 1, 1, 1, 1)
+
+
+def test_match_splits_column_and_index():
+    dispatcher = OidDispatcher(COLUMNS, index_length=2)
+    match = dispatcher.match(LINK + (10, 3))
+    assert (match.field, match.index) == ('linkStatus', (10, 3))
+    assert dispatcher.match(LINK + (10,)) is None
+    assert dispatcher.match(LINK) is None
+    assert dispatcher.match((1, 3, 6, 1, 2, 1) + (10, 3)) is None
+
+
+def test_dispatch_skips_foreign_and_undecodable_varbinds():
+    rows = [
+        (LINK + (10, 3), Integer(1)),
+        (SERIAL + (10, 3), OctetString(b'HWTC0001')),
+        (SERIAL + (10, 4), Integer(7)), # Tipo errado: decode_octets falha
+        (LINK + (10, 3, 1), Integer(1)),
+        ((1, 3, 6, 1, 2, 1, 1, 1, 0), OctetString(b'sysDescr')),
+    ]
+    expected = [((10, 3), 'linkStatus', 1), ((10, 3), 'serialNumber', b'HWTC0001')]
+    assert list(OidDispatcher(COLUMNS, index_length=2).dispatch(rows)) == expected
+    # Sem tamanho de índice fixo (caminho genérico) o índice de 3 partes também vale
+    assert list(OidDispatcher(COLUMNS).dispatch(rows)) == expected + [((10, 3, 1), 'linkStatus', 1)]
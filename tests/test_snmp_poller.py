@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+from collections import namedtuple
+
+import pytest
+
+from app import onu_categories, snmp_poller, snmp_utils
+from app.onu_categories import RxThresholds
+from app.snmp_decode import LINK_OFFLINE
+from app.snmp_poller import IncrementalOntPoller
+
+from tests.conftest import IF_MAP, PON_IF_INDEX
+
+OLT = '192.0.2.10'
+
+
+@pytest.fixture
+def olt(monkeypatch, fake_olt):
+    monkeypatch.setattr(snmp_poller, 'walk_ont_columns', fake_olt.walk)
+    monkeypatch.setattr(snmp_poller, 'get_interface_map', lambda target_ip, community: IF_MAP)
+    # Exceção de limite numa porta: a categoria difere da que o padrão daria
+    monkeypatch.setitem(onu_categories._thresholds, OLT, onu_categories.OltThresholds(
+        ports={(0, 1, 1): RxThresholds(-24.0, -30.0)}))
+    return fake_olt
+
+
+def test_first_poll_is_full(olt):
+    delta = IncrementalOntPoller().poll(OLT, 'public')
+    assert delta.full and len(delta.added) == 2
+    assert {ont['serialNumber'] for ont in delta.added} == {b'HWTC0001', b'HWTC0002'}
+
+
+def test_unchanged_olt_gives_empty_delta_with_port_thresholds(olt):
+    poller = IncrementalOntPoller()
+    poller.poll(OLT, 'public')
+    delta = poller.poll(OLT, 'public')
+    assert not delta.full
+    assert delta.added == [] and delta.removed == [] and delta.changed == []
+    assert poller.table(OLT).get((PON_IF_INDEX + 256, 0))['category'] == 'Sinal Baixo/Crítico'
+
+
+def test_delta_reports_changes_and_keeps_identity(olt):
+    poller = IncrementalOntPoller()
+    poller.poll(OLT, 'public')
+    olt.walks.clear()
+    olt.onts[(PON_IF_INDEX, 0)]['link'] = LINK_OFFLINE
+    del olt.onts[(PON_IF_INDEX + 256, 0)]
+    delta = poller.poll(OLT, 'public')
+    assert olt.walks == [tuple(snmp_poller.VOLATILE_OIDS)]
+    assert delta.removed == [(PON_IF_INDEX + 256, 0)]
+    assert [(ont['ifIndex'], ont['linkStatus'], ont['serialNumber']) for ont in delta.changed] == \
+        [(PON_IF_INDEX, LINK_OFFLINE, b'HWTC0001')]
+
+
+def test_ont_columns_are_sharded_by_pon_port(monkeypatch, fake_olt):
+    shards = []
+    monkeypatch.setattr(snmp_utils, 'SNMP_SHARD_CONCURRENCY', 4)
+    monkeypatch.setattr(snmp_utils, 'iter_snmp_walk', lambda *args, **kwargs: pytest.fail('walk sem fatias'))
+
+    def walk_ont_shards(target, if_indexes, collection=False, oids=None):
+        shards.append((target.host, if_indexes, collection, tuple(oids)))
+        return list(fake_olt.walk(target.host, target.community, oids))
+
+    # snmp_collector é importado só na hora (e traz o pysnmp asyncio): basta o que walk_ont_columns usa
+    monkeypatch.setitem(sys.modules, 'app.snmp_collector', types.SimpleNamespace(
+        OltTarget=namedtuple('OltTarget', 'id name host community port version usm'),
+        walk_ont_shards=walk_ont_shards))
+    if_map = dict(IF_MAP)
+    if_map[1] = 'ethernet0/0/1'
+    rows = list(snmp_utils.walk_ont_columns(OLT, 'public', snmp_poller.VOLATILE_OIDS, if_map, collection=True))
+    assert shards == [(OLT, sorted(IF_MAP), True, tuple(snmp_poller.VOLATILE_OIDS))]
+    assert len(rows) == len(snmp_poller.VOLATILE_OIDS) * len(fake_olt.onts)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app.snmp_session import get_session
+from app.snmp_utils import OID_IF_DESCR, OID_SYS_DESCR
+from benchmarks.simulator import SimulatedOlt, synthetic_olt
+
+
+@pytest.fixture
+def session():
+    with SimulatedOlt(synthetic_olt(10), 'public') as agent:
+        host, port = agent.address
+        session = get_session(host, 'public', port)
+        yield session
+        session.close()
+
+
+@pytest.mark.parametrize('timeout', [0.5, 2.0])
+def test_v2c_responses_are_accepted_on_every_timeout_step(session, monkeypatch, timeout):
+    # Cada degrau de timeout é um alvo próprio no LCD do pysnmp
+    monkeypatch.setattr(session.policy, 'timeout', lambda: timeout)
+    error_indication, error_status, _, var_binds = session.get([OID_SYS_DESCR], lookup_mib=False)
+    assert not error_indication and not error_status
+    assert b'MA5800' in var_binds[0][1].asOctets()
+
+
+def test_bulk_walk_reads_the_whole_column(session):
+    error_indication, error_status, _, var_bind_table = session.bulk_walk([OID_IF_DESCR], lookup_mib=False)
+    assert not error_indication and not error_status
+    assert len(var_bind_table) > 256
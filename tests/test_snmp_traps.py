@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import pytest
+from flask import Flask
+from pysnmp.proto.api import v2c
+
+from app import db
+from app.models.models import OLT, ONU, LogEntry
+from app.snmp_decode import LINK_OFFLINE, LINK_ONLINE
+from app.snmp_traps import (
+    EVENT_DYING_GASP, EVENT_LINK_DOWN, EVENT_LINK_UP, EVENT_OFFLINE, EVENT_ONLINE, OID_SNMP_TRAP_OID,
+    TrapEvent, TrapEventJournal, apply_trap_event, apply_trap_event_to_db, build_test_trap, decode_notification
+)
+
+from tests.conftest import PON_IF_INDEX
+
+SOURCE = '192.0.2.10'
+
+
+def notification(kind, if_index, onu_id=None, serial=None):
+    """Varbinds como o receptor os recebe: snmpTrapOID seguido dos do trap."""
+    trap_oid, var_binds = build_test_trap(kind, if_index, onu_id, serial)
+    return [(OID_SNMP_TRAP_OID, v2c.ObjectIdentifier(trap_oid))] + var_binds
+
+
+@pytest.mark.parametrize('kind', [EVENT_ONLINE, EVENT_OFFLINE, EVENT_DYING_GASP])
+def test_onu_traps_round_trip(kind):
+    event = decode_notification(SOURCE, notification(kind, PON_IF_INDEX, 7, b'HWTC0001'), received_at=10.0)
+    assert event == TrapEvent(SOURCE, kind, PON_IF_INDEX, 7, b'HWTC0001', 10.0)
+
+
+@pytest.mark.parametrize('kind', [EVENT_LINK_UP, EVENT_LINK_DOWN])
+def test_port_traps_round_trip_with_huawei_if_index(kind):
+    event = decode_notification(SOURCE, notification(kind, PON_IF_INDEX), received_at=10.0)
+    assert event == TrapEvent(SOURCE, kind, PON_IF_INDEX, None, None, 10.0)
+
+
+def test_link_status_defines_kind_only_for_unknown_trap_oid():
+    var_binds = notification(EVENT_ONLINE, PON_IF_INDEX, 7)[1:]
+    assert decode_notification(SOURCE, var_binds).kind == EVENT_ONLINE
+    var_binds = [(OID_SNMP_TRAP_OID, v2c.ObjectIdentifier('1.3.6.1.4.1.9999.1'))] + var_binds
+    assert decode_notification(SOURCE, var_binds).kind == EVENT_ONLINE
+    assert decode_notification(SOURCE, [(OID_SNMP_TRAP_OID, v2c.ObjectIdentifier('1.3.6.1.4.1.9999.1'))]) is None
+
+
+def test_apply_trap_event(onu_table):
+    def event(kind, if_index, onu_id=None):
+        return TrapEvent(SOURCE, kind, if_index, onu_id, None, 10.0)
+
+    assert apply_trap_event(onu_table, event(EVENT_DYING_GASP, 1, 0)).tolist() == [onu_table.positions([(1, 0)])[0]]
+    assert onu_table.get((1, 0))['linkStatus'] == LINK_OFFLINE
+    apply_trap_event(onu_table, event(EVENT_ONLINE, 1, 3))
+    assert onu_table.get((1, 3))['linkStatus'] == LINK_ONLINE
+    assert len(apply_trap_event(onu_table, event(EVENT_LINK_DOWN, 2))) == 5
+    assert onu_table.count(if_index=2, link_status=LINK_OFFLINE) == 5
+    assert apply_trap_event(onu_table, event(EVENT_LINK_UP, 2)) == []
+
+
+def test_journal_reads_only_new_complete_events(tmp_path):
+    journal = TrapEventJournal(str(tmp_path / 'traps.jsonl'))
+    assert journal.read_since(None) == ([], None)
+    journal.heartbeat()
+    assert journal.alive()
+    _, cursor = journal.read_since(None)
+    sent = [TrapEvent(SOURCE, EVENT_OFFLINE, PON_IF_INDEX, 1, b'\x48\x57', 10.0),
+            TrapEvent(SOURCE, EVENT_LINK_DOWN, PON_IF_INDEX, None, None, 11.0)]
+    journal.append(sent)
+    events, cursor = journal.read_since(cursor)
+    assert events == sent
+    with open(journal.path, 'a') as journal_file:
+        journal_file.write('{"olt": "pela metade"')
+    assert journal.read_since(cursor) == ([], cursor)
+    # Arquivo trocado (rotação): recomeça do início do novo
+    journal._rotate()
+    journal.append(sent[:1])
+    events, _ = journal.read_since(cursor)
+    assert events == sent[:1]
+
+
+@pytest.fixture
+def app_db():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+def test_apply_trap_event_to_db_scopes_serial_by_olt(app_db):
+    olt_a = OLT(name='A', ip_address=SOURCE)
+    olt_b = OLT(name='B', ip_address='192.0.2.20')
+    app_db.session.add_all([olt_a, olt_b])
+    app_db.session.flush()
+    onu = ONU(serial_number='HWTC00000001', olt_id=olt_b.id, status='online')
+    app_db.session.add(onu)
+    app_db.session.commit()
+
+    apply_trap_event_to_db(TrapEvent(SOURCE, EVENT_DYING_GASP, PON_IF_INDEX, 1, b'HWTC\x00\x00\x00\x01', 10.0))
+    assert onu.status == 'online'
+    assert LogEntry.query.filter_by(source='OLT A').count() == 1
+
+    apply_trap_event_to_db(TrapEvent('192.0.2.20', EVENT_DYING_GASP, PON_IF_INDEX, 1, b'HWTC\x00\x00\x00\x01', 10.0))
+    assert onu.status == 'offline'
+    assert 'Dying gasp' in LogEntry.query.filter_by(source='OLT B').one().message